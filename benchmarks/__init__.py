@@ -0,0 +1,14 @@
+"""
+Performance benchmarks for the markdown editor.
+
+Run the suite from the repository root:
+    python -m benchmarks.suite --output results.json [--baseline baseline.json]
+"""
+
+import os
+import sys
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for _path in (_ROOT, os.path.join(_ROOT, "src")):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
@@ -0,0 +1,34 @@
+"""
+Compares the legacy and single-pass DocumentModelBuilder modes on synthetic chapters.
+
+Usage (from the repository root):
+    python benchmarks/bench_document_model_builder.py [panel_count ...]
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath("."))
+
+from benchmarks.suite import best_of  # noqa: E402
+from benchmarks.synthetic import synthetic_chapter  # noqa: E402
+from document_model_builder import DocumentModelBuilder  # noqa: E402
+from markdown_parser import MarkdownParser  # noqa: E402
+
+DEFAULT_PANEL_COUNTS = [10, 100, 300, 1000]
+
+
+def main(panel_counts):
+    print(f"{'panels':>8} {'legacy (s)':>12} {'single-pass (s)':>16} {'speedup':>8}")
+    for panel_count in panel_counts:
+        doc = MarkdownParser.parse(synthetic_chapter(panel_count))
+        legacy = best_of(lambda: DocumentModelBuilder(single_pass=False).build(doc))
+        single = best_of(lambda: DocumentModelBuilder(single_pass=True).build(doc))
+        print(
+            f"{panel_count:>8} {legacy:>12.4f} {single:>16.4f} {legacy / single:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or DEFAULT_PANEL_COUNTS
+    main(counts)
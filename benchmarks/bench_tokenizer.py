@@ -0,0 +1,72 @@
+"""
+Measures the throughput of the bundled mistletoe Document tokenizer against
+the previous line-per-block tokenizer on synthetic chapters.
+
+Usage (from the repository root):
+    python benchmarks/bench_tokenizer.py [panel_count ...]
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath("."))
+
+from benchmarks.suite import best_of  # noqa: E402
+from benchmarks.synthetic import synthetic_chapter  # noqa: E402
+from mistletoe import Document  # noqa: E402
+from mistletoe.block_token import BlockCode, Heading, Paragraph  # noqa: E402
+
+DEFAULT_PANEL_COUNTS = [100, 1000, 5000]
+
+
+def _line_per_block_tokenize(text: str) -> list:
+    """The previous tokenizer: one block per line, kept as a baseline only."""
+    children = []
+    in_code = False
+    code_lines = []
+    offset = 0
+    for line, raw_line in zip(text.splitlines(), text.splitlines(keepends=True)):
+        offset += len(raw_line)
+        if line.startswith("```"):
+            if in_code:
+                block = BlockCode("\n".join(code_lines))
+                block.end_offset = offset
+                children.append(block)
+                code_lines = []
+            in_code = not in_code
+            continue
+        if in_code:
+            code_lines.append(line)
+            continue
+        if line.startswith("### "):
+            block = Heading(3, line[4:].strip())
+        elif line.startswith("## "):
+            block = Heading(2, line[3:].strip())
+        else:
+            block = Paragraph(line.strip())
+        block.start_offset = offset - len(raw_line)
+        block.end_offset = offset
+        children.append(block)
+    return children
+
+
+def main(panel_counts):
+    print(
+        f"{'panels':>8} {'MB':>6} {'old MB/s':>9} {'new MB/s':>9} "
+        f"{'old blocks':>11} {'new blocks':>11}"
+    )
+    for panel_count in panel_counts:
+        text = synthetic_chapter(panel_count)
+        megabytes = len(text.encode("utf-8")) / 1_000_000
+        old = best_of(lambda: _line_per_block_tokenize(text))
+        new = best_of(lambda: Document(text))
+        print(
+            f"{panel_count:>8} {megabytes:>6.2f} {megabytes / old:>9.1f} "
+            f"{megabytes / new:>9.1f} {len(_line_per_block_tokenize(text)):>11} "
+            f"{len(Document(text).children):>11}"
+        )
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or DEFAULT_PANEL_COUNTS
+    main(counts)
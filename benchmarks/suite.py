@@ -0,0 +1,143 @@
+"""
+Times the main document operations on synthetic chapters and compares the
+results with a stored baseline.
+
+Usage (from the repository root):
+    python -m benchmarks.suite [--sizes 10 100 1000 10000] [--repeat 3]
+        [--output results.json] [--baseline baseline.json] [--threshold 0.2]
+
+Exits with status 1 when any operation is slower than the baseline by more
+than the threshold (0.2 = 20%).
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+import benchmarks  # noqa: F401  (puts src/ on sys.path)
+from benchmarks.synthetic import synthetic_chapter
+from document_model_builder import DocumentModelBuilder
+from document_validator import DocumentValidator
+from markdown_document import MarkdownDocument
+from markdown_parser import MarkdownParser
+from panel_section_manager import PanelSectionManager
+from section_titles import SECTION_TITLES
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+DEFAULT_THRESHOLD = 0.2
+# Sections updated per size for the update_named_section timing.
+UPDATES_PER_RUN = 50
+
+
+def best_of(func: Callable[[], object], repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_size(panel_count: int, repeat: int = 3) -> Dict[str, float]:
+    """Returns the best wall time in seconds of each operation for one size."""
+    text = synthetic_chapter(panel_count)
+    mistletoe_doc = MarkdownParser.parse(text)
+    chapter_model = DocumentModelBuilder().build(mistletoe_doc, source_text=text)
+    doc = MarkdownDocument(parse_cache=False)
+    doc._process_content(text)
+    panels = doc.list_panels()
+    step = max(1, len(panels) // UPDATES_PER_RUN)
+    targets = panels[::step][:UPDATES_PER_RUN]
+    title = SECTION_TITLES.TEACHING_NARRATIVE.value
+
+    def update_sections():
+        for panel in targets:
+            PanelSectionManager.update_named_section(panel, title, "Updated text.")
+
+    def render_after_update():
+        doc.update_named_section_in_panel(targets[0].panel_number_in_doc, title, "x")
+        doc.reconstruct_and_render_document()
+
+    return {
+        "parse": best_of(lambda: MarkdownParser.parse(text), repeat),
+        "build": best_of(
+            lambda: DocumentModelBuilder().build(mistletoe_doc, source_text=text),
+            repeat,
+        ),
+        "validate": best_of(lambda: DocumentValidator.validate(chapter_model), repeat),
+        "update_named_section": best_of(update_sections, repeat) / len(targets),
+        "render": best_of(render_after_update, repeat),
+    }
+
+
+def run_suite(sizes: List[int], repeat: int = 3) -> Dict:
+    results = {}
+    for size in sizes:
+        results[str(size)] = run_size(size, repeat)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float = DEFAULT_THRESHOLD) -> List[str]:
+    """Returns one message per operation slower than baseline * (1 + threshold)."""
+    regressions = []
+    for size, timings in current["results"].items():
+        baseline_timings = baseline.get("results", {}).get(size, {})
+        for operation, seconds in timings.items():
+            reference = baseline_timings.get(operation)
+            if not reference:
+                continue
+            ratio = seconds / reference
+            if ratio > 1 + threshold:
+                regressions.append(
+                    f"{operation} @ {size} panels: {seconds:.4f}s vs "
+                    f"{reference:.4f}s baseline ({ratio:.2f}x)"
+                )
+    return regressions
+
+
+def _print_table(report: Dict) -> None:
+    operations = ["parse", "build", "validate", "update_named_section", "render"]
+    print(f"{'panels':>8} " + " ".join(f"{op:>21}" for op in operations))
+    for size, timings in report["results"].items():
+        print(f"{size:>8} " + " ".join(f"{timings[op]:>20.5f}s" for op in operations))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against this results JSON file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    report = run_suite(args.sizes, args.repeat)
+    _print_table(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        for message in regressions:
+            print(f"REGRESSION: {message}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+"""
+Synthetic chapters with the project's real shape: an H1 chapter title,
+generic intro content, N "## Panel" sections with every SECTION_TITLES H3,
+H4 sub-sections, code fences and the occasional non-panel H2.
+"""
+
+import random
+
+from section_titles import SECTION_TITLES
+
+_WORDS = (
+    "incident latency alert pager rollback deploy cluster metric trace "
+    "customer payment ledger queue retry timeout dashboard runbook"
+).split()
+
+
+def _sentence(rng: random.Random, words: int = 12) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def synthetic_chapter(
+    panel_count: int,
+    h4_per_section: int = 1,
+    paragraphs_per_section: int = 2,
+    notes_every: int = 25,
+    seed: int = 0,
+) -> str:
+    """Returns a chapter with `panel_count` panels; identical for the same arguments."""
+    rng = random.Random(seed)
+    lines = ["# Chapter 1: Synthetic Benchmark", "", _sentence(rng, 20), ""]
+    for panel_number in range(1, panel_count + 1):
+        lines.extend([f"## Panel {panel_number}: Synthetic Panel", ""])
+        for section in SECTION_TITLES:
+            lines.extend([f"### {section.value}", ""])
+            for _ in range(paragraphs_per_section):
+                lines.extend([_sentence(rng), _sentence(rng), ""])
+            lines.extend(["```bash", "kubectl get pods -n payments", "```", ""])
+            for h4_number in range(1, h4_per_section + 1):
+                lines.extend(
+                    [f"#### Detail {h4_number}", "", f"- {_sentence(rng, 6)}", ""]
+                )
+        if notes_every and panel_number % notes_every == 0:
+            lines.extend(["## Notes", "", _sentence(rng), ""])
+    return "\n".join(lines)
@@ -3,7 +3,13 @@ class Text:
         self.content = content
 
 class BlockToken:
-    pass
+    # Source span, filled in by Document: 1-based first/last line numbers and
+    # character offsets into the parsed text (end_offset is exclusive and
+    # includes the trailing line break).
+    line_number = None
+    end_line_number = None
+    start_offset = None
+    end_offset = None
 
 class Heading(BlockToken):
     def __init__(self, level: int, text: str):
@@ -11,7 +17,9 @@ class Heading(BlockToken):
         self.children = [Text(text)]
 
 class BlockCode(BlockToken):
-    def __init__(self, text: str):
+    def __init__(self, text: str, language: str = '', fence: str = '```'):
+        self.language = language
+        self.fence = fence
         self.children = [Text(text)]
 
 class Paragraph(BlockToken):
@@ -1,32 +1,115 @@
+import re
+
 from .block_token import BlockCode, Heading, Paragraph
 from .markdown_renderer import MarkdownRenderer
 
+_LINE_BREAK = re.compile(r'\r\n?|\n')
+_LINE_BREAK_SPLIT = re.compile(r'(\r\n?|\n)')
+_ATX_HEADING = re.compile(r' {0,3}(#{1,6})(?:[ \t]+(.*?))?(?:[ \t]+#+)?[ \t]*$')
+_FENCE_OPEN = re.compile(r' {0,3}(`{3,}|~{3,})[ \t]*(.*?)[ \t]*$')
+_FENCE_CLOSE = re.compile(r' {0,3}(`{3,}|~{3,})[ \t]*$')
+
+_TEXT, _BLANK, _HEADING, _FENCE = range(4)
+# First non-blank character of a line -> the only block kind it can start.
+_LINE_KIND = {'': _BLANK, '#': _HEADING, '`': _FENCE, '~': _FENCE}
+
+
+def split_lines(text: str):
+    """Returns the lines of `text` and the width of the line break ending each."""
+    if '\r' not in text:
+        lines = text.split('\n')
+        widths = [1] * (len(lines) - 1)
+    else:
+        parts = _LINE_BREAK_SPLIT.split(text)
+        lines = parts[0::2]
+        widths = [len(line_break) for line_break in parts[1::2]]
+    if lines[-1]:
+        widths.append(0)
+    else:
+        lines.pop()
+    return lines, widths
+
+
+def line_count(text: str) -> int:
+    """Number of lines Document sees in `text`."""
+    breaks = len(_LINE_BREAK.findall(text))
+    return breaks + (1 if text and not text.endswith(('\n', '\r')) else 0)
+
+
 class Document:
+    """
+    Block tokenizer: ATX headings (levels 1-6), fenced code (``` or ~~~) and
+    paragraphs of consecutive non-blank lines. Blank lines only separate
+    blocks and produce no tokens.
+    """
+
     def __init__(self, text: str = ''):
         self.renderer = MarkdownRenderer()
         self.children = []
-        lines = text.splitlines()
-        in_code = False
+        # True when the text ended inside an unterminated code fence.
+        self.ends_in_code_block = False
+        self._tokenize(text)
+
+    def _tokenize(self, text: str) -> None:
+        add = self._add
+        paragraph_lines = []
+        paragraph_start = None
+        fence = None
         code_lines = []
-        for line in lines:
-            if line.startswith('```'):
-                if in_code:
-                    self.children.append(BlockCode('\n'.join(code_lines)))
-                    code_lines = []
-                    in_code = False
+        code_language = ''
+        code_start = None
+        line_number = 0
+        end = 0
+        lines, widths = split_lines(text)
+        for line, width in zip(lines, widths):
+            line_number += 1
+            start = end
+            end += len(line) + width
+            if fence is not None:
+                match = _FENCE_CLOSE.match(line)
+                if match and match.group(1)[0] == fence[0] and len(match.group(1)) >= len(fence):
+                    add(BlockCode('\n'.join(code_lines), code_language, fence), code_start, line_number, end)
+                    fence = None
                 else:
-                    in_code = True
+                    code_lines.append(line)
                 continue
-            if in_code:
-                code_lines.append(line)
+            first = line[:1]
+            if first == ' ' or first == '\t':
+                first = line.lstrip()[:1]
+            kind = _LINE_KIND.get(first, _TEXT)
+            if kind == _HEADING:
+                match = _ATX_HEADING.match(line)
+                if match is None:
+                    kind = _TEXT
+            elif kind == _FENCE:
+                match = _FENCE_OPEN.match(line)
+                if match is None or (match.group(1)[0] == '`' and '`' in match.group(2)):
+                    kind = _TEXT
+            if kind == _TEXT:
+                if not paragraph_lines:
+                    paragraph_start = (line_number, start)
+                paragraph_lines.append(line)
                 continue
-            if line.startswith('### '):
-                self.children.append(Heading(3, line[4:].strip()))
-            elif line.startswith('## '):
-                self.children.append(Heading(2, line[3:].strip()))
-            elif line.strip():
-                self.children.append(Paragraph(line.strip()))
-            else:
-                self.children.append(Paragraph(''))
-        if in_code:
-            self.children.append(BlockCode('\n'.join(code_lines)))
+            if paragraph_lines:
+                # Lines are contiguous, so the paragraph ends where this line starts.
+                add(Paragraph('\n'.join(paragraph_lines)), paragraph_start, line_number - 1, start)
+                paragraph_lines = []
+            if kind == _HEADING:
+                add(Heading(len(match.group(1)), (match.group(2) or '').strip()),
+                    (line_number, start), line_number, end)
+            elif kind == _FENCE:
+                fence = match.group(1)
+                code_language = match.group(2)
+                code_lines = []
+                code_start = (line_number, start)
+        if paragraph_lines:
+            add(Paragraph('\n'.join(paragraph_lines)), paragraph_start, line_number, end)
+        if fence is not None:
+            self.ends_in_code_block = True
+            add(BlockCode('\n'.join(code_lines), code_language, fence), code_start, line_number, end)
+
+    def _add(self, block, start, end_line_number, end_offset):
+        block.line_number, block.start_offset = start
+        block.end_line_number = end_line_number
+        block.end_offset = end_offset
+        self.children.append(block)
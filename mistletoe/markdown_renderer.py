@@ -1,18 +1,64 @@
 from .block_token import Heading, BlockCode, Paragraph
 
+
+class TrimmingWriter:
+    """
+    Wraps a text stream and drops leading and trailing whitespace of
+    everything written through it, like str.strip() on the concatenation,
+    without holding more than the current run of whitespace in memory.
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self._started = False
+        self._pending = ''
+
+    def write(self, text: str) -> int:
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return 0
+            self._started = True
+        body = text.rstrip()
+        if body:
+            if self._pending:
+                self.out.write(self._pending)
+            self.out.write(body)
+            self._pending = text[len(body):]
+        else:
+            self._pending += text
+        return len(text)
+
+
 class MarkdownRenderer:
+    BLOCK_SEPARATOR = '\n\n'
+
     def render(self, document) -> str:
-        lines = []
-        for block in getattr(document, 'children', []):
-            if isinstance(block, Heading):
-                text = ''.join(child.content for child in block.children)
-                lines.append('#' * block.level + ' ' + text)
-            elif isinstance(block, BlockCode):
-                lines.append('```')
-                lines.extend(block.children[0].content.splitlines())
-                lines.append('```')
-            elif isinstance(block, Paragraph):
-                lines.append(block.children[0].content)
-            else:
-                lines.append(str(block))
-        return '\n'.join(lines)
+        return self.render_blocks(getattr(document, 'children', []))
+
+    def render_blocks(self, blocks) -> str:
+        return self.BLOCK_SEPARATOR.join(self.render_block(block) for block in blocks)
+
+    def render_to(self, document, out) -> None:
+        self.render_blocks_to(getattr(document, 'children', []), out)
+
+    def render_blocks_to(self, blocks, out) -> None:
+        """Writes the rendering of `blocks` to `out` (anything with a write method)."""
+        separator = ''
+        for block in blocks:
+            out.write(separator)
+            out.write(self.render_block(block))
+            separator = self.BLOCK_SEPARATOR
+
+    def render_block(self, block) -> str:
+        if isinstance(block, Heading):
+            text = ''.join(child.content for child in block.children)
+            return '#' * block.level + (' ' + text if text else '')
+        if isinstance(block, BlockCode):
+            fence = getattr(block, 'fence', '```')
+            opening = fence + getattr(block, 'language', '')
+            content = block.children[0].content
+            return f'{opening}\n{content}\n{fence}' if content else f'{opening}\n{fence}'
+        if isinstance(block, Paragraph):
+            return block.children[0].content
+        return str(block)
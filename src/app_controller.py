@@ -3,10 +3,12 @@
 import logging
 import os
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 
 from character_role_suggester import CharacterRoleSuggester
 from markdown_document import MarkdownDocument
+from openai_service import stream_improved_markdown_for_section
+from section_titles import SECTION_TITLES
 
 logger = logging.getLogger(__name__)
 
@@ -61,6 +63,35 @@ class AppController:
         self.current_selected_panel_id = None
         return False
 
+    def select_panel_by_title(self, panel_title: str) -> bool:
+        if not self.doc:
+            logger.warning("No document loaded for selecting panel.")
+            return False
+        panel = self.doc.get_panel_by_title(panel_title)
+        if panel and panel.panel_number_in_doc is not None:
+            return self.select_panel(panel.panel_number_in_doc)
+        logger.warning(f"Panel titled '{panel_title}' not found.")
+        self.current_selected_panel_id = None
+        return False
+
+    def get_section_markdown(self, section_h3_title: str) -> Optional[str]:
+        """
+        Returns the current markdown of a named section in the selected panel:
+        the API-improved version if one was applied, otherwise the original.
+        """
+        if not self.doc or self.current_selected_panel_id is None:
+            logger.warning("No panel selected for reading a section.")
+            return None
+        h3_section = self.doc.get_h3_section(
+            self.current_selected_panel_id, section_h3_title
+        )
+        if not h3_section:
+            logger.warning(f"Section '{section_h3_title}' not found.")
+            return None
+        if h3_section.api_improved_markdown is not None:
+            return h3_section.api_improved_markdown
+        return h3_section.original_full_markdown
+
     def extract_named_sections(self) -> Dict[str, str]:
         if not self.doc or self.current_selected_panel_id is None:
             logger.warning("No panel selected for extracting sections.")
@@ -77,5 +108,44 @@ class AppController:
             self.current_selected_panel_id, section_h3_title, new_content
         )
 
+    def enhance_section(
+        self,
+        section_h3_title: str,
+        enhancement_type: Optional[str] = None,
+        on_delta: Optional[Callable[[str], None]] = None,
+    ) -> Optional[str]:
+        """
+        Rewrites a named section of the selected panel with the API, passing
+        the markdown to `on_delta` as it streams in, and applies the result.
+        Returns the applied markdown, or None if nothing was applied.
+        """
+        if not self.doc or self.current_selected_panel_id is None:
+            logger.warning("No panel selected for enhancing a section.")
+            return None
+        sections = self.extract_named_sections()
+        original = sections.get(section_h3_title)
+        if original is None:
+            logger.warning(f"Section '{section_h3_title}' not found.")
+            return None
+        panel = self.doc.get_panel_by_number(self.current_selected_panel_id)
+        context_parts = [f"## {panel.panel_title_text}"]
+        for section in [
+            SECTION_TITLES.SCENE_DESCRIPTION.value,
+            SECTION_TITLES.TEACHING_NARRATIVE.value,
+        ]:
+            if sections.get(section):
+                context_parts.append(sections[section])
+        improved = stream_improved_markdown_for_section(
+            original,
+            enhancement_type,
+            None,
+            panel.panel_title_text,
+            "\n\n".join(context_parts),
+            on_delta or (lambda delta: None),
+        )
+        if improved and self.update_named_section(section_h3_title, improved):
+            return improved
+        return None
+
     def suggest_character_roles_in_folder(self, folder_path: str):
         return CharacterRoleSuggester.suggest_roles_for_folder(folder_path)
@@ -0,0 +1,450 @@
+# async_openai_service.py
+"""
+asyncio equivalents of the openai_service functions, built on AsyncOpenAI.
+Prompts, parsing and the response cache are shared with openai_service; a
+per-event-loop semaphore bounds the number of requests in flight.
+"""
+import asyncio
+import json
+import weakref
+from typing import Any, Dict, List, Optional
+
+import openai_service
+from config import (
+    OPENAI_MAX_CONCURRENT_REQUESTS,
+    OPENAI_MODEL_DEFAULT,
+    OPENAI_MODEL_ENHANCEMENT,
+    OPENAI_MODEL_SPEECH,
+    OPENAI_MODEL_SUGGESTION,
+    OPENAI_TEMP_DEFAULT,
+    OPENAI_TEMP_ENHANCEMENT,
+    OPENAI_TEMP_SPEECH,
+    OPENAI_TEMP_SUGGESTION,
+)
+from document_model import SceneAnalysisPydantic
+from logging_config import get_logger
+from metrics import METRICS
+from token_estimator import batch_budget_for, pack_by_token_budget
+from openai_service import (
+    NARRATION_FALLBACK,
+    SCENE_SUMMARY_FALLBACK,
+    _character_roles_batch_prompt,
+    _character_roles_prompt,
+    _enhancement_suggestions_batch_prompt,
+    _enhancement_suggestions_prompt,
+    _fallback_scene_analysis,
+    _finish_improved_markdown,
+    _finish_improved_sections,
+    _improved_section_prompt,
+    _improved_sections_prompt,
+    _narration_title_prompt,
+    _pack_sections,
+    _parse_character_roles,
+    _parse_character_roles_batch,
+    _parse_enhancement_suggestions,
+    _parse_enhancement_suggestions_batch,
+    _parse_improved_sections,
+    _parse_scene_analysis,
+    _parse_speech_bubbles,
+    _scene_analysis_prompt,
+    _scene_summary_prompt,
+    _speech_bubbles_prompt,
+)
+
+logger = get_logger(__name__)
+
+try:
+    from openai import AsyncOpenAI
+
+    async_client = AsyncOpenAI(max_retries=0)
+except ImportError:
+    async_client = None
+    logger.error("OpenAI library not installed.")
+except Exception as e:
+    async_client = None
+    logger.exception("Could not initialize async OpenAI client: %s", e)
+
+max_concurrent_requests = OPENAI_MAX_CONCURRENT_REQUESTS
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def set_max_concurrent_requests(limit: int) -> None:
+    """Changes the in-flight request limit for event loops started afterwards."""
+    global max_concurrent_requests
+    max_concurrent_requests = limit
+    _semaphores.clear()
+
+
+def _request_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(max_concurrent_requests)
+    return semaphore
+
+
+async def _chat_completion(
+    prompt: str,
+    template: str,
+    model: str,
+    temperature: float,
+    refresh: bool = False,
+) -> Optional[str]:
+    # Cache and rate limit stores are SQLite; their calls run in worker
+    # threads so they never block the event loop.
+    key, cached = await asyncio.to_thread(
+        openai_service._lookup_completion, prompt, template, model, temperature, refresh
+    )
+    if cached is not None:
+        return cached
+
+    async def send():
+        # Only requests on the wire hold a slot; tasks waiting on the rate
+        # limiter or backing off from a 429 do not.
+        async with _request_semaphore():
+            return await async_client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=temperature,
+            )
+
+    with METRICS.timer("openai.request"):
+        response = await openai_service._rate_limiter().call_async(model, prompt, send)
+    content = response.choices[0].message.content
+    await asyncio.to_thread(
+        openai_service._store_completion, key, model, template, content
+    )
+    return content
+
+
+async def _discard_chat_completion(
+    prompt: str, template: str, model: str, temperature: float
+) -> None:
+    await asyncio.to_thread(
+        openai_service._discard_chat_completion, prompt, template, model, temperature
+    )
+
+
+async def suggest_character_roles_for_panels(
+    panels: List[Dict],
+    model: str = OPENAI_MODEL_SUGGESTION,
+    temperature: float = OPENAI_TEMP_SUGGESTION,
+    max_attempts: int = 3,
+    token_budget: Optional[int] = None,
+) -> Dict[str, List[str]]:
+    batches = pack_by_token_budget(
+        panels,
+        _character_roles_batch_prompt,
+        token_budget or batch_budget_for(model),
+        model,
+    )
+    answers = await asyncio.gather(
+        *(_suggest_roles_for_batch(b, model, temperature, max_attempts) for b in batches)
+    )
+    roles: Dict[str, List[str]] = {}
+    for answer in answers:
+        roles.update(answer)
+    return roles
+
+
+async def _suggest_roles_for_batch(
+    panels: List[Dict], model: str, temperature: float, max_attempts: int
+) -> Dict[str, List[str]]:
+    prompt = _character_roles_batch_prompt(panels)
+    raw = None
+    for attempt in range(max_attempts):
+        try:
+            raw = await _chat_completion(
+                prompt,
+                "character_roles_batch",
+                model,
+                temperature,
+                refresh=attempt > 0,
+            )
+            return _parse_character_roles_batch(raw)
+        except Exception as e:
+            await _discard_chat_completion(prompt, "character_roles_batch", model, temperature)
+            if attempt == max_attempts - 1:
+                logger.error("Failed to parse batch character roles: %s", e)
+                logger.debug("Raw: %s", raw)
+                return {}
+
+
+async def get_enhancement_suggestions_for_panel_h3s(
+    panel_title: str,
+    panel_context_markdown: str,
+    h3_sections_content: Dict[str, str],
+    model: str = OPENAI_MODEL_SUGGESTION,
+    temperature: float = OPENAI_TEMP_SUGGESTION,
+) -> Dict[str, Dict[str, Any]]:
+    if not h3_sections_content:
+        return {}
+    prompt = _enhancement_suggestions_prompt(
+        panel_title, panel_context_markdown, h3_sections_content
+    )
+    raw_response_content = None
+    try:
+        raw_response_content = await _chat_completion(
+            prompt, "enhancement_suggestions", model, temperature
+        )
+        if not raw_response_content:
+            logger.error("Received empty response for suggestions.")
+            return {}
+        return _parse_enhancement_suggestions(raw_response_content)
+    except json.JSONDecodeError as e:
+        await _discard_chat_completion(prompt, "enhancement_suggestions", model, temperature)
+        logger.error("Error decoding JSON response for suggestions: %s", e)
+        logger.debug("Raw response was:\n>>>\n%s\n<<<", raw_response_content)
+        return {}
+    except Exception as e:
+        logger.exception("Unexpected error getting suggestions: %s", e)
+        return {}
+
+
+async def get_enhancement_suggestions_for_panels(
+    panels: List[Dict[str, Any]],
+    model: str = OPENAI_MODEL_SUGGESTION,
+    temperature: float = OPENAI_TEMP_SUGGESTION,
+    token_budget: Optional[int] = None,
+) -> Dict[int, Dict[str, Dict[str, Any]]]:
+    panels = [p for p in panels if p["sections"]]
+    batches = pack_by_token_budget(
+        panels,
+        _enhancement_suggestions_batch_prompt,
+        token_budget or batch_budget_for(model),
+        model,
+    )
+    answers = await asyncio.gather(
+        *(_suggest_for_panel_batch(b, model, temperature) for b in batches if len(b) > 1)
+    )
+    suggestions: Dict[int, Dict[str, Dict[str, Any]]] = {}
+    for answer in answers:
+        suggestions.update(answer)
+    missing = [p for p in panels if p["panel_number"] not in suggestions]
+    singles = await asyncio.gather(
+        *(
+            get_enhancement_suggestions_for_panel_h3s(
+                p["title"], p["context"], p["sections"], model, temperature
+            )
+            for p in missing
+        )
+    )
+    for p, single in zip(missing, singles):
+        suggestions[p["panel_number"]] = single
+    return suggestions
+
+
+async def _suggest_for_panel_batch(
+    batch: List[Dict[str, Any]], model: str, temperature: float
+) -> Dict[int, Dict[str, Dict[str, Any]]]:
+    prompt = _enhancement_suggestions_batch_prompt(batch)
+    raw = None
+    try:
+        raw = await _chat_completion(
+            prompt, "enhancement_suggestions_batch", model, temperature
+        )
+        parsed = _parse_enhancement_suggestions_batch(raw)
+    except Exception as e:
+        await _discard_chat_completion(prompt, "enhancement_suggestions_batch", model, temperature)
+        logger.error("Failed to get batched suggestions, falling back per panel: %s", e)
+        logger.debug("Raw: %s", raw)
+        return {}
+    expected = {p["panel_number"] for p in batch}
+    return {n: s for n, s in parsed.items() if n in expected}
+
+
+async def get_improved_markdown_for_section(
+    original_h3_markdown_content: str,
+    enhancement_type: Optional[str],
+    enhancement_reason: Optional[str],
+    panel_title_context: str,
+    overall_panel_context_md: str,
+    model: str = OPENAI_MODEL_ENHANCEMENT,
+    temperature: float = OPENAI_TEMP_ENHANCEMENT,
+) -> Optional[str]:
+    if not original_h3_markdown_content or not original_h3_markdown_content.strip():
+        logger.info("[OpenAI Service] Skipping enhancement for empty content.")
+        return original_h3_markdown_content
+    prompt, h3_title_for_prompt = _improved_section_prompt(
+        original_h3_markdown_content,
+        enhancement_type,
+        enhancement_reason,
+        panel_title_context,
+        overall_panel_context_md,
+    )
+    logger.info(
+        "Requesting enhancement for H3 section: '%s' in panel '%s'",
+        h3_title_for_prompt,
+        panel_title_context,
+    )
+    try:
+        improved_markdown = await _chat_completion(
+            prompt, "improved_section", model, temperature
+        )
+        return _finish_improved_markdown(
+            improved_markdown, original_h3_markdown_content, h3_title_for_prompt
+        )
+    except Exception as e:
+        logger.exception("Unexpected error during content enhancement: %s", str(e))
+        return None
+
+
+async def get_improved_markdown_for_sections(
+    sections: Dict[str, Dict[str, Any]],
+    panel_title_context: str,
+    overall_panel_context_md: str,
+    model: str = OPENAI_MODEL_ENHANCEMENT,
+    temperature: float = OPENAI_TEMP_ENHANCEMENT,
+) -> Dict[str, Optional[str]]:
+    sections = {t: s for t, s in sections.items() if s["markdown"] and s["markdown"].strip()}
+    improved: Dict[str, Optional[str]] = {}
+    groups = _pack_sections(sections, panel_title_context, overall_panel_context_md, model)
+    answers = await asyncio.gather(
+        *(
+            _improve_section_batch(
+                group, panel_title_context, overall_panel_context_md, model, temperature
+            )
+            for group in groups
+            if len(group) > 1
+        )
+    )
+    for answer in answers:
+        improved.update(answer)
+    missing = [t for t in sections if t not in improved]
+    results = await asyncio.gather(
+        *(
+            get_improved_markdown_for_section(
+                sections[t]["markdown"],
+                sections[t].get("enhancement_type"),
+                sections[t].get("enhancement_reason"),
+                panel_title_context,
+                overall_panel_context_md,
+                model,
+                temperature,
+            )
+            for t in missing
+        )
+    )
+    improved.update(zip(missing, results))
+    return improved
+
+
+async def _improve_section_batch(
+    sections: Dict[str, Dict[str, Any]],
+    panel_title_context: str,
+    overall_panel_context_md: str,
+    model: str,
+    temperature: float,
+) -> Dict[str, Optional[str]]:
+    prompt = _improved_sections_prompt(
+        sections, panel_title_context, overall_panel_context_md
+    )
+    raw = None
+    try:
+        raw = await _chat_completion(prompt, "improved_sections", model, temperature)
+        parsed = _parse_improved_sections(raw)
+    except Exception as e:
+        await _discard_chat_completion(prompt, "improved_sections", model, temperature)
+        logger.error("Failed to parse multi-section enhancement, falling back per section: %s", e)
+        logger.debug("Raw: %s", raw)
+        return {}
+    return _finish_improved_sections(parsed, sections)
+
+
+async def rewrite_scene_and_teaching_as_summary(
+    scene_markdown: str,
+    teaching_markdown: str,
+    model: str = OPENAI_MODEL_DEFAULT,
+    temperature: float = OPENAI_TEMP_DEFAULT,
+) -> str:
+    prompt = _scene_summary_prompt(scene_markdown, teaching_markdown)
+    try:
+        content = await _chat_completion(prompt, "scene_summary", model, temperature)
+        return content.strip()
+    except Exception as e:
+        logger.error("OpenAI error in scene summary generation: %s", str(e))
+        return SCENE_SUMMARY_FALLBACK
+
+
+async def generate_narration_title_for_panel(
+    scene_md: str,
+    teaching_md: str,
+    model: str = OPENAI_MODEL_SPEECH,
+    temperature: float = OPENAI_TEMP_SPEECH,
+) -> str:
+    prompt = _narration_title_prompt(scene_md, teaching_md)
+    try:
+        content = await _chat_completion(prompt, "narration_title", model, temperature)
+        return content.strip()
+    except Exception as e:
+        logger.error("OpenAI narration generation failed: %s", str(e))
+        return NARRATION_FALLBACK
+
+
+async def generate_speech_bubbles_for_panel(
+    scene_summary: str,
+    character_names: List[str],
+    character_data: Dict,
+    model: str = OPENAI_MODEL_SPEECH,
+    temperature: float = OPENAI_TEMP_SPEECH,
+) -> Dict[str, str]:
+    prompt = _speech_bubbles_prompt(scene_summary, character_names, character_data)
+    try:
+        content = await _chat_completion(prompt, "speech_bubbles", model, temperature)
+        return _parse_speech_bubbles(content)
+    except Exception as e:
+        await _discard_chat_completion(prompt, "speech_bubbles", model, temperature)
+        logger.error("Failed to generate speech bubbles: %s", str(e))
+        return {}
+
+
+async def suggest_character_roles_from_context(
+    panel_title: str,
+    scene_description_md: str,
+    teaching_narrative_md: str,
+    model: str = OPENAI_MODEL_SUGGESTION,
+    temperature: float = OPENAI_TEMP_SUGGESTION,
+) -> List[str]:
+    prompt = _character_roles_prompt(
+        panel_title, scene_description_md, teaching_narrative_md
+    )
+    raw = None
+    try:
+        raw = (await _chat_completion(prompt, "character_roles", model, temperature)).strip()
+        return _parse_character_roles(raw)
+    except Exception as e:
+        await _discard_chat_completion(prompt, "character_roles", model, temperature)
+        logger.error("Failed to get character role list from OpenAI: %s", e)
+        logger.debug("Raw response was: %s", raw)
+        return []
+
+
+async def generate_scene_analysis_from_ai(
+    scene_markdown: str,
+    teaching_markdown: str,
+    model: str = OPENAI_MODEL_DEFAULT,
+    temperature: float = OPENAI_TEMP_DEFAULT,
+) -> SceneAnalysisPydantic:
+    prompt = _scene_analysis_prompt(scene_markdown, teaching_markdown)
+    content = None
+    try:
+        content = await _chat_completion(prompt, "scene_analysis", model, temperature)
+        return _parse_scene_analysis(content, scene_markdown, teaching_markdown)
+    except Exception as e:
+        await _discard_chat_completion(prompt, "scene_analysis", model, temperature)
+        logger.error("Error during scene analysis generation: %s", e)
+        logger.debug("Raw response: %s", content)
+        return _fallback_scene_analysis()
+
+
+async def improve_sections(requests: List[Dict[str, Any]]) -> List[Optional[str]]:
+    """
+    Batch driver: runs get_improved_markdown_for_section for every request
+    (a dict of its keyword arguments) concurrently and returns the results in
+    request order. The semaphore, not the batch size, bounds requests in flight.
+    """
+    return await asyncio.gather(
+        *(get_improved_markdown_for_section(**request) for request in requests)
+    )
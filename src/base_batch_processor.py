@@ -2,6 +2,7 @@
 from pathlib import Path
 from typing import Dict, List, Optional, Set, Union
 
+from corpus_loader import CorpusLoader
 from document_model import H3Pydantic, PanelPydantic
 from logging_config import get_logger
 from markdown_document import MarkdownDocument
@@ -13,14 +14,18 @@ logger = get_logger(__name__)
 class BaseBatchProcessor:
     """Base class containing shared functionality for batch processing Markdown files."""
 
-    def __init__(self, dry_run: bool = False):
+    def __init__(
+        self, dry_run: bool = False, corpus_loader: Optional[CorpusLoader] = None
+    ):
         """
         Initialize the base batch processor.
 
         Args:
             dry_run: If True, simulate operations without making actual changes
+            corpus_loader: Loader used to discover and parse directories
         """
         self.dry_run = dry_run
+        self.corpus_loader = corpus_loader or CorpusLoader()
         logger.info(
             "BatchProcessor initialized in %s mode.",
             "DRY RUN" if self.dry_run else "LIVE",
@@ -89,7 +94,12 @@ class BaseBatchProcessor:
 
         return suggestions
 
-    def process_single_file(self, filepath: Path, output_dir: Path) -> bool:
+    def process_single_file(
+        self,
+        filepath: Path,
+        output_dir: Path,
+        doc: Optional[MarkdownDocument] = None,
+    ) -> bool:
         """
         Base implementation for processing a single file.
         Subclasses should override as needed.
@@ -97,12 +107,14 @@ class BaseBatchProcessor:
         Args:
             filepath: Path to the markdown file to process
             output_dir: Directory to save the processed file
+            doc: Already loaded document for `filepath`, if any
 
         Returns:
             True if processing was successful, False otherwise
         """
         logger.info("Processing file: %s", filepath.name)
-        doc = MarkdownDocument(filepath=str(filepath))
+        if doc is None:
+            doc = MarkdownDocument(filepath=str(filepath))
 
         if not doc.chapter_model:
             logger.error("Failed to load document model: %s", filepath.name)
@@ -143,7 +155,7 @@ class BaseBatchProcessor:
             output_dir,
         )
 
-        markdown_files = list(source_dir.glob("*.md"))
+        markdown_files = self.corpus_loader.discover(source_dir)
         if not markdown_files:
             logger.info("No Markdown files found in '%s'.", source_dir)
             return
@@ -0,0 +1,183 @@
+# batch_api.py
+"""
+Offline (OpenAI Batch API) mode: planned chat completions are written to a
+JSONL request file instead of being sent, and a results JSONL is ingested
+later. Each request carries a stable custom_id naming the file, panel,
+section and stage it belongs to.
+"""
+
+import json
+from pathlib import Path
+from typing import Callable, Dict, Iterable, NamedTuple, Optional, Set, Union
+from urllib.parse import quote, unquote
+
+from config import OPENAI_BATCH_COMPLETION_WINDOW
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+_ID_SEPARATOR = ":"
+
+
+class BatchRequestId(NamedTuple):
+    file: str
+    panel: int
+    section: str
+    stage: str
+
+
+def make_custom_id(file: str, panel: int, section: str, stage: str) -> str:
+    """Builds the custom_id for a request; `section` is "" for panel-level stages."""
+    parts = [stage, file, str(panel), section]
+    return _ID_SEPARATOR.join(quote(part, safe="/ ") for part in parts)
+
+
+def parse_custom_id(custom_id: str) -> BatchRequestId:
+    stage, file, panel, section = (unquote(p) for p in custom_id.split(_ID_SEPARATOR))
+    return BatchRequestId(file, int(panel), section, stage)
+
+
+class BatchRequestWriter:
+    """
+    Writes chat-completion requests in Batch API JSONL format. Requests whose
+    custom_id was already written are skipped, so re-planning is harmless.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.count = 0
+        self._ids: Set[str] = set()
+        self._file = None
+
+    def __enter__(self) -> "BatchRequestWriter":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "w", encoding="utf-8")
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._file.close()
+        logger.info("Wrote %d batch requests to %s", self.count, self.path)
+
+    def add(self, custom_id: str, model: str, prompt: str, temperature: float) -> None:
+        if custom_id in self._ids:
+            return
+        self._ids.add(custom_id)
+        line = {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": {
+                "model": model,
+                "messages": [{"role": "user", "content": prompt}],
+                "temperature": temperature,
+            },
+        }
+        self._file.write(json.dumps(line, ensure_ascii=False) + "\n")
+        self.count += 1
+
+
+def read_batch_results(paths: Iterable[Union[str, Path]]) -> Dict[str, str]:
+    """
+    Returns {custom_id: message content} for every successful result in the
+    given results JSONL files. Failed requests are logged and left out, so
+    they are planned again on the next round.
+    """
+    results: Dict[str, str] = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                custom_id = entry.get("custom_id")
+                response = entry.get("response") or {}
+                if entry.get("error") or response.get("status_code", 200) != 200:
+                    logger.warning(
+                        "Batch request %s failed: %s",
+                        custom_id,
+                        entry.get("error") or response.get("body"),
+                    )
+                    continue
+                try:
+                    content = response["body"]["choices"][0]["message"]["content"]
+                except (KeyError, IndexError, TypeError):
+                    logger.warning("Batch result %s has no message content.", custom_id)
+                    continue
+                if content:
+                    results[custom_id] = content
+    return results
+
+
+def run_batch_locally(
+    requests_path: Union[str, Path],
+    results_path: Union[str, Path],
+    complete: Optional[Callable[[Dict], str]] = None,
+) -> int:
+    """
+    Stand-in for the Batch API: answers every request in `requests_path`
+    with `complete(body)` and writes a results file in the Batch API format.
+    By default requests are sent one by one through openai_service.
+    """
+    if complete is None:
+        from openai_service import create_chat_completion
+
+        def complete(body: Dict) -> str:
+            response = create_chat_completion(
+                body["model"], body["messages"], body["temperature"]
+            )
+            return response.choices[0].message.content
+
+    count = 0
+    with open(requests_path, "r", encoding="utf-8") as src, open(
+        results_path, "w", encoding="utf-8"
+    ) as out:
+        for line in src:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            result = {"id": f"local-{count}", "custom_id": request["custom_id"]}
+            try:
+                content = complete(request["body"])
+                result["response"] = {
+                    "status_code": 200,
+                    "body": {"choices": [{"message": {"role": "assistant", "content": content}}]},
+                }
+                result["error"] = None
+            except Exception as e:
+                result["response"] = None
+                result["error"] = {"message": str(e)}
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def submit_batch(requests_path: Union[str, Path], client=None) -> str:
+    """Uploads a request file and starts a batch; returns the batch id."""
+    if client is None:
+        from openai_service import client
+    with open(requests_path, "rb") as f:
+        uploaded = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=uploaded.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=OPENAI_BATCH_COMPLETION_WINDOW,
+    )
+    logger.info("Submitted batch %s from %s", batch.id, requests_path)
+    return batch.id
+
+
+def download_batch_results(
+    batch_id: str, results_path: Union[str, Path], client=None
+) -> bool:
+    """Saves a finished batch's results JSONL; returns False while it is still running."""
+    if client is None:
+        from openai_service import client
+    batch = client.batches.retrieve(batch_id)
+    if batch.status != "completed":
+        logger.info("Batch %s is %s.", batch_id, batch.status)
+        return False
+    content = client.files.content(batch.output_file_id)
+    Path(results_path).write_text(content.text, encoding="utf-8")
+    logger.info("Saved results of batch %s to %s", batch_id, results_path)
+    return True
@@ -4,16 +4,20 @@ from typing import Any, Dict, List, Optional
 
 import openai_service
 from base_batch_processor import BaseBatchProcessor
+from corpus_loader import CorpusLoader
 from document_model import H3Pydantic, PanelPydantic
 from logging_config import get_logger
 from markdown_document import MarkdownDocument
+from metrics import METRICS
 
 logger = get_logger(__name__)
 
 
 class BatchProcessor(BaseBatchProcessor):
-    def __init__(self, dry_run: bool = False):
-        super().__init__(dry_run=dry_run)
+    def __init__(
+        self, dry_run: bool = False, corpus_loader: Optional[CorpusLoader] = None
+    ):
+        super().__init__(dry_run=dry_run, corpus_loader=corpus_loader)
 
     def validate_document_structure(self, doc_model: MarkdownDocument) -> bool:
         """
@@ -59,14 +63,20 @@ class BatchProcessor(BaseBatchProcessor):
 
         return True  # Return True even with warnings, as in original
 
-    def process_single_file(self, filepath: Path, output_dir: Path) -> bool:
+    def process_single_file(
+        self,
+        filepath: Path,
+        output_dir: Path,
+        doc: Optional[MarkdownDocument] = None,
+    ) -> bool:
         """
         Process a single file - batch processor implementation.
         """
-        if not super().process_single_file(filepath, output_dir):
+        if doc is None:
+            doc = MarkdownDocument(filepath=str(filepath))
+        if not super().process_single_file(filepath, output_dir, doc):
             return False
 
-        doc = MarkdownDocument(filepath=str(filepath))
         any_h3_marked_for_enhancement = False
 
         for element in doc.chapter_model.document_elements:
@@ -97,7 +107,7 @@ class BatchProcessor(BaseBatchProcessor):
                 )
                 return True
             else:
-                return doc.save_document(str(output_filename))
+                return doc.save_document(str(output_filename), skip_unchanged=True)
         else:
             logger.info(
                 "  No enhancements suggested or applied for %s. Original preserved (not re-saved).",
@@ -113,13 +123,14 @@ class BatchProcessor(BaseBatchProcessor):
 
         source_dir = Path(source_dir_path)
         output_dir = Path(output_dir_path)
-        markdown_files = list(source_dir.glob("*.md"))
-
         processed_count = 0
         failed_count = 0
 
-        for md_file_path in markdown_files:
-            result = self.process_single_file(md_file_path, output_dir)
+        for md_file_path, doc in self.corpus_loader.iter_documents(source_dir):
+            if doc is None:
+                failed_count += 1
+                continue
+            result = self.process_single_file(md_file_path, output_dir, doc)
             if result:
                 processed_count += 1
             else:
@@ -132,3 +143,4 @@ class BatchProcessor(BaseBatchProcessor):
         logger.info("Successfully processed/simulated: %s file(s).", processed_count)
         if failed_count > 0:
             logger.info("Failed to process due to errors: %s file(s).", failed_count)
+        METRICS.dump_configured()
@@ -0,0 +1,257 @@
+# character_registry.py
+
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import CHARACTER_REGISTRY_FLUSH_EVERY
+from markdown_file_manager import MarkdownFileManager
+
+try:
+    import fcntl
+except ImportError:  # Windows: flushes are only serialized within a process.
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"),
+    **dict.fromkeys("cgjkqsxz", "2"),
+    **dict.fromkeys("dt", "3"),
+    "l": "4",
+    **dict.fromkeys("mn", "5"),
+    "r": "6",
+}
+
+
+def name_key(name: str) -> str:
+    """
+    Phonetic key of a character name: the Soundex code of each word, so
+    "Jon Smyth" and "John Smith" share a key. Names with no Latin letters
+    (e.g. "李明") are keyed by their casefolded text instead.
+    """
+    codes = [_soundex(word) for word in name.lower().split()]
+    key = " ".join(code for code in codes if code)
+    return key or " ".join(name.casefold().split())
+
+
+def _soundex(word: str) -> str:
+    letters = [c for c in word if "a" <= c <= "z"]
+    if not letters:
+        return ""
+    code = letters[0].upper()
+    previous = _SOUNDEX_CODES.get(letters[0], "")
+    for c in letters[1:]:
+        digit = _SOUNDEX_CODES.get(c, "")
+        if digit and digit != previous:
+            code += digit
+        if c not in "hw":
+            previous = digit
+    return (code + "000")[:4]
+
+
+@contextmanager
+def _file_lock(lock_path: str):
+    """Exclusive lock on `lock_path`, shared by every process on the machine."""
+    if fcntl is None:
+        yield
+        return
+    with open(lock_path, "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+class CharacterRegistry:
+    """
+    In-memory view of a character JSON file ({"characters": {name: profile}})
+    with name and role indexes. New profiles are held back and written in
+    one go by `flush`, which takes a lock file, merges in characters other
+    processes saved meanwhile and replaces the file atomically. Every
+    `flush_every` pending profiles trigger a flush of their own. Safe to
+    share between threads.
+    """
+
+    _shared: Dict[str, "CharacterRegistry"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path, flush_every: int = CHARACTER_REGISTRY_FLUSH_EVERY):
+        self.path = str(path)
+        self.flush_every = flush_every
+        self._lock = threading.RLock()
+        self._data: Dict = {}
+        self._profiles: Dict[str, Dict] = {}
+        self._by_role: Dict[str, List[str]] = {}
+        self._by_key: Dict[str, List[str]] = {}
+        self._pending: Dict[str, Dict] = {}
+        self._stamp: Optional[Tuple[int, int]] = None
+        self.reload()
+
+    @classmethod
+    def for_path(cls, path) -> "CharacterRegistry":
+        """Returns the registry shared by all callers in this process for `path`."""
+        key = os.path.abspath(str(path))
+        with cls._shared_lock:
+            registry = cls._shared.get(key)
+            if registry is None:
+                registry = cls._shared[key] = cls(path)
+            return registry
+
+    def __enter__(self) -> "CharacterRegistry":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.flush()
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._profiles
+
+    def get(self, name: str) -> Optional[Dict]:
+        return self._profiles.get(name)
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return list(self._profiles)
+
+    def names_for_role(self, role: str) -> List[str]:
+        """Names of the characters with `role`, in file order."""
+        with self._lock:
+            return list(self._by_role.get(role, ()))
+
+    def roles(self) -> List[str]:
+        with self._lock:
+            return list(self._by_role)
+
+    def name_conflicts(self, name: str) -> List[str]:
+        """Existing names equal to `name` or sounding like it (same name_key)."""
+        with self._lock:
+            conflicts = list(self._by_key.get(name_key(name), ()))
+            if name in self._profiles and name not in conflicts:
+                conflicts.append(name)
+            return conflicts
+
+    def missing_roles(self, roles: Iterable[str]) -> List[str]:
+        """The `roles` no character has yet, in the given order."""
+        with self._lock:
+            return [role for role in roles if role not in self._by_role]
+
+    def character_data(self, names: Optional[Iterable[str]] = None) -> Dict:
+        """
+        A {"characters": ...} dict in the character file's format, holding
+        only `names` when given; what the prompt builders expect.
+        """
+        with self._lock:
+            if names is None:
+                return {**self._data, "characters": dict(self._profiles)}
+            return {
+                "characters": {
+                    name: self._profiles[name] for name in names if name in self._profiles
+                }
+            }
+
+    def add(self, name: str, profile: Dict) -> bool:
+        """Queues a new profile; returns False if the name is taken."""
+        return self.add_many({name: profile}) == 1
+
+    def add_many(self, profiles: Dict[str, Dict]) -> int:
+        """Queues new profiles, skipping taken names; returns how many were added."""
+        with self._lock:
+            added = 0
+            for name, profile in profiles.items():
+                if name in self._profiles:
+                    continue
+                self._pending[name] = profile
+                self._index(name, profile)
+                added += 1
+            if self.flush_every and len(self._pending) >= self.flush_every:
+                self.flush()
+            return added
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def flush(self) -> int:
+        """Writes queued profiles to the file; returns how many were written."""
+        with self._lock:
+            if not self._pending:
+                return 0
+            with _file_lock(self.path + ".lock"):
+                data = self._read() or {"characters": {}}
+                characters = data.setdefault("characters", {})
+                written = 0
+                for name, profile in self._pending.items():
+                    if name in characters:
+                        logger.warning(
+                            "Character %s was saved by another process; keeping theirs.",
+                            name,
+                        )
+                        continue
+                    characters[name] = profile
+                    written += 1
+                if written:
+                    with MarkdownFileManager.atomic_writer(self.path) as f:
+                        json.dump(data, f, indent=2, ensure_ascii=False)
+                self._pending = {}
+                self._load(data)
+            logger.info("Saved %d new characters to %s", written, self.path)
+            return written
+
+    def reload(self) -> None:
+        """Re-reads the file, keeping profiles not flushed yet."""
+        with self._lock:
+            self._load(self._read() or {"characters": {}})
+
+    def refresh(self) -> bool:
+        """Reloads if another process changed the file since it was read."""
+        with self._lock:
+            if self._file_stamp() == self._stamp:
+                return False
+            self.reload()
+            return True
+
+    def _read(self) -> Optional[Dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                stamp = os.fstat(f.fileno())
+                data = json.load(f)
+        except FileNotFoundError:
+            self._stamp = None
+            return None
+        self._stamp = (stamp.st_mtime_ns, stamp.st_size)
+        return data
+
+    def _file_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _load(self, data: Dict) -> None:
+        self._data = {key: value for key, value in data.items() if key != "characters"}
+        self._profiles = {}
+        self._by_role = {}
+        self._by_key = {}
+        for name, profile in data.get("characters", {}).items():
+            self._index(name, profile)
+        for name, profile in list(self._pending.items()):
+            if name in self._profiles:
+                del self._pending[name]
+            else:
+                self._index(name, profile)
+
+    def _index(self, name: str, profile: Dict) -> None:
+        self._profiles[name] = profile
+        self._by_key.setdefault(name_key(name), []).append(name)
+        role = profile.get("role") if isinstance(profile, dict) else None
+        if isinstance(role, str):
+            self._by_role.setdefault(role, []).append(name)
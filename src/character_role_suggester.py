@@ -1,8 +1,9 @@
 # character_role_suggester.py (batch-optimized)
 
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
 
+from corpus_loader import CorpusLoader
 from markdown_document import MarkdownDocument
 from openai_service import suggest_character_roles_for_panels
 from section_titles import SECTION_TITLES
@@ -10,12 +11,15 @@ from section_titles import SECTION_TITLES
 
 class CharacterRoleSuggester:
     @staticmethod
-    def _suggest_roles_for_path(md_path: Path) -> Dict[str, Dict[str, List[str]]]:
-        if not md_path.exists() or not md_path.is_file():
-            raise ValueError(f"File {md_path} not found or is not a file.")
-        doc = MarkdownDocument()
-        if not doc.load_and_process(str(md_path)):
-            raise ValueError(f"Failed to load document from {md_path}.")
+    def _suggest_roles_for_path(
+        md_path: Path, doc: Optional[MarkdownDocument] = None
+    ) -> Dict[str, Dict[str, List[str]]]:
+        if doc is None:
+            if not md_path.exists() or not md_path.is_file():
+                raise ValueError(f"File {md_path} not found or is not a file.")
+            doc = MarkdownDocument()
+            if not doc.load_and_process(str(md_path)):
+                raise ValueError(f"Failed to load document from {md_path}.")
         panel_inputs = []
         panel_titles = []
         for panel in doc.list_panels():
@@ -41,14 +45,19 @@ class CharacterRoleSuggester:
         }
 
     @staticmethod
-    def suggest_roles_for_folder(folder_path: str) -> Dict[str, Dict[str, List[str]]]:
+    def suggest_roles_for_folder(
+        folder_path: str, corpus_loader: Optional[CorpusLoader] = None
+    ) -> Dict[str, Dict[str, List[str]]]:
         folder = Path(folder_path)
         result = {}
         if not folder.exists() or not folder.is_dir():
             raise ValueError(f"Folder {folder_path} not found or is not a directory.")
-        for file in folder.glob("*.md"):
+        corpus_loader = corpus_loader or CorpusLoader()
+        for file, doc in corpus_loader.iter_documents(folder):
+            if doc is None:
+                continue
             try:
-                file_roles = CharacterRoleSuggester._suggest_roles_for_path(file)
+                file_roles = CharacterRoleSuggester._suggest_roles_for_path(file, doc)
                 result.update(file_roles)
             except Exception as e:
                 # Optionally log or handle per-file errors here
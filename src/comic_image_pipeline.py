@@ -1,113 +1,230 @@
 import json
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Optional
-
-from generate_character_profiles import generate_character_profiles_for_roles
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from batch_api import BatchRequestWriter, make_custom_id, read_batch_results
+from character_registry import CharacterRegistry
+from config import (
+    COMIC_PIPELINE_MAX_WORKERS,
+    OPENAI_MODEL_DEFAULT,
+    OPENAI_MODEL_SPEECH,
+    OPENAI_TEMP_DEFAULT,
+    OPENAI_TEMP_SPEECH,
+)
+from document_model import SceneAnalysisPydantic
+from generate_character_profiles import (
+    add_character_profiles_for_roles,
+    generate_profiles_for_missing_roles,
+)
 from logging_config import get_logger
 from markdown_document import MarkdownDocument
 from openai_service import (
+    _fallback_scene_analysis,
+    _narration_title_prompt,
+    _parse_scene_analysis,
+    _parse_speech_bubbles,
+    _scene_analysis_prompt,
+    _scene_summary_prompt,
+    _speech_bubbles_prompt,
     generate_narration_title_for_panel,
+    generate_scene_analysis_from_ai,
     generate_speech_bubbles_for_panel,
     rewrite_scene_and_teaching_as_summary,
     suggest_character_roles_from_context,
 )
 from section_titles import SECTION_TITLES
+from stage_graph import StageGraph
 
 logger = get_logger(__name__)
 
 
+# Serializes profile generation, so concurrent panels missing the same role
+# generate its characters once.
+_CHARACTER_GENERATION_LOCK = threading.Lock()
+
+# Roles that must appear in a panel, by scene type.
+TAG_TO_ROLES = {
+    "Teaching Scene": ["Senior SRE", "Junior Developer", "Product Owner"],
+    "Chaos Scene": ["Support Engineer", "Angry Customer", "SRE Engineer"],
+    "Reflection Scene": ["Senior SRE", "Product Owner"],
+    "Meta Scene": ["Senior SRE"],
+}
+
+
 def process_panel_to_json(
     doc: MarkdownDocument,
     panel,
-    character_data: Dict,
-    character_json_path: Path,
+    registry: CharacterRegistry,
     characters_per_role: int,
     chapter_prefix: str,
     images_folder: str,
+    executor: Optional[Executor] = None,
+    scene_analysis: Optional[SceneAnalysisPydantic] = None,
 ) -> Optional[Dict]:
-    import json
-    from pathlib import Path
-
-    from openai_service import (
-        generate_narration_title_for_panel,
-        generate_scene_analysis_from_ai,
-        generate_speech_bubbles_for_panel,
-        infer_scene_tags_for_panel,
-        rewrite_scene_and_teaching_as_summary,
+    values = _run_panel_stages(
+        doc, panel, registry, characters_per_role, executor, scene_analysis
     )
+    if values is None:
+        return None
+    return _finish_panel_from_stages(doc, panel, values, chapter_prefix, images_folder)
 
-    panel_id = panel.panel_number_in_doc
-    panel_title = panel.panel_title_text
-
-    sections = doc.extract_named_sections_from_panel(panel_id)
-    scene_md = sections.get(SECTION_TITLES.SCENE_DESCRIPTION.value, "")
-    teaching_md = sections.get(SECTION_TITLES.TEACHING_NARRATIVE.value, "")
 
+def _run_panel_stages(
+    doc: MarkdownDocument,
+    panel,
+    registry: CharacterRegistry,
+    characters_per_role: int,
+    executor: Optional[Executor] = None,
+    scene_analysis: Optional[SceneAnalysisPydantic] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Runs the panel's API stages on a stage graph without touching the
+    document. Scene analysis, summary and narration need only the panel
+    markdown and run concurrently; casting waits for the analysis, and the
+    speech bubbles wait for the cast and the summary. A `scene_analysis`
+    from the planning pass is used instead of requesting a new one. Stages
+    run on `executor` when given, otherwise on a pool of their own.
+    """
+    scene_md, teaching_md = _panel_scene_and_teaching(doc, panel)
     if not scene_md.strip() and not teaching_md.strip():
-        logger.warning("Panel %s has no Scene or Teaching Narrative.", panel_title)
+        logger.warning("Panel %s has no Scene or Teaching Narrative.", panel.panel_title_text)
         return None
 
-    # 🔹 STEP 1: Generate scene analysis and assign to panel
-    scene_analysis = generate_scene_analysis_from_ai(scene_md, teaching_md)
-    panel.scene_analysis = scene_analysis
-
-    # 🔹 STEP 2: Resolve required roles from scene type
-    tag_to_roles = {
-        "Teaching Scene": ["Senior SRE", "Junior Developer", "Product Owner"],
-        "Chaos Scene": ["Support Engineer", "Angry Customer", "SRE Engineer"],
-        "Reflection Scene": ["Senior SRE", "Product Owner"],
-        "Meta Scene": ["Senior SRE"],
+    initial = {
+        "scene_md": scene_md,
+        "teaching_md": teaching_md,
+        "registry": registry,
+        "characters_per_role": characters_per_role,
     }
-    required_roles = set()
-    for tag in scene_analysis.scene_types:
-        required_roles.update(tag_to_roles.get(tag, []))
-    required_roles = list(required_roles)
+    if scene_analysis is not None:
+        initial["scene_analysis"] = scene_analysis
+    return PANEL_STAGES.run(initial, executor)
 
-    # 🔹 STEP 3: Ensure required characters exist
-    existing_roles = {
-        c["role"] for c in character_data.get("characters", {}).values() if "role" in c
-    }
-    new_roles = [r for r in required_roles if r not in existing_roles]
-    if new_roles:
-        generate_character_profiles_for_roles(
-            new_roles,
-            input_json_path=character_json_path,
-            output_json_path=character_json_path,
-            characters_per_role=characters_per_role,
-        )
-        with open(character_json_path, "r", encoding="utf-8") as f:
-            character_data = json.load(f)
 
-    # 🔹 STEP 4: Assign characters to roles
+def _finish_panel_from_stages(
+    doc: MarkdownDocument,
+    panel,
+    values: Dict[str, Any],
+    chapter_prefix: str,
+    images_folder: str,
+) -> Dict:
+    return _finish_panel(
+        doc,
+        panel,
+        values["scene_analysis"],
+        values["scene_summary"],
+        values["cast"],
+        values["speech_bubbles"],
+        values["narration"],
+        chapter_prefix,
+        images_folder,
+    )
+
+
+def _summary_stage(scene_md: str, teaching_md: str) -> str:
+    return _fit_scene_summary(rewrite_scene_and_teaching_as_summary(scene_md, teaching_md))
+
+
+def _speech_bubbles_stage(
+    scene_summary: str, cast: Dict[str, str], registry: CharacterRegistry
+) -> Dict[str, str]:
+    names = list(cast.values())
+    return generate_speech_bubbles_for_panel(
+        scene_summary, names, registry.character_data(names)
+    )
+
+
+def _panel_scene_and_teaching(doc: MarkdownDocument, panel) -> Tuple[str, str]:
+    sections = doc.extract_named_sections_from_panel(panel.panel_number_in_doc)
+    return (
+        sections.get(SECTION_TITLES.SCENE_DESCRIPTION.value, ""),
+        sections.get(SECTION_TITLES.TEACHING_NARRATIVE.value, ""),
+    )
+
+
+def _cast_panel(
+    scene_analysis: SceneAnalysisPydantic,
+    registry: CharacterRegistry,
+    characters_per_role: int,
+) -> Dict[str, str]:
+    """
+    Resolves the roles the scene types require, generates profiles for roles
+    no character has yet, and assigns one character per role. Returns
+    {role: character name}.
+    """
+    # Sorted so prompts built from the cast are the same on every run.
+    required_roles = sorted(_required_roles(scene_analysis))
+
+    if registry.missing_roles(required_roles):
+        # Panels may run concurrently: one at a time generates, after picking
+        # up roles other panels or processes added meanwhile.
+        with _CHARACTER_GENERATION_LOCK:
+            registry.refresh()
+            new_roles = registry.missing_roles(required_roles)
+            if new_roles:
+                add_character_profiles_for_roles(
+                    new_roles, registry, characters_per_role=characters_per_role
+                )
+
     role_to_character = {}
     used_names = set()
     for role in required_roles:
-        candidates = [
-            name
-            for name, profile in character_data["characters"].items()
-            if profile.get("role") == role and name not in used_names
-        ]
-        if candidates:
-            selected = candidates[0]
-            role_to_character[role] = selected
-            used_names.add(selected)
-
-    characters_in_frame = list(role_to_character.values())
-
-    # 🔹 STEP 5: Generate scene summary
-    scene_summary = rewrite_scene_and_teaching_as_summary(scene_md, teaching_md).strip()
+        for name in registry.names_for_role(role):
+            if name not in used_names:
+                role_to_character[role] = name
+                used_names.add(name)
+                break
+    return role_to_character
+
+
+def _required_roles(scene_analysis: SceneAnalysisPydantic) -> set:
+    required_roles = set()
+    for tag in scene_analysis.scene_types:
+        required_roles.update(TAG_TO_ROLES.get(tag, []))
+    return required_roles
+
+
+def _fit_scene_summary(scene_summary: str) -> str:
+    scene_summary = scene_summary.strip()
     if len(scene_summary) < 350:
         scene_summary += " (Expanded.)"
     elif len(scene_summary) > 750:
         scene_summary = scene_summary[:745] + "..."
-
-    # 🔹 STEP 6: Generate narration + speech bubbles
-    speech_bubbles = generate_speech_bubbles_for_panel(
-        scene_summary, characters_in_frame, character_data
+    return scene_summary
+
+
+PANEL_STAGES = (
+    StageGraph("panel")
+    .add("scene_analysis", generate_scene_analysis_from_ai, ["scene_md", "teaching_md"])
+    .add("scene_summary", _summary_stage, ["scene_md", "teaching_md"])
+    .add("narration", generate_narration_title_for_panel, ["scene_md", "teaching_md"])
+    .add(
+        "cast",
+        _cast_panel,
+        ["scene_analysis", "registry", "characters_per_role"],
     )
-    narration = generate_narration_title_for_panel(scene_md, teaching_md)
+    .add("speech_bubbles", _speech_bubbles_stage, ["scene_summary", "cast", "registry"])
+)
+
+
+def _finish_panel(
+    doc: MarkdownDocument,
+    panel,
+    scene_analysis: SceneAnalysisPydantic,
+    scene_summary: str,
+    role_to_character: Dict[str, str],
+    speech_bubbles: Dict[str, str],
+    narration: str,
+    chapter_prefix: str,
+    images_folder: str,
+) -> Dict:
+    """Writes the summary and image link into the panel and returns its JSON entry."""
+    panel_id = panel.panel_number_in_doc
+    panel_title = panel.panel_title_text
+    panel.scene_analysis = scene_analysis
 
-    # 🔹 STEP 7: Update panel scene markdown
     safe_title = (
         panel_title.lower()
         .replace(" ", "-")
@@ -120,14 +237,13 @@ def process_panel_to_json(
     updated_scene = f"{scene_summary}\n\n{image_markdown}"
     doc.update_named_section_in_panel(panel_id, "Scene Description", updated_scene)
 
-    # 🔹 STEP 8: Return panel metadata for JSON output
     return {
         "panel": panel_id,
         "filename": filename,
         "scene_tags": scene_analysis.scene_types,
         "scene_analysis": scene_analysis.model_dump(),  # ✅ updated here
         "scene_description": scene_summary,
-        "characters_in_frame": characters_in_frame,
+        "characters_in_frame": list(role_to_character.values()),
         "character_roles": role_to_character,
         "speech_bubbles": speech_bubbles,
         "narration": narration,
@@ -141,50 +257,350 @@ def process_chapter_for_visual_panels(
     output_json_path: Path,
     images_folder: str = "images",
     characters_per_role: int = 2,
+    max_workers: int = COMIC_PIPELINE_MAX_WORKERS,
+    scene_analyses: Optional[Dict[int, SceneAnalysisPydantic]] = None,
 ):
+    """
+    Runs the visual pipeline for every panel. All panels' stages share one
+    pool of `max_workers` threads, so at most that many API calls are in
+    flight. Panel JSON entries and scene markdown updates are then applied
+    in panel order, so the outputs do not depend on which panel finished
+    first. Characters for missing roles are planned before any panel is
+    processed; pass the `scene_analyses` plan_characters_for_chapters
+    returned for this chapter to skip that step.
+    """
+    doc = _load_chapter(chapter_md_path)
+    if doc is None:
+        return
+    registry = CharacterRegistry.for_path(character_json_path)
+
+    chapter_prefix = chapter_md_path.stem.lower()  # e.g. "chapter_03"
+    panels = _chapter_panels(doc)
+    if scene_analyses is None:
+        analyses = _plan_characters(
+            [(doc, panel) for panel in panels], registry, characters_per_role, max_workers
+        )
+        scene_analyses = {
+            panel.panel_number_in_doc: analysis
+            for panel, analysis in zip(panels, analyses)
+            if analysis is not None
+        }
+
+    max_workers = max(1, max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as stage_pool:
+
+        def run(panel):
+            return _run_panel_stages(
+                doc,
+                panel,
+                registry,
+                characters_per_role,
+                stage_pool,
+                scene_analysis=scene_analyses.get(panel.panel_number_in_doc),
+            )
+
+        if max_workers > 1 and len(panels) > 1:
+            # Panel threads only wait on their stages, which run in
+            # stage_pool; sharing one pool would deadlock.
+            with ThreadPoolExecutor(max_workers=max_workers) as panel_pool:
+                stage_values = list(panel_pool.map(run, panels))
+        else:
+            stage_values = [run(panel) for panel in panels]
+
+    registry.flush()
+
+    all_panel_json = []
+    for panel, values in zip(panels, stage_values):
+        if values is not None:
+            all_panel_json.append(
+                _finish_panel_from_stages(
+                    doc, panel, values, chapter_prefix, images_folder
+                )
+            )
+
+    _save_chapter_outputs(doc, all_panel_json, output_md_path, output_json_path)
+
+
+def plan_characters_for_chapters(
+    chapter_md_paths: Sequence[Path],
+    character_json_path: Path,
+    characters_per_role: int = 2,
+    max_workers: int = COMIC_PIPELINE_MAX_WORKERS,
+) -> Dict[str, Dict[int, SceneAnalysisPydantic]]:
+    """
+    Planning pass over a corpus: analyses every panel's scene, collects the
+    roles the scene types require and generates all missing characters in
+    one packed pass, before any panel is processed. Returns the scene
+    analyses by chapter path and panel number, for
+    process_chapter_for_visual_panels to reuse.
+    """
+    registry = CharacterRegistry.for_path(character_json_path)
+    jobs = []
+    for chapter_md_path in chapter_md_paths:
+        doc = _load_chapter(Path(chapter_md_path))
+        if doc is not None:
+            jobs.extend((str(chapter_md_path), doc, panel) for panel in _chapter_panels(doc))
+    analyses = _plan_characters(
+        [(doc, panel) for _, doc, panel in jobs], registry, characters_per_role, max_workers
+    )
+    plan = {str(chapter_md_path): {} for chapter_md_path in chapter_md_paths}
+    for (chapter, _, panel), analysis in zip(jobs, analyses):
+        if analysis is not None:
+            plan[chapter][panel.panel_number_in_doc] = analysis
+    return plan
+
+
+def _plan_characters(
+    panels: Sequence[Tuple[MarkdownDocument, Any]],
+    registry: CharacterRegistry,
+    characters_per_role: int,
+    max_workers: int,
+) -> List[Optional[SceneAnalysisPydantic]]:
+    """
+    Analyses the (doc, panel) pairs' scenes, up to `max_workers` at a time,
+    and generates characters for every required role the registry lacks.
+    Returns the analyses in order; None for panels without content.
+    """
+
+    def analyse(item):
+        doc, panel = item
+        scene_md, teaching_md = _panel_scene_and_teaching(doc, panel)
+        if not scene_md.strip() and not teaching_md.strip():
+            return None
+        return generate_scene_analysis_from_ai(scene_md, teaching_md)
+
+    if max_workers > 1 and len(panels) > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            analyses = list(pool.map(analyse, panels))
+    else:
+        analyses = [analyse(item) for item in panels]
+
+    required_roles = set()
+    for analysis in analyses:
+        if analysis is not None:
+            required_roles.update(_required_roles(analysis))
+    generate_profiles_for_missing_roles(required_roles, registry, characters_per_role)
+    return analyses
+
+
+def _chapter_panels(doc: MarkdownDocument) -> List[Any]:
+    return [
+        panel
+        for panel in doc.chapter_model.document_elements
+        if hasattr(panel, "panel_number_in_doc")
+    ]
+
 
+def _load_chapter(chapter_md_path: Path) -> Optional[MarkdownDocument]:
     # Check if the input path is a file
     if not chapter_md_path.is_file():
         logger.error("❌ Input path is not a file: %s", chapter_md_path)
-        return
+        return None
 
     doc = MarkdownDocument(filepath=str(chapter_md_path))
 
     if not doc.chapter_model:
         logger.error("❌ Failed to parse: %s", chapter_md_path.name)
-        return
+        return None
+    return doc
 
-    # Load character profile JSON
-    with open(character_json_path, "r", encoding="utf-8") as f:
-        character_data = json.load(f)
 
-    all_panel_json = []
-    chapter_prefix = chapter_md_path.stem.lower()  # e.g. "chapter_03"
+def _save_chapter_outputs(
+    doc: MarkdownDocument,
+    all_panel_json: List[Dict],
+    output_md_path: Path,
+    output_json_path: Path,
+) -> None:
+    # Save final chapter image JSON
+    with open(output_json_path, "w", encoding="utf-8") as jf:
+        json.dump({"panels": all_panel_json}, jf, indent=2, ensure_ascii=False)
+
+    # Save final markdown file
+    doc.save_document(str(output_md_path))
+    logger.info("✅ Chapter markdown + panel JSON saved.")
 
-    for panel in doc.chapter_model.document_elements:
-        if not hasattr(panel, "panel_number_in_doc"):
-            continue
 
-        panel_json = process_panel_to_json(
-            doc=doc,
-            panel=panel,
-            character_data=character_data,
-            character_json_path=character_json_path,
-            characters_per_role=characters_per_role,
-            chapter_prefix=chapter_prefix,
+def write_visual_panel_batch_requests(
+    chapter_md_path: Path,
+    character_json_path: Path,
+    requests_path: Path,
+    results_paths: Sequence[Path] = (),
+    characters_per_role: int = 2,
+) -> int:
+    """
+    Batch API mode for process_chapter_for_visual_panels, planning step:
+    writes the requests the next round needs to `requests_path`. Round one
+    asks for each panel's scene analysis, summary and narration; round two,
+    given those results, asks for the speech bubbles. Characters for the
+    roles the round-one scene analyses require are generated in one planning
+    pass before round two is written. Returns the number of requests
+    written; 0 means the chapter can be ingested.
+    """
+    doc = _load_chapter(chapter_md_path)
+    if doc is None:
+        return 0
+    registry = CharacterRegistry.for_path(character_json_path)
+    results = read_batch_results(results_paths)
+    file_key = Path(doc.filepath).name
+    required_roles = set()
+    for panel in doc.list_panels():
+        scene_analysis = _batch_scene_analysis(
+            file_key, panel, *_panel_scene_and_teaching(doc, panel), results
+        )
+        if scene_analysis is not None:
+            required_roles.update(_required_roles(scene_analysis))
+    generate_profiles_for_missing_roles(required_roles, registry, characters_per_role)
+    with BatchRequestWriter(requests_path) as writer:
+        for panel in doc.list_panels():
+            _batch_visual_panel(
+                doc, panel, results, registry, characters_per_role, writer=writer
+            )
+    registry.flush()
+    return writer.count
+
+
+def ingest_visual_panel_batch_results(
+    chapter_md_path: Path,
+    character_json_path: Path,
+    output_md_path: Path,
+    output_json_path: Path,
+    results_paths: Sequence[Path],
+    images_folder: str = "images",
+    characters_per_role: int = 2,
+) -> None:
+    """
+    Batch API mode, ingest step: builds every panel's JSON entry and updated
+    scene markdown from the batch results and saves both outputs. Panels
+    whose results are incomplete are left out.
+    """
+    doc = _load_chapter(chapter_md_path)
+    if doc is None:
+        return
+    registry = CharacterRegistry.for_path(character_json_path)
+    results = read_batch_results(results_paths)
+    all_panel_json = []
+    for panel in doc.list_panels():
+        panel_json = _batch_visual_panel(
+            doc,
+            panel,
+            results,
+            registry,
+            characters_per_role,
+            chapter_prefix=chapter_md_path.stem.lower(),
             images_folder=images_folder,
         )
-
         if panel_json:
             all_panel_json.append(panel_json)
+    registry.flush()
+    _save_chapter_outputs(doc, all_panel_json, output_md_path, output_json_path)
 
-    # Save final chapter image JSON
-    with open(output_json_path, "w", encoding="utf-8") as jf:
-        json.dump({"panels": all_panel_json}, jf, indent=2, ensure_ascii=False)
 
-    # Save final markdown file
-    doc.save_document(str(output_md_path))
-    logger.info("✅ Chapter markdown + panel JSON saved.")
+def _batch_visual_panel(
+    doc: MarkdownDocument,
+    panel,
+    results: Dict[str, str],
+    registry: CharacterRegistry,
+    characters_per_role: int,
+    writer: Optional[BatchRequestWriter] = None,
+    chapter_prefix: str = "",
+    images_folder: str = "images",
+) -> Optional[Dict]:
+    """
+    Walks process_panel_to_json's stages against the batch `results`.
+    Missing answers are written to `writer`; without a writer and with all
+    answers present, the panel is finished and its JSON entry returned.
+    """
+    scene_md, teaching_md = _panel_scene_and_teaching(doc, panel)
+    if not scene_md.strip() and not teaching_md.strip():
+        logger.warning("Panel %s has no Scene or Teaching Narrative.", panel.panel_title_text)
+        return None
+
+    file_key = Path(doc.filepath).name
+    panel_id = panel.panel_number_in_doc
+    first_round = {
+        "scene_analysis": (
+            _scene_analysis_prompt(scene_md, teaching_md),
+            OPENAI_MODEL_DEFAULT,
+            OPENAI_TEMP_DEFAULT,
+        ),
+        "scene_summary": (
+            _scene_summary_prompt(scene_md, teaching_md),
+            OPENAI_MODEL_DEFAULT,
+            OPENAI_TEMP_DEFAULT,
+        ),
+        "narration_title": (
+            _narration_title_prompt(scene_md, teaching_md),
+            OPENAI_MODEL_SPEECH,
+            OPENAI_TEMP_SPEECH,
+        ),
+    }
+    answers = {}
+    for stage, (prompt, model, temperature) in first_round.items():
+        custom_id = make_custom_id(file_key, panel_id, "", stage)
+        if custom_id in results:
+            answers[stage] = results[custom_id]
+        elif writer is not None:
+            writer.add(custom_id, model, prompt, temperature)
+    if len(answers) < len(first_round):
+        if writer is None:
+            logger.warning("Incomplete batch results for panel %s", panel.panel_title_text)
+        return None
+
+    scene_analysis = _batch_scene_analysis(file_key, panel, scene_md, teaching_md, results)
+    role_to_character = _cast_panel(scene_analysis, registry, characters_per_role)
+    scene_summary = _fit_scene_summary(answers["scene_summary"])
+
+    bubbles_id = make_custom_id(file_key, panel_id, "", "speech_bubbles")
+    if bubbles_id not in results:
+        if writer is not None:
+            names = list(role_to_character.values())
+            prompt = _speech_bubbles_prompt(
+                scene_summary, names, registry.character_data(names)
+            )
+            writer.add(bubbles_id, OPENAI_MODEL_SPEECH, prompt, OPENAI_TEMP_SPEECH)
+        else:
+            logger.warning("Incomplete batch results for panel %s", panel.panel_title_text)
+        return None
+    if writer is not None:
+        return None
+
+    try:
+        speech_bubbles = _parse_speech_bubbles(results[bubbles_id])
+    except Exception as e:
+        logger.error("Invalid batch speech bubbles for panel %s: %s", panel_id, e)
+        speech_bubbles = {}
+    panel_json = _finish_panel(
+        doc,
+        panel,
+        scene_analysis,
+        scene_summary,
+        role_to_character,
+        speech_bubbles,
+        answers["narration_title"].strip(),
+        chapter_prefix,
+        images_folder,
+    )
+    return panel_json
+
+
+def _batch_scene_analysis(
+    file_key: str,
+    panel,
+    scene_md: str,
+    teaching_md: str,
+    results: Dict[str, str],
+) -> Optional[SceneAnalysisPydantic]:
+    """The panel's scene analysis from the batch `results`; None if not there yet."""
+    custom_id = make_custom_id(file_key, panel.panel_number_in_doc, "", "scene_analysis")
+    if custom_id not in results:
+        return None
+    try:
+        return _parse_scene_analysis(results[custom_id], scene_md, teaching_md)
+    except Exception as e:
+        logger.error(
+            "Invalid batch scene analysis for panel %s: %s", panel.panel_number_in_doc, e
+        )
+        return _fallback_scene_analysis()
 
 
 def generate_image_prompt_from_panel(panel_json: Dict, character_data: Dict) -> str:
@@ -1,5 +1,7 @@
 # config.py
 
+import os
+
 # OpenAI Model Names
 OPENAI_MODEL_DEFAULT = "gpt-4o-2024-11-20"
 OPENAI_MODEL_SUGGESTION = "gpt-4o-2024-11-20"
@@ -13,3 +15,91 @@ OPENAI_TEMP_ENHANCEMENT = 0.7
 OPENAI_TEMP_SPEECH = 0.7
 
 # Add more as needed (e.g., MAX_TOKENS, etc.)
+
+# Parse cache: built chapter models stored on disk, keyed by content hash.
+# Set MARKDOWN_EDITOR_PARSE_CACHE=0 to disable.
+PARSE_CACHE_ENABLED = os.environ.get("MARKDOWN_EDITOR_PARSE_CACHE", "1") != "0"
+PARSE_CACHE_DIR = os.environ.get(
+    "MARKDOWN_EDITOR_PARSE_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "markdown_editor", "parse"),
+)
+PARSE_CACHE_MAX_ENTRIES = 2048
+
+# Corpus loader: worker processes used to parse directories of chapters.
+# None uses one worker per CPU.
+CORPUS_LOADER_MAX_WORKERS = None
+
+# Metrics: per-stage timings and counters for loading, rendering and saving.
+# Set MARKDOWN_EDITOR_METRICS=1 to enable; the *_PATH variables name files the
+# registry is dumped to at the end of a batch run.
+METRICS_ENABLED = os.environ.get("MARKDOWN_EDITOR_METRICS", "0") == "1"
+METRICS_JSON_PATH = os.environ.get("MARKDOWN_EDITOR_METRICS_JSON")
+METRICS_PROMETHEUS_PATH = os.environ.get("MARKDOWN_EDITOR_METRICS_PROM")
+
+# OpenAI response cache: completions stored in SQLite, keyed by model,
+# temperature, prompt template version and prompt hash.
+# MARKDOWN_EDITOR_OPENAI_CACHE=0 disables it; MARKDOWN_EDITOR_OFFLINE=1 serves
+# only cached responses and never calls the API.
+OPENAI_CACHE_ENABLED = os.environ.get("MARKDOWN_EDITOR_OPENAI_CACHE", "1") != "0"
+OPENAI_CACHE_PATH = os.environ.get(
+    "MARKDOWN_EDITOR_OPENAI_CACHE_PATH",
+    os.path.join(
+        os.path.expanduser("~"), ".cache", "markdown_editor", "openai_responses.sqlite3"
+    ),
+)
+OPENAI_CACHE_MAX_ENTRIES = 50000
+OPENAI_CACHE_MAX_AGE_DAYS = 90
+OPENAI_CACHE_OFFLINE = os.environ.get("MARKDOWN_EDITOR_OFFLINE", "0") == "1"
+
+# Async OpenAI API: maximum number of requests in flight per event loop.
+OPENAI_MAX_CONCURRENT_REQUESTS = 64
+
+# OpenAI rate limits: requests and estimated tokens per minute, per model.
+# Models without an entry use "default". Every API call waits on a shared
+# token bucket; with the "sqlite" backend the buckets live in
+# OPENAI_RATE_LIMIT_PATH and are shared by all processes on the machine.
+OPENAI_RATE_LIMITS = {
+    "default": {
+        "rpm": int(os.environ.get("MARKDOWN_EDITOR_OPENAI_RPM", "500")),
+        "tpm": int(os.environ.get("MARKDOWN_EDITOR_OPENAI_TPM", "30000")),
+    },
+}
+OPENAI_RATE_LIMIT_BACKEND = os.environ.get(
+    "MARKDOWN_EDITOR_RATE_LIMIT_BACKEND", "sqlite"
+)  # "sqlite" or "memory"
+OPENAI_RATE_LIMIT_PATH = os.environ.get(
+    "MARKDOWN_EDITOR_RATE_LIMIT_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "markdown_editor", "rate_limits.sqlite3"),
+)
+# Completion tokens assumed per request until the response reports its usage.
+OPENAI_EXPECTED_COMPLETION_TOKENS = 1000
+# Retries of rate-limited (429) and transient server errors.
+OPENAI_MAX_RETRIES = 5
+
+# OpenAI Batch API: completion window requested for submitted batches.
+OPENAI_BATCH_COMPLETION_WINDOW = "24h"
+
+# Batched requests (roles, suggestions, multi-section rewrites) are packed
+# into prompts of at most this many estimated tokens, per model. Token counts
+# use tiktoken when installed, otherwise OPENAI_CHARS_PER_TOKEN calibrated
+# against the usage responses report.
+OPENAI_BATCH_PROMPT_TOKEN_BUDGETS = {"default": 12000}
+OPENAI_CHARS_PER_TOKEN = 4.0
+
+# Comic image pipeline: panels processed concurrently per chapter.
+COMIC_PIPELINE_MAX_WORKERS = 4
+
+# Character registry: new character profiles are written to the character
+# JSON file in batches of at most this many (and at the end of each run).
+CHARACTER_REGISTRY_FLUSH_EVERY = 50
+
+# Character generation for missing roles: roles are packed into requests of
+# at most this many new profiles, sent up to this many at a time.
+CHARACTER_GENERATION_MAX_PROFILES_PER_REQUEST = 12
+CHARACTER_GENERATION_MAX_WORKERS = 4
+# Profile prompts list at most this many existing names to avoid; generated
+# names that equal or sound like an existing one are rejected locally and
+# only those slots are requested again, in up to CHARACTER_GENERATION_MAX_ROUNDS
+# requests per batch of roles.
+CHARACTER_PROMPT_MAX_EXCLUDED_NAMES = 40
+CHARACTER_GENERATION_MAX_ROUNDS = 3
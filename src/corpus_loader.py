@@ -0,0 +1,115 @@
+# corpus_loader.py
+
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+from config import CORPUS_LOADER_MAX_WORKERS
+from document_model import ChapterPydantic
+from markdown_document import MarkdownDocument
+from metrics import METRICS
+from parse_cache import ParseCache
+
+logger = logging.getLogger(__name__)
+
+LoadedDocument = Tuple[Path, Optional[MarkdownDocument]]
+
+
+def _build_chapter(
+    filepath: str, parse_cache: Union[ParseCache, bool, None] = True
+) -> Optional[Tuple[str, str, dict]]:
+    """
+    Worker: parses and builds one file, returning (raw_content, model JSON,
+    metrics recorded for this file).
+    """
+    METRICS.reset()
+    doc = MarkdownDocument(parse_cache=parse_cache)
+    if not doc.load_and_process(filepath):
+        return None
+    return doc.raw_content, doc.chapter_model.model_dump_json(), METRICS.snapshot()
+
+
+class CorpusLoader:
+    """
+    Discovers markdown files and parses/builds their ChapterPydantic models
+    across a process pool. Models cross the process boundary as JSON (without
+    mistletoe blocks, like a parse cache hit) and are wrapped in
+    MarkdownDocument instances in the calling process.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = CORPUS_LOADER_MAX_WORKERS,
+        recursive: bool = False,
+        max_files: Optional[int] = None,
+        pattern: str = "*.md",
+        parse_cache: Union[ParseCache, bool, None] = True,
+    ):
+        """`parse_cache` is passed to every MarkdownDocument built."""
+        self.max_workers = max_workers
+        self.recursive = recursive
+        self.max_files = max_files
+        self.pattern = pattern
+        self.parse_cache = parse_cache
+
+    def discover(self, source: Union[str, Path]) -> List[Path]:
+        """Returns the matching files under `source` (or `source` itself), sorted."""
+        source = Path(source)
+        if source.is_file():
+            return [source]
+        if not source.is_dir():
+            logger.error("Corpus source '%s' not found.", source)
+            return []
+        found = source.rglob(self.pattern) if self.recursive else source.glob(self.pattern)
+        paths = sorted(path for path in found if path.is_file())
+        if self.max_files is not None:
+            paths = paths[: self.max_files]
+        return paths
+
+    def load(self, source: Union[str, Path, Iterable[Path]]) -> List[LoadedDocument]:
+        return list(self.iter_documents(source))
+
+    def iter_documents(
+        self, source: Union[str, Path, Iterable[Path]], ordered: bool = True
+    ) -> Iterator[LoadedDocument]:
+        """
+        Yields (path, MarkdownDocument) pairs, in discovery order when
+        `ordered` is True and as soon as each file is built otherwise. The
+        document is None for files that failed to load.
+        """
+        if isinstance(source, (str, Path)):
+            paths = self.discover(source)
+        else:
+            paths = [Path(path) for path in source]
+        if len(paths) <= 1 or self.max_workers == 1:
+            for path in paths:
+                doc = MarkdownDocument(filepath=str(path), parse_cache=self.parse_cache)
+                yield path, doc if doc.chapter_model else None
+            return
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(_build_chapter, str(path), self.parse_cache): path for path in paths}
+            if ordered:
+                pending = ((path, future) for future, path in futures.items())
+            else:
+                pending = ((futures[future], future) for future in as_completed(futures))
+            for path, future in pending:
+                yield path, self._document_from_future(path, future)
+
+    @staticmethod
+    def _document_from_future(path: Path, future) -> Optional[MarkdownDocument]:
+        try:
+            built = future.result()
+        except Exception as e:
+            logger.error("Worker failed to load '%s': %s", path, e)
+            return None
+        if built is None:
+            logger.error("Failed to load '%s'.", path)
+            return None
+        raw_content, model_json, worker_metrics = built
+        METRICS.merge(worker_metrics)
+        doc = MarkdownDocument(parse_cache=False)
+        doc.load_built(
+            str(path), raw_content, ChapterPydantic.model_validate_json(model_json)
+        )
+        return doc
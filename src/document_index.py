@@ -0,0 +1,79 @@
+# document_index.py
+
+import logging
+from typing import Dict, List, Optional
+
+from document_model import ChapterPydantic, H3Pydantic, PanelPydantic
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentIndex:
+    """
+    Dictionary indexes over a chapter model for O(1) panel and section lookup:
+    panel number -> panel, panel title -> panel and (panel number, H3 title) -> H3.
+    When titles repeat, the first occurrence wins.
+    """
+
+    def __init__(self, chapter_model: Optional[ChapterPydantic] = None):
+        self.panels: List[PanelPydantic] = []
+        self.panels_by_number: Dict[int, PanelPydantic] = {}
+        self.panels_by_title: Dict[str, PanelPydantic] = {}
+        self.h3_by_panel: Dict[int, Dict[str, H3Pydantic]] = {}
+        if chapter_model:
+            self.rebuild(chapter_model)
+
+    def rebuild(self, chapter_model: ChapterPydantic) -> None:
+        self.panels = []
+        self.panels_by_number = {}
+        self.panels_by_title = {}
+        self.h3_by_panel = {}
+        for element in chapter_model.document_elements:
+            if isinstance(element, PanelPydantic):
+                self.panels.append(element)
+                self._add_panel(element)
+
+    def replace_panel(self, old_panel: PanelPydantic, new_panel: PanelPydantic) -> None:
+        """Swaps one panel for another, e.g. after an incremental rebuild."""
+        for position, panel in enumerate(self.panels):
+            if panel is old_panel:
+                self.panels[position] = new_panel
+                break
+        else:
+            logger.error("Panel '%s' is not indexed.", old_panel.panel_title_text)
+            return
+        if self.panels_by_number.get(old_panel.panel_number_in_doc) is old_panel:
+            del self.panels_by_number[old_panel.panel_number_in_doc]
+            self.h3_by_panel.pop(old_panel.panel_number_in_doc, None)
+        if self.panels_by_title.get(old_panel.panel_title_text) is old_panel:
+            del self.panels_by_title[old_panel.panel_title_text]
+            # Another panel with the same title may now be the first one.
+            for panel in self.panels:
+                if panel.panel_title_text == old_panel.panel_title_text:
+                    self.panels_by_title[panel.panel_title_text] = panel
+                    break
+        self._add_panel(new_panel)
+
+    def get_panel(self, panel_number: int) -> Optional[PanelPydantic]:
+        return self.panels_by_number.get(panel_number)
+
+    def get_panel_by_title(self, panel_title: str) -> Optional[PanelPydantic]:
+        return self.panels_by_title.get(panel_title.strip())
+
+    def get_h3_sections(self, panel_number: int) -> Dict[str, H3Pydantic]:
+        return self.h3_by_panel.get(panel_number, {})
+
+    def get_h3(self, panel_number: int, h3_title: str) -> Optional[H3Pydantic]:
+        return self.get_h3_sections(panel_number).get(h3_title.strip())
+
+    def _add_panel(self, panel: PanelPydantic) -> None:
+        self.panels_by_title.setdefault(panel.panel_title_text, panel)
+        if panel.panel_number_in_doc is None:
+            return
+        if panel.panel_number_in_doc in self.panels_by_number:
+            return
+        self.panels_by_number[panel.panel_number_in_doc] = panel
+        sections: Dict[str, H3Pydantic] = {}
+        for h3_section in panel.h3_sections:
+            sections.setdefault(h3_section.heading_text.strip(), h3_section)
+        self.h3_by_panel[panel.panel_number_in_doc] = sections
@@ -1,10 +1,9 @@
 # document_model.py
 from typing import Any, Dict, List, Optional, Union
 
-from mistletoe import Document
 from mistletoe.block_token import BlockToken, Heading
 from mistletoe.markdown_renderer import MarkdownRenderer
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 
 from logging_config import setup_logging, get_logger
 
@@ -55,14 +54,7 @@ def render_blocks_to_markdown(
     valid_blocks = [b for b in blocks if b is not None and isinstance(b, BlockToken)]
     if not valid_blocks:
         return ""
-    temp_doc = Document("")
-    try:
-        temp_doc.children = valid_blocks
-    except Exception as e:
-        logger.error("Error assigning children in render_blocks_to_markdown: %s", e)
-        logger.debug("Problematic valid_blocks (first 5): %s", valid_blocks[:5])
-        return "Error: Could not render blocks."
-    return renderer.render(temp_doc).strip()
+    return renderer.render_blocks(valid_blocks).strip()
 
 
 _MODULE_LEVEL_RENDERER_INSTANCE: Optional[MarkdownRenderer] = None
@@ -92,14 +84,18 @@ class SceneAnalysisPydantic(BaseModel):
 # --- Pydantic Models ---
 class H4Pydantic(BaseModel):
     heading_text: str
-    mistletoe_h4_block: Optional[Any] = None
+    mistletoe_h4_block: Optional[Any] = Field(default=None, exclude=True)
     content_markdown: str = ""
     h4_number_in_h3: int
+    # Character offsets of this element in the source file (end exclusive);
+    # None when the model was not built from source text.
+    source_start: Optional[int] = None
+    source_end: Optional[int] = None
 
 
 class H3Pydantic(BaseModel):
     heading_text: str
-    mistletoe_h3_block: Optional[Any] = None
+    mistletoe_h3_block: Optional[Any] = Field(default=None, exclude=True)
     initial_content_markdown: str = ""
     h4_sections: List[H4Pydantic] = Field(default_factory=list)
     original_full_markdown: str = ""
@@ -108,28 +104,46 @@ class H3Pydantic(BaseModel):
     api_suggested_enhancement_reason: Optional[str] = None
     api_improved_markdown: Optional[str] = None
     h3_number_in_panel: int
+    source_start: Optional[int] = None
+    source_end: Optional[int] = None
+    # Cached rendering of this section; None means dirty.
+    _rendered_markdown: Optional[str] = PrivateAttr(default=None)
+
+    def mark_render_dirty(self) -> None:
+        self._rendered_markdown = None
 
 
 class PanelPydantic(BaseModel):
     panel_title_text: str
-    mistletoe_h2_block: Optional[Any] = None
+    mistletoe_h2_block: Optional[Any] = Field(default=None, exclude=True)
     h3_sections: List[H3Pydantic] = Field(default_factory=list)
     panel_number_in_doc: Optional[int] = None
     scene_analysis: Optional[SceneAnalysisPydantic] = None
+    source_start: Optional[int] = None
+    source_end: Optional[int] = None
+    # Cached rendering of the whole panel; None means dirty.
+    _rendered_markdown: Optional[str] = PrivateAttr(default=None)
+
+    def mark_render_dirty(self) -> None:
+        self._rendered_markdown = None
 
 
 class GenericContentPydantic(BaseModel):
     content_markdown: str
-    mistletoe_blocks: List[Any] = Field(default_factory=list)
+    mistletoe_blocks: List[Any] = Field(default_factory=list, exclude=True)
     title_text: Optional[str] = None
+    source_start: Optional[int] = None
+    source_end: Optional[int] = None
 
 
 class ChapterPydantic(BaseModel):
     chapter_title_text: str
-    mistletoe_h1_block: Optional[Any] = None
+    mistletoe_h1_block: Optional[Any] = Field(default=None, exclude=True)
     document_elements: List[Union[GenericContentPydantic, PanelPydantic]] = Field(
         default_factory=list
     )
+    source_start: Optional[int] = None
+    source_end: Optional[int] = None
 
     def get_scene_balance_feedback(self) -> str:
         counts = self.get_scene_distribution()
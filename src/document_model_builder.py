@@ -9,6 +9,7 @@ from mistletoe.block_token import BlockToken, Heading
 from document_model import (
     _MODULE_LEVEL_RENDERER_INSTANCE,
     ChapterPydantic,
+    GenericContentPydantic,
     H3Pydantic,
     H4Pydantic,
     PanelPydantic,
@@ -19,6 +20,9 @@ from document_model import (
 logger = logging.getLogger(__name__)
 
 PANEL_HEADING_PREFIX = "Panel "
+# Bump whenever the built model can change for the same input text; this
+# invalidates every entry in the persistent parse cache.
+BUILDER_VERSION = 2
 INITIAL_CONTENT_TITLE = "Initial Content"
 
 
@@ -26,9 +30,27 @@ class DocumentModelBuilder:
     """
     Builds a Pydantic model tree from a mistletoe AST.
     This class contains no file I/O or markdown string parsing logic.
+
+    By default the builder works in single-pass mode: every H3/H4 markdown
+    string is composed directly from the rendered top-level blocks. Pass
+    ``single_pass=False`` to use the legacy render -> parse -> render path,
+    which produces byte-identical output but is much slower on large chapters.
     """
 
-    def build(self, mistletoe_doc: Document) -> ChapterPydantic:
+    def __init__(self, single_pass: bool = True):
+        self.single_pass = single_pass
+
+    def build(
+        self, mistletoe_doc: Document, source_text: Optional[str] = None
+    ) -> ChapterPydantic:
+        """
+        Builds the chapter model. When `source_text` (the text the AST was
+        parsed from) is given in single-pass mode, every model records its
+        source_start/source_end offsets and its markdown strings are sliced
+        from the source instead of being re-rendered.
+        """
+        source = source_text if self._can_slice(mistletoe_doc, source_text) else None
+        source_end = len(source) if source is not None else None
         doc_elements: List[Union[PanelPydantic, Any]] = []
         current_generic_blocks: List[BlockToken] = []
         chapter_h1_block_node: Optional[Heading] = None
@@ -64,27 +86,18 @@ class DocumentModelBuilder:
             if is_h2_panel_heading and panel_h2_block_node:
                 # Save any accumulated generic blocks as a GenericContentPydantic
                 if current_generic_blocks:
-                    generic_title = None
-                    if isinstance(current_generic_blocks[0], Heading):
-                        generic_title = get_heading_text(current_generic_blocks[0])
-                    generic_md = render_blocks_to_markdown(
-                        current_generic_blocks, _MODULE_LEVEL_RENDERER_INSTANCE
-                    )
-                    from document_model import (
-                        GenericContentPydantic,
-                    )  # avoid circular import
-
                     doc_elements.append(
-                        GenericContentPydantic(
-                            content_markdown=generic_md,
-                            mistletoe_blocks=list(current_generic_blocks),
-                            title_text=generic_title,
+                        self._build_generic_content(
+                            current_generic_blocks,
+                            source,
+                            panel_h2_block_node.start_offset,
                         )
                     )
                     current_generic_blocks = []
                 panel_counter += 1
                 panel_content_blocks: List[BlockToken] = []
                 current_block_index += 1
+                panel_end = source_end
                 while current_block_index < len(all_top_level_blocks):
                     next_block = all_top_level_blocks[current_block_index]
                     if (
@@ -94,18 +107,17 @@ class DocumentModelBuilder:
                             PANEL_HEADING_PREFIX
                         )
                     ):
+                        panel_end = next_block.start_offset
                         break
                     panel_content_blocks.append(next_block)
                     current_block_index += 1
-                h3_sections = self._parse_h3_sections_from_panel_blocks(
-                    panel_content_blocks, _MODULE_LEVEL_RENDERER_INSTANCE
-                )
                 doc_elements.append(
-                    PanelPydantic(
-                        panel_title_text=panel_title_text,
-                        mistletoe_h2_block=panel_h2_block_node,
-                        h3_sections=h3_sections,
-                        panel_number_in_doc=panel_counter,
+                    self.build_panel(
+                        panel_h2_block_node,
+                        panel_content_blocks,
+                        panel_counter,
+                        source_text=source,
+                        panel_end=panel_end,
                     )
                 )
             else:
@@ -113,27 +125,246 @@ class DocumentModelBuilder:
                 current_block_index += 1
         # Any trailing generic content
         if current_generic_blocks:
-            generic_title = None
-            if isinstance(current_generic_blocks[0], Heading):
-                generic_title = get_heading_text(current_generic_blocks[0])
-            generic_md = render_blocks_to_markdown(
-                current_generic_blocks, _MODULE_LEVEL_RENDERER_INSTANCE
-            )
-            from document_model import GenericContentPydantic
-
             doc_elements.append(
-                GenericContentPydantic(
-                    content_markdown=generic_md,
-                    mistletoe_blocks=list(current_generic_blocks),
-                    title_text=generic_title,
-                )
+                self._build_generic_content(current_generic_blocks, source, source_end)
             )
         return ChapterPydantic(
             chapter_title_text=chapter_title,
             mistletoe_h1_block=chapter_h1_block_node,
             document_elements=doc_elements,
+            source_start=0 if source is not None else None,
+            source_end=source_end,
+        )
+
+    def build_panel(
+        self,
+        h2_block: Heading,
+        content_blocks: List[BlockToken],
+        panel_number: int,
+        source_text: Optional[str] = None,
+        panel_end: Optional[int] = None,
+    ) -> PanelPydantic:
+        """
+        Builds one PanelPydantic from its H2 heading and the blocks under it.
+        `source_text` and `panel_end` enable span tracking (single-pass only).
+        """
+        if self.single_pass:
+            h3_sections = self._build_h3_sections_single_pass(
+                content_blocks,
+                _MODULE_LEVEL_RENDERER_INSTANCE,
+                source_text=source_text,
+                section_end=panel_end,
+            )
+        else:
+            h3_sections = self._parse_h3_sections_from_panel_blocks(
+                content_blocks, _MODULE_LEVEL_RENDERER_INSTANCE
+            )
+        has_span = source_text is not None and self.single_pass
+        return PanelPydantic(
+            panel_title_text=get_heading_text(h2_block),
+            mistletoe_h2_block=h2_block,
+            h3_sections=h3_sections,
+            panel_number_in_doc=panel_number,
+            source_start=h2_block.start_offset if has_span else None,
+            source_end=panel_end if has_span else None,
+        )
+
+    def _can_slice(self, mistletoe_doc: Document, source_text: Optional[str]) -> bool:
+        if source_text is None or not self.single_pass:
+            return False
+        return all(
+            getattr(block, "start_offset", None) is not None
+            for block in mistletoe_doc.children
+        )
+
+    @staticmethod
+    def _build_generic_content(
+        blocks: List[BlockToken], source_text: Optional[str], end: Optional[int]
+    ) -> GenericContentPydantic:
+        generic_title = None
+        if isinstance(blocks[0], Heading):
+            generic_title = get_heading_text(blocks[0])
+        if source_text is not None:
+            start = blocks[0].start_offset
+            return GenericContentPydantic(
+                content_markdown=source_text[start:end].strip(),
+                mistletoe_blocks=list(blocks),
+                title_text=generic_title,
+                source_start=start,
+                source_end=end,
+            )
+        return GenericContentPydantic(
+            content_markdown=render_blocks_to_markdown(
+                blocks, _MODULE_LEVEL_RENDERER_INSTANCE
+            ),
+            mistletoe_blocks=list(blocks),
+            title_text=generic_title,
+        )
+
+    def _build_h3_sections_single_pass(
+        self,
+        panel_blocks: List[BlockToken],
+        renderer,
+        source_text: Optional[str] = None,
+        section_end: Optional[int] = None,
+    ) -> List[H3Pydantic]:
+        """
+        Walks the panel's blocks once and groups them into H3/H4 sections.
+        Without `source_text` each block is rendered exactly once and the
+        output matches _parse_h3_sections_from_panel_blocks byte for byte;
+        with it, section strings are slices of the source.
+        """
+        if not panel_blocks:
+            return [
+                H3Pydantic(
+                    heading_text=INITIAL_CONTENT_TITLE,
+                    mistletoe_h3_block=None,
+                    initial_content_markdown="",
+                    h4_sections=[],
+                    original_full_markdown="",
+                    h3_number_in_panel=1,
+                    source_start=section_end if source_text is not None else None,
+                    source_end=section_end if source_text is not None else None,
+                )
+            ]
+        # (title, h3 block, blocks before the first H4, [(h4 block, blocks)])
+        groups: List[tuple] = []
+        active_h3_title = INITIAL_CONTENT_TITLE
+        active_h3_block: Optional[Heading] = None
+        initial_blocks: List[BlockToken] = []
+        h4_groups: List[tuple[Heading, List[BlockToken]]] = []
+        has_blocks = False
+
+        for block in panel_blocks:
+            if isinstance(block, Heading) and block.level == 3:
+                if active_h3_block or (
+                    active_h3_title == INITIAL_CONTENT_TITLE and has_blocks
+                ):
+                    groups.append(
+                        (active_h3_title, active_h3_block, initial_blocks, h4_groups)
+                    )
+                active_h3_block = block
+                active_h3_title = get_heading_text(block)
+                initial_blocks = []
+                h4_groups = []
+                has_blocks = False
+                continue
+            has_blocks = True
+            if isinstance(block, Heading) and block.level == 4:
+                h4_groups.append((block, []))
+            elif h4_groups:
+                h4_groups[-1][1].append(block)
+            else:
+                initial_blocks.append(block)
+        # Final trailing H3
+        if active_h3_block or has_blocks:
+            groups.append((active_h3_title, active_h3_block, initial_blocks, h4_groups))
+
+        h3_list: List[H3Pydantic] = []
+        for index, group in enumerate(groups):
+            if source_text is None:
+                h3_list.append(self._render_h3_section(*group, index + 1, renderer))
+            else:
+                next_start = (
+                    self._group_start(groups[index + 1])
+                    if index + 1 < len(groups)
+                    else section_end
+                )
+                h3_list.append(
+                    self._slice_h3_section(*group, index + 1, source_text, next_start)
+                )
+        return h3_list
+
+    @staticmethod
+    def _group_start(group: tuple) -> int:
+        _, h3_block, initial_blocks, h4_groups = group
+        if h3_block:
+            return h3_block.start_offset
+        return (initial_blocks[0] if initial_blocks else h4_groups[0][0]).start_offset
+
+    def _slice_h3_section(
+        self,
+        heading_text: str,
+        h3_block: Optional[Heading],
+        initial_blocks: List[BlockToken],
+        h4_groups: List[tuple[Heading, List[BlockToken]]],
+        h3_number: int,
+        source_text: str,
+        end: int,
+    ) -> H3Pydantic:
+        start = self._group_start((heading_text, h3_block, initial_blocks, h4_groups))
+        body_start = h3_block.end_offset if h3_block else start
+        initial_end = h4_groups[0][0].start_offset if h4_groups else end
+        h4s: List[H4Pydantic] = []
+        for h4_counter, (h4_block, _) in enumerate(h4_groups, start=1):
+            h4_end = (
+                h4_groups[h4_counter][0].start_offset
+                if h4_counter < len(h4_groups)
+                else end
+            )
+            h4s.append(
+                H4Pydantic(
+                    heading_text=get_heading_text(h4_block),
+                    mistletoe_h4_block=h4_block,
+                    content_markdown=source_text[h4_block.end_offset : h4_end].strip(),
+                    h4_number_in_h3=h4_counter,
+                    source_start=h4_block.start_offset,
+                    source_end=h4_end,
+                )
+            )
+        return H3Pydantic(
+            heading_text=heading_text,
+            mistletoe_h3_block=h3_block,
+            initial_content_markdown=source_text[body_start:initial_end].strip(),
+            h4_sections=h4s,
+            original_full_markdown=source_text[start:end].strip(),
+            h3_number_in_panel=h3_number,
+            source_start=start,
+            source_end=end,
+        )
+
+    def _render_h3_section(
+        self,
+        heading_text: str,
+        h3_block: Optional[Heading],
+        initial_blocks: List[BlockToken],
+        h4_groups: List[tuple[Heading, List[BlockToken]]],
+        h3_number: int,
+        renderer,
+    ) -> H3Pydantic:
+        initial_md = self._render_blocks(initial_blocks, renderer)
+        full_parts: List[str] = []
+        if h3_block:
+            full_parts.append(renderer.render_block(h3_block))
+        if initial_md:
+            full_parts.append(initial_md)
+        h4s: List[H4Pydantic] = []
+        for h4_counter, (h4_block, blocks) in enumerate(h4_groups, start=1):
+            content_md = self._render_blocks(blocks, renderer)
+            h4s.append(
+                H4Pydantic(
+                    heading_text=get_heading_text(h4_block),
+                    mistletoe_h4_block=h4_block,
+                    content_markdown=content_md,
+                    h4_number_in_h3=h4_counter,
+                )
+            )
+            full_parts.append(renderer.render_block(h4_block))
+            if content_md:
+                full_parts.append(content_md)
+        return H3Pydantic(
+            heading_text=heading_text,
+            mistletoe_h3_block=h3_block,
+            initial_content_markdown=initial_md,
+            h4_sections=h4s,
+            original_full_markdown=renderer.BLOCK_SEPARATOR.join(full_parts).strip(),
+            h3_number_in_panel=h3_number,
         )
 
+    @staticmethod
+    def _render_blocks(blocks: List[BlockToken], renderer) -> str:
+        return renderer.render_blocks(blocks).strip()
+
     def _parse_h3_sections_from_panel_blocks(
         self, panel_blocks: List[BlockToken], renderer
     ) -> List[H3Pydantic]:
@@ -37,36 +37,47 @@ class DocumentValidator:
                     )
                     is_valid = False
                 panel_doc_numbers_seen.add(element.panel_number_in_doc)
-                h3_numbers_in_panel_seen: Set[int] = set()
-                for h3_idx, h3_section in enumerate(element.h3_sections):
-                    if h3_section.h3_number_in_panel is None:
-                        logger.warning(
-                            f"VALIDATE_ID_WARNING: H3 '{h3_section.heading_text}' (H3 #{h3_idx+1}) in Panel ID {element.panel_number_in_doc} is missing 'h3_number_in_panel'."
-                        )
-                        is_valid = False
-                        continue
-                    if h3_section.h3_number_in_panel in h3_numbers_in_panel_seen:
-                        logger.warning(
-                            f"VALIDATE_ID_WARNING: Duplicate 'h3_number_in_panel' {h3_section.h3_number_in_panel} in Panel ID {element.panel_number_in_doc}."
-                        )
-                        is_valid = False
-                    h3_numbers_in_panel_seen.add(h3_section.h3_number_in_panel)
-                    h4_numbers_in_h3_seen: Set[int] = set()
-                    for h4_idx, h4_section in enumerate(h3_section.h4_sections):
-                        if h4_section.h4_number_in_h3 is None:
-                            logger.warning(
-                                f"VALIDATE_ID_WARNING: H4 '{h4_section.heading_text}' (H4 #{h4_idx+1}) under H3 ID {h3_section.h3_number_in_panel} (Panel ID {element.panel_number_in_doc}) is missing 'h4_number_in_h3'."
-                            )
-                            is_valid = False
-                            continue
-                        if h4_section.h4_number_in_h3 in h4_numbers_in_h3_seen:
-                            logger.warning(
-                                f"VALIDATE_ID_WARNING: Duplicate 'h4_number_in_h3' {h4_section.h4_number_in_h3} under H3 ID {h3_section.h3_number_in_panel} (Panel ID {element.panel_number_in_doc})."
-                            )
-                            is_valid = False
-                        h4_numbers_in_h3_seen.add(h4_section.h4_number_in_h3)
+                if not DocumentValidator.validate_panel(element):
+                    is_valid = False
         if is_valid:
             logger.info("Internal ID validation passed.")
         else:
             logger.warning("Internal ID validation failed.")
         return is_valid
+
+    @staticmethod
+    def validate_panel(panel: PanelPydantic) -> bool:
+        """
+        Checks H3/H4 numbering inside a single panel. Used by validate() and on
+        its own after an incremental panel rebuild.
+        """
+        is_valid = True
+        h3_numbers_in_panel_seen: Set[int] = set()
+        for h3_idx, h3_section in enumerate(panel.h3_sections):
+            if h3_section.h3_number_in_panel is None:
+                logger.warning(
+                    f"VALIDATE_ID_WARNING: H3 '{h3_section.heading_text}' (H3 #{h3_idx+1}) in Panel ID {panel.panel_number_in_doc} is missing 'h3_number_in_panel'."
+                )
+                is_valid = False
+                continue
+            if h3_section.h3_number_in_panel in h3_numbers_in_panel_seen:
+                logger.warning(
+                    f"VALIDATE_ID_WARNING: Duplicate 'h3_number_in_panel' {h3_section.h3_number_in_panel} in Panel ID {panel.panel_number_in_doc}."
+                )
+                is_valid = False
+            h3_numbers_in_panel_seen.add(h3_section.h3_number_in_panel)
+            h4_numbers_in_h3_seen: Set[int] = set()
+            for h4_idx, h4_section in enumerate(h3_section.h4_sections):
+                if h4_section.h4_number_in_h3 is None:
+                    logger.warning(
+                        f"VALIDATE_ID_WARNING: H4 '{h4_section.heading_text}' (H4 #{h4_idx+1}) under H3 ID {h3_section.h3_number_in_panel} (Panel ID {panel.panel_number_in_doc}) is missing 'h4_number_in_h3'."
+                    )
+                    is_valid = False
+                    continue
+                if h4_section.h4_number_in_h3 in h4_numbers_in_h3_seen:
+                    logger.warning(
+                        f"VALIDATE_ID_WARNING: Duplicate 'h4_number_in_h3' {h4_section.h4_number_in_h3} under H3 ID {h3_section.h3_number_in_panel} (Panel ID {panel.panel_number_in_doc})."
+                    )
+                    is_valid = False
+                h4_numbers_in_h3_seen.add(h4_section.h4_number_in_h3)
+        return is_valid
@@ -1,15 +1,34 @@
 # enhanced_batch_processor.py
+import asyncio
+import json
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Union
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import async_openai_service
 
 from base_batch_processor import BaseBatchProcessor
+from batch_api import BatchRequestWriter, make_custom_id, read_batch_results
+from config import (
+    OPENAI_MODEL_ENHANCEMENT,
+    OPENAI_MODEL_SUGGESTION,
+    OPENAI_TEMP_ENHANCEMENT,
+    OPENAI_TEMP_SUGGESTION,
+)
+from corpus_loader import CorpusLoader
 from document_model import H3Pydantic, PanelPydantic
 from logging_config import get_logger
 from markdown_document import MarkdownDocument
+from metrics import METRICS
 from openai_service import (
+    _enhancement_suggestions_prompt,
+    _finish_improved_markdown,
+    _improved_section_prompt,
+    _parse_enhancement_suggestions,
     get_enhancement_suggestions_for_panel_h3s,
+    get_enhancement_suggestions_for_panels,
     get_improved_markdown_for_section,
+    get_improved_markdown_for_sections,
     suggest_character_roles_from_context,
 )
 from section_titles import (
@@ -20,9 +39,20 @@ logger = get_logger(__name__)
 
 
 class EnhancedBatchProcessor(BaseBatchProcessor):
-    def __init__(self, dry_run: bool = False, max_workers: int = 3):
-        super().__init__(dry_run=dry_run)
+    def __init__(
+        self,
+        dry_run: bool = False,
+        max_workers: int = 3,
+        corpus_loader: Optional[CorpusLoader] = None,
+        batch_suggestions: bool = True,
+        batch_sections: bool = True,
+    ):
+        super().__init__(dry_run=dry_run, corpus_loader=corpus_loader)
         self.max_workers = max_workers
+        # Ask for a chapter's suggestions in a few packed requests instead of one per panel.
+        self.batch_suggestions = batch_suggestions
+        # Rewrite all flagged sections of a panel in one request.
+        self.batch_sections = batch_sections
         logger.info(
             "EnhancedBatchProcessor initialized with %d worker threads",
             self.max_workers,
@@ -53,15 +83,12 @@ class EnhancedBatchProcessor(BaseBatchProcessor):
         )
         return roles
 
-    def process_panel(self, doc: MarkdownDocument, panel: PanelPydantic) -> int:
-        """
-        Enhanced panel processing with more streamlined logic.
-        """
-        # Get panel context and suggestions using shared base method
+    @staticmethod
+    def _panel_context(
+        doc: MarkdownDocument, panel: PanelPydantic
+    ) -> Tuple[Dict[str, str], str]:
+        """Returns the panel's named sections and the context markdown sent with them."""
         section_map = doc.extract_named_sections_from_panel(panel.panel_number_in_doc)
-        if not section_map:
-            return 0
-
         context_parts = [f"## {panel.panel_title_text}"]
         for section in [
             SECTION_TITLES.SCENE_DESCRIPTION.value,
@@ -69,69 +96,213 @@ class EnhancedBatchProcessor(BaseBatchProcessor):
         ]:
             if section_map.get(section):
                 context_parts.append(section_map[section])
-        context = "\n\n".join(context_parts)
+        return section_map, "\n\n".join(context_parts)
 
-        suggestions = get_enhancement_suggestions_for_panel_h3s(
-            panel_title=panel.panel_title_text,
-            panel_context_markdown=context,
-            h3_sections_content=section_map,
-        )
+    def _chapter_panel_inputs(self, doc: MarkdownDocument) -> List[Dict]:
+        inputs = []
+        for panel in doc.list_panels():
+            section_map, context = self._panel_context(doc, panel)
+            inputs.append(
+                {
+                    "panel_number": panel.panel_number_in_doc,
+                    "title": panel.panel_title_text,
+                    "context": context,
+                    "sections": section_map,
+                }
+            )
+        return inputs
 
-        enhancements = 0
-        for h3_title, details in suggestions.items():
-            if not details.get("enhance"):
-                continue
-            original = section_map[h3_title]
-            enhanced = get_improved_markdown_for_section(
-                original_h3_markdown_content=original,
-                enhancement_type=details.get("recommendation"),
-                enhancement_reason=details.get("reason"),
-                panel_title_context=panel.panel_title_text,
-                overall_panel_context_md=context,
+    def process_panel(
+        self,
+        doc: MarkdownDocument,
+        panel: PanelPydantic,
+        suggestions: Optional[Dict[str, Dict]] = None,
+    ) -> int:
+        """
+        Enhanced panel processing with more streamlined logic. `suggestions`
+        are the panel's entries from a chapter-level batched request; when
+        omitted they are requested for this panel alone.
+        """
+        section_map, context = self._panel_context(doc, panel)
+        if not section_map:
+            return 0
+
+        if suggestions is None:
+            suggestions = get_enhancement_suggestions_for_panel_h3s(
+                panel_title=panel.panel_title_text,
+                panel_context_markdown=context,
+                h3_sections_content=section_map,
+            )
+
+        flagged = self._flagged_sections(section_map, suggestions)
+        if self.batch_sections:
+            improved = get_improved_markdown_for_sections(
+                flagged, panel.panel_title_text, context
             )
+        else:
+            improved = {
+                h3_title: get_improved_markdown_for_section(
+                    original_h3_markdown_content=section["markdown"],
+                    enhancement_type=section["enhancement_type"],
+                    enhancement_reason=section["enhancement_reason"],
+                    panel_title_context=panel.panel_title_text,
+                    overall_panel_context_md=context,
+                )
+                for h3_title, section in flagged.items()
+            }
+        return self._apply_improved_sections(doc, panel, improved)
+
+    @staticmethod
+    def _flagged_sections(
+        section_map: Dict[str, str], suggestions: Dict[str, Dict]
+    ) -> Dict[str, Dict]:
+        """The sections suggested for enhancement, in the shape the rewrite calls take."""
+        return {
+            h3_title: {
+                "markdown": section_map[h3_title],
+                "enhancement_type": details.get("recommendation"),
+                "enhancement_reason": details.get("reason"),
+            }
+            for h3_title, details in suggestions.items()
+            if details.get("enhance") and h3_title in section_map
+        }
+
+    @staticmethod
+    def _apply_improved_sections(
+        doc: MarkdownDocument, panel: PanelPydantic, improved: Dict[str, Optional[str]]
+    ) -> int:
+        enhancements = 0
+        for h3_title, enhanced in improved.items():
             if enhanced and doc.update_named_section_in_panel(
                 panel.panel_number_in_doc, h3_title, enhanced
             ):
                 enhancements += 1
         return enhancements
 
-    def process_single_file(self, filepath: Path, output_dir: Path) -> bool:
+    def process_single_file(
+        self,
+        filepath: Path,
+        output_dir: Path,
+        doc: Optional[MarkdownDocument] = None,
+    ) -> bool:
         """
         Process a single file - enhanced implementation.
         """
-        if not super().process_single_file(filepath, output_dir):
+        if doc is None:
+            doc = MarkdownDocument(filepath=str(filepath))
+        if not super().process_single_file(filepath, output_dir, doc):
             return False
 
-        doc = MarkdownDocument(filepath=str(filepath))
+        chapter_suggestions = None
+        if self.batch_suggestions:
+            chapter_suggestions = get_enhancement_suggestions_for_panels(
+                self._chapter_panel_inputs(doc)
+            )
+
         updated_panels = 0
         for el in doc.chapter_model.document_elements:
             if isinstance(el, PanelPydantic):
-                updated = self.process_panel(doc, el)
+                suggestions = None
+                if chapter_suggestions is not None:
+                    suggestions = chapter_suggestions.get(el.panel_number_in_doc, {})
+                updated = self.process_panel(doc, el, suggestions)
                 updated_panels += updated
 
+        return self._save_enhanced(filepath, output_dir, doc, updated_panels)
+
+    def _save_enhanced(
+        self,
+        filepath: Path,
+        output_dir: Path,
+        doc: MarkdownDocument,
+        updated_panels: int,
+    ) -> bool:
         if updated_panels:
             out_path = output_dir / f"{filepath.stem}_enhanced{filepath.suffix}"
             if self.dry_run:
                 logger.info("[DRY RUN] Would save to: %s", out_path)
                 return True
             else:
-                return doc.save_document(str(out_path))
+                return doc.save_document(str(out_path), skip_unchanged=True)
         else:
             logger.info("No enhancements applied to: %s", filepath.name)
             return True
 
+    async def process_panel_async(
+        self,
+        doc: MarkdownDocument,
+        panel: PanelPydantic,
+        suggestions: Optional[Dict[str, Dict]] = None,
+    ) -> int:
+        """
+        Async variant of process_panel: the panel's section rewrites are
+        requested concurrently.
+        """
+        section_map, context = self._panel_context(doc, panel)
+        if not section_map:
+            return 0
+
+        if suggestions is None:
+            suggestions = await async_openai_service.get_enhancement_suggestions_for_panel_h3s(
+                panel_title=panel.panel_title_text,
+                panel_context_markdown=context,
+                h3_sections_content=section_map,
+            )
+        flagged = self._flagged_sections(section_map, suggestions)
+        if self.batch_sections:
+            improved = await async_openai_service.get_improved_markdown_for_sections(
+                flagged, panel.panel_title_text, context
+            )
+        else:
+            titles = list(flagged)
+            enhanced_sections = await async_openai_service.improve_sections(
+                [
+                    {
+                        "original_h3_markdown_content": flagged[title]["markdown"],
+                        "enhancement_type": flagged[title]["enhancement_type"],
+                        "enhancement_reason": flagged[title]["enhancement_reason"],
+                        "panel_title_context": panel.panel_title_text,
+                        "overall_panel_context_md": context,
+                    }
+                    for title in titles
+                ]
+            )
+            improved = dict(zip(titles, enhanced_sections))
+        return self._apply_improved_sections(doc, panel, improved)
+
+    async def _process_file_async(
+        self, filepath: Path, output_dir: Path, doc: MarkdownDocument
+    ) -> bool:
+        if not super().process_single_file(filepath, output_dir, doc):
+            return False
+        chapter_suggestions = {}
+        if self.batch_suggestions:
+            chapter_suggestions = await async_openai_service.get_enhancement_suggestions_for_panels(
+                self._chapter_panel_inputs(doc)
+            )
+        counts = await asyncio.gather(
+            *(
+                self.process_panel_async(
+                    doc,
+                    panel,
+                    chapter_suggestions.get(panel.panel_number_in_doc, {})
+                    if self.batch_suggestions
+                    else None,
+                )
+                for panel in doc.list_panels()
+            )
+        )
+        return self._save_enhanced(filepath, output_dir, doc, sum(counts))
+
     def process_roles_directory(self, input_folder: Union[str, Path]) -> None:
         """
         Process only the roles in a directory of markdown files.
         """
         input_folder = Path(input_folder)
         input_folder.mkdir(exist_ok=True)
-        all_files = list(input_folder.glob("*.md"))
-
-        for file_path in all_files:
+        for file_path, doc in self.corpus_loader.iter_documents(input_folder):
             logger.info("[Roles Only] Processing: %s", file_path.name)
-            doc = MarkdownDocument(filepath=str(file_path))
-            if not doc.chapter_model:
+            if doc is None:
                 logger.warning(
                     "[Roles Only] Skipping: Failed to load document model: %s",
                     file_path.name,
@@ -141,6 +312,7 @@ class EnhancedBatchProcessor(BaseBatchProcessor):
             for panel in doc.chapter_model.document_elements:
                 if isinstance(panel, PanelPydantic):
                     self.process_panel_roles(doc, panel)
+        METRICS.dump_configured()
 
     def process_directory(
         self, input_folder: Union[str, Path], output_folder: Union[str, Path]
@@ -152,13 +324,19 @@ class EnhancedBatchProcessor(BaseBatchProcessor):
 
         input_folder = Path(input_folder)
         output_folder = Path(output_folder)
-        all_files = list(input_folder.glob("*.md"))
+        all_files = []
 
+        # Parsing runs in the loader's process pool; the threads only wait on the API.
         with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            futures = {
-                executor.submit(self.process_single_file, f, output_folder): f
-                for f in all_files
-            }
+            futures = {}
+            for f, doc in self.corpus_loader.iter_documents(input_folder, ordered=False):
+                all_files.append(f)
+                if doc is None:
+                    logger.warning("⚠️ Failed to process: %s", f.name)
+                    continue
+                futures[
+                    executor.submit(self.process_single_file, f, output_folder, doc)
+                ] = f
             for future in as_completed(futures):
                 f = futures[future]
                 try:
@@ -173,3 +351,156 @@ class EnhancedBatchProcessor(BaseBatchProcessor):
                     )
 
         logger.info("Batch processing complete. Processed %d files.", len(all_files))
+        METRICS.dump_configured()
+
+    async def process_directory_async(
+        self, input_folder: Union[str, Path], output_folder: Union[str, Path]
+    ) -> None:
+        """
+        Process all markdown files in a directory from one event loop. Every
+        panel of every file is in flight at once; the number of concurrent
+        API requests is bounded by async_openai_service's semaphore rather
+        than by max_workers threads.
+        """
+        super().process_directory(input_folder, output_folder)
+
+        output_folder = Path(output_folder)
+        loaded = []
+        for f, doc in self.corpus_loader.iter_documents(Path(input_folder)):
+            if doc is None:
+                logger.warning("⚠️ Failed to process: %s", f.name)
+                continue
+            loaded.append((f, doc))
+
+        results = await asyncio.gather(
+            *(self._process_file_async(f, output_folder, doc) for f, doc in loaded),
+            return_exceptions=True,
+        )
+        for (f, _), result in zip(loaded, results):
+            if isinstance(result, BaseException):
+                logger.error(
+                    "Unhandled error while processing file %s: %s", f.name, result
+                )
+            elif result:
+                logger.info("✅ Processed: %s", f.name)
+            else:
+                logger.warning("⚠️ Failed to process: %s", f.name)
+
+        logger.info("Batch processing complete. Processed %d files.", len(loaded))
+        METRICS.dump_configured()
+
+    def write_batch_requests(
+        self,
+        input_folder: Union[str, Path],
+        requests_path: Union[str, Path],
+        results_paths: Sequence[Union[str, Path]] = (),
+    ) -> int:
+        """
+        Batch API mode, planning step: writes the requests the next round
+        needs to `requests_path` instead of calling the API. Round one asks
+        for every panel's suggestions; given their results in `results_paths`,
+        round two asks for the section rewrites. Returns the number of
+        requests written; 0 means every answer is in and can be ingested.
+        """
+        results = read_batch_results(results_paths)
+        with BatchRequestWriter(requests_path) as writer:
+            for file_key, doc in self._batch_documents(input_folder):
+                for panel in doc.list_panels():
+                    self._batch_panel(file_key, doc, panel, results, writer)
+        return writer.count
+
+    def ingest_batch_results(
+        self,
+        input_folder: Union[str, Path],
+        output_folder: Union[str, Path],
+        results_paths: Sequence[Union[str, Path]],
+    ) -> None:
+        """
+        Batch API mode, ingest step: applies the section rewrites found in
+        `results_paths` and saves each document as process_directory would.
+        """
+        results = read_batch_results(results_paths)
+        output_folder = Path(output_folder)
+        output_folder.mkdir(parents=True, exist_ok=True)
+        for file_key, doc in self._batch_documents(input_folder):
+            updated = sum(
+                self._batch_panel(file_key, doc, panel, results)
+                for panel in doc.list_panels()
+            )
+            self._save_enhanced(Path(doc.filepath), output_folder, doc, updated)
+        METRICS.dump_configured()
+
+    def _batch_documents(
+        self, input_folder: Union[str, Path]
+    ) -> Iterator[Tuple[str, MarkdownDocument]]:
+        input_folder = Path(input_folder)
+        for f, doc in self.corpus_loader.iter_documents(input_folder):
+            if doc is None or not self.validate_document_structure(doc):
+                logger.warning("⚠️ Failed to process: %s", f.name)
+                continue
+            yield f.relative_to(input_folder).as_posix(), doc
+
+    def _batch_panel(
+        self,
+        file_key: str,
+        doc: MarkdownDocument,
+        panel: PanelPydantic,
+        results: Dict[str, str],
+        writer: Optional[BatchRequestWriter] = None,
+    ) -> int:
+        """
+        Walks the panel's two stages against the batch `results`. Requests
+        without a result are written to `writer`; without a writer, available
+        rewrites are applied to the document. Returns the sections updated.
+        """
+        section_map, context = self._panel_context(doc, panel)
+        if not section_map:
+            return 0
+        panel_number = panel.panel_number_in_doc
+
+        suggestions_id = make_custom_id(file_key, panel_number, "", "enhancement_suggestions")
+        if suggestions_id not in results:
+            if writer is not None:
+                prompt = _enhancement_suggestions_prompt(
+                    panel.panel_title_text, context, section_map
+                )
+                writer.add(suggestions_id, OPENAI_MODEL_SUGGESTION, prompt, OPENAI_TEMP_SUGGESTION)
+            else:
+                logger.warning("No batch result for %s", suggestions_id)
+            return 0
+        try:
+            suggestions = _parse_enhancement_suggestions(results[suggestions_id])
+        except json.JSONDecodeError as e:
+            logger.error("Invalid batch suggestions for %s: %s", suggestions_id, e)
+            return 0
+
+        enhancements = 0
+        for h3_title, details in suggestions.items():
+            original = section_map.get(h3_title)
+            if not details.get("enhance") or not original or not original.strip():
+                continue
+            prompt, h3_title_for_prompt = _improved_section_prompt(
+                original,
+                details.get("recommendation"),
+                details.get("reason"),
+                panel.panel_title_text,
+                context,
+            )
+            section_id = make_custom_id(file_key, panel_number, h3_title, "improved_section")
+            if writer is not None:
+                if section_id not in results:
+                    writer.add(
+                        section_id, OPENAI_MODEL_ENHANCEMENT, prompt, OPENAI_TEMP_ENHANCEMENT
+                    )
+                continue
+            if section_id not in results:
+                logger.warning("No batch result for %s", section_id)
+                continue
+            enhanced = _finish_improved_markdown(
+                results[section_id], original, h3_title_for_prompt
+            )
+            if enhanced and doc.update_named_section_in_panel(
+                panel_number, h3_title, enhanced
+            ):
+                enhancements += 1
+        return enhancements
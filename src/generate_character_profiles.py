@@ -1,16 +1,40 @@
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List
-
-from openai import APIError, OpenAI, OpenAIError, RateLimitError
+from typing import Any, Dict, Iterable, List, Optional
 
+from character_registry import CharacterRegistry, name_key
+from config import (
+    CHARACTER_GENERATION_MAX_PROFILES_PER_REQUEST,
+    CHARACTER_GENERATION_MAX_ROUNDS,
+    CHARACTER_GENERATION_MAX_WORKERS,
+    CHARACTER_PROMPT_MAX_EXCLUDED_NAMES,
+)
 from logging_config import get_logger
-from utils import clean_and_flatten_roles, generate_prompt, parse_response_with_retry
+from markdown_file_manager import MarkdownFileManager
+from openai_service import create_chat_completion
+from token_estimator import batch_budget_for, pack_by_token_budget
+from utils import clean_and_flatten_roles
 
-client = OpenAI()
 logger = get_logger(__name__)
 
+try:
+    from openai import OpenAI, OpenAIError
+
+    client = OpenAI(max_retries=0)
+except ImportError:
+    # Like openai_service: without the SDK, requests fail and are logged.
+    client = None
+    OpenAIError = ()
+    logger.error("OpenAI library not installed.")
+except Exception as e:
+    client = None
+    logger.exception("Could not initialize OpenAI client: %s", e)
+
+CHARACTER_MODEL = "gpt-4o-2024-11-20"
+CHARACTER_TEMPERATURE = 0.6
+
 # Example character profile for reference
 EXAMPLE_CHARACTER = {
     "visual_tags": [
@@ -44,15 +68,20 @@ EXAMPLE_CHARACTER = {
 def generate_prompt(
     missing_roles: List[str], existing_names: List[str], per_role: int = 2
 ) -> str:
+    avoid = (
+        f"""
+Avoid any names from this list, and names that sound like them:
+{", ".join(existing_names)}
+"""
+        if existing_names
+        else ""
+    )
     return f"""
 You are a professional character writer for a graphic novel about banking system reliability.
 
 Generate {per_role} unique characters for each of the following roles:
 {", ".join(missing_roles)}
-
-Avoid any names from this list:
-{", ".join(existing_names)}
-
+{avoid}
 Each character must match this JSON format:
 {json.dumps({"Example Character": EXAMPLE_CHARACTER}, indent=2)}
 
@@ -90,73 +119,185 @@ def generate_character_profiles_for_roles(
     output_json_path: Path,
     characters_per_role: int = 2,
 ):
-    cleaned_roles = clean_and_flatten_roles(missing_roles)
+    registry = CharacterRegistry(input_json_path, flush_every=0)
+    if not add_character_profiles_for_roles(missing_roles, registry, characters_per_role):
+        return
+    if Path(output_json_path).resolve() == Path(input_json_path).resolve():
+        registry.flush()
+    else:
+        with MarkdownFileManager.atomic_writer(str(output_json_path)) as f:
+            json.dump(registry.character_data(), f, indent=2, ensure_ascii=False)
+    logger.info(f"Saved updated character file to: {output_json_path}")
 
-    with open(input_json_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
 
-    existing_chars = data.get("characters", {})
-    existing_names = list(existing_chars.keys())
+def add_character_profiles_for_roles(
+    missing_roles: List[Any],
+    registry: CharacterRegistry,
+    characters_per_role: int = 2,
+) -> int:
+    """
+    Generates `characters_per_role` profiles for each role and queues them in
+    `registry`, which saves them on its next flush. Returns how many were added.
+    """
+    cleaned_roles = clean_and_flatten_roles(missing_roles)
+    new_entries = request_character_profiles(cleaned_roles, registry, characters_per_role)
+    added = registry.add_many(new_entries)
+    logger.info(f"Added {added} new characters to the registry.")
+    return added
 
-    prompt = generate_prompt(cleaned_roles, existing_names, characters_per_role)
 
-    logger.info(f"Requesting new characters from OpenAI for roles: {cleaned_roles}")
+def generate_profiles_for_missing_roles(
+    roles: Iterable[Any],
+    registry: CharacterRegistry,
+    characters_per_role: int = 2,
+    max_workers: int = CHARACTER_GENERATION_MAX_WORKERS,
+    token_budget: Optional[int] = None,
+) -> int:
+    """
+    Generates profiles for every one of `roles` the registry has no
+    character for, then flushes the registry. Roles are packed into as few
+    requests as fit the token budget (the model's batch budget by default)
+    and CHARACTER_GENERATION_MAX_PROFILES_PER_REQUEST, sent up to
+    `max_workers` at a time. Concurrent requests cannot see each other's
+    names, so each one's results are checked against the profiles added
+    before it; slots lost to a name that equals or sounds like another are
+    requested again. Returns how many profiles were added.
+    """
+    missing = registry.missing_roles(sorted(set(clean_and_flatten_roles(list(roles)))))
+    if not missing:
+        return 0
+    excluded = registry.names()[-CHARACTER_PROMPT_MAX_EXCLUDED_NAMES:]
+    logger.info(f"Planning characters for {len(missing)} missing roles.")
 
-    retries = 3
-    delay = 2.0  # seconds
+    per_request = max(1, CHARACTER_GENERATION_MAX_PROFILES_PER_REQUEST // characters_per_role)
+    chunks = []
+    for group in pack_by_token_budget(
+        missing,
+        lambda group: generate_prompt(group, excluded, characters_per_role),
+        token_budget or batch_budget_for(CHARACTER_MODEL),
+        CHARACTER_MODEL,
+    ):
+        chunks.extend(group[i : i + per_request] for i in range(0, len(group), per_request))
 
-    for attempt in range(retries):
-        try:
-            response = client.chat.completions.create(
-                model="gpt-4o-2024-11-20",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.6,
+    def request(chunk):
+        return request_character_profiles(chunk, registry, characters_per_role)
+
+    added = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as pool:
+        # Added in chunk order, so name collisions resolve the same way every run.
+        for profiles in pool.map(request, chunks):
+            added += registry.add_many(
+                {
+                    name: profile
+                    for name, profile in profiles.items()
+                    if not registry.name_conflicts(name)
+                }
             )
 
-            raw = response.choices[0].message.content.strip()
-            parsed = parse_response_with_retry(raw)
-            new_entries = parsed.get("characters", parsed)
-
-            added = 0
-            per_role_counts = {r: 0 for r in cleaned_roles}
-            for name, profile in new_entries.items():
-                role = profile.get("role")
-                if name not in existing_names and role in per_role_counts:
-                    existing_chars[name] = profile
-                    added += 1
-                    per_role_counts[role] += 1
-
-            logger.info(f"Added {added} new characters to the file.")
-            for role, count in per_role_counts.items():
-                if count == characters_per_role:
-                    logger.info(f"{count} characters created for role: {role}")
-                else:
-                    logger.warning(
-                        f"Only {count} created for role: {role} (expected {characters_per_role})"
-                    )
-
-            data["characters"] = existing_chars
-            with open(output_json_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            logger.info(f"Saved updated character file to: {output_json_path}")
+    counts = {role: len(registry.names_for_role(role)) for role in missing}
+    short = [role for role, count in counts.items() if count < characters_per_role]
+    if short:
+        added += registry.add_many(
+            request_character_profiles(short, registry, characters_per_role, counts)
+        )
+    registry.flush()
+    return added
+
+
+def request_character_profiles(
+    cleaned_roles: List[str],
+    registry: CharacterRegistry,
+    characters_per_role: int = 2,
+    counts: Optional[Dict[str, int]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Asks the API for new profiles for `cleaned_roles`, up to
+    `characters_per_role` each counting the `counts` a role already has.
+    Returns {name: profile} for new names whose role was requested; empty
+    if the request failed.
+
+    The prompt only lists a bounded set of names to avoid: the registry's
+    most recent ones, then the names that collided. Names equal to or
+    sounding like a registry name (CharacterRegistry.name_conflicts) are
+    rejected locally, and only the rejected slots are requested again, for
+    up to CHARACTER_GENERATION_MAX_ROUNDS requests.
+    """
+    accepted: Dict[str, Dict[str, Any]] = {}
+    accepted_keys = set()
+    per_role_counts = {r: (counts or {}).get(r, 0) for r in cleaned_roles}
+    excluded = registry.names()[-CHARACTER_PROMPT_MAX_EXCLUDED_NAMES:]
+
+    for round_number in range(CHARACTER_GENERATION_MAX_ROUNDS):
+        wanted = {
+            role: characters_per_role - count
+            for role, count in per_role_counts.items()
+            if count < characters_per_role
+        }
+        if not wanted:
             break
+        if round_number:
+            logger.info(f"Re-requesting {sum(wanted.values())} characters whose names collided.")
+        new_entries = _complete_character_profiles(
+            generate_prompt(list(wanted), excluded, max(wanted.values())), list(wanted)
+        )
+        if new_entries is None:
+            break
+
+        collided = []
+        for name, profile in new_entries.items():
+            role = profile.get("role") if isinstance(profile, dict) else None
+            if not wanted.get(role):
+                continue
+            conflicts = registry.name_conflicts(name)
+            if conflicts or name_key(name) in accepted_keys:
+                collided.extend([name, *conflicts])
+                continue
+            accepted[name] = profile
+            accepted_keys.add(name_key(name))
+            per_role_counts[role] += 1
+            wanted[role] -= 1
+        if not collided:
+            continue
+        # Keeps the exclusion list bounded, favouring the latest collisions.
+        excluded = list(dict.fromkeys(excluded + collided))[-CHARACTER_PROMPT_MAX_EXCLUDED_NAMES:]
 
-        except (RateLimitError, APIError) as e:
+    for role, count in per_role_counts.items():
+        if count == characters_per_role:
+            logger.info(f"{count} characters created for role: {role}")
+        else:
             logger.warning(
-                f"Attempt {attempt + 1} failed with error: {e}. Retrying in {delay} seconds..."
-            )
-            time.sleep(delay)
-        except OpenAIError as e:
-            logger.error(
-                f"An OpenAI-specific error occurred while processing roles: {cleaned_roles}. Input file: {input_json_path}"
-            )
-            logger.debug(f"OpenAIError: {e}")
-            break
-        except Exception as e:
-            logger.error(
-                f"An unexpected error occurred while processing roles: {cleaned_roles}. Input file: {input_json_path}"
+                f"Only {count} created for role: {role} (expected {characters_per_role})"
             )
-            logger.debug(f"Exception: {e}")
-            break
-    else:
-        logger.error("Failed to complete the API call after multiple retries.")
+    return accepted
+
+
+def _complete_character_profiles(
+    prompt: str, cleaned_roles: List[str]
+) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Sends one profile prompt; returns the parsed entries, or None on failure."""
+    logger.info(f"Requesting new characters from OpenAI for roles: {cleaned_roles}")
+
+    try:
+        response = create_chat_completion(
+            CHARACTER_MODEL,
+            [{"role": "user", "content": prompt}],
+            CHARACTER_TEMPERATURE,
+            api_client=client,
+        )
+
+        raw = response.choices[0].message.content.strip()
+        parsed = parse_response_with_retry(raw)
+        return parsed.get("characters", parsed)
+
+    except OpenAIError as e:
+        # Retryable errors were already retried by the rate limiter.
+        logger.error(
+            f"An OpenAI-specific error occurred while processing roles: {cleaned_roles}"
+        )
+        logger.debug(f"OpenAIError: {e}")
+    except Exception as e:
+        logger.error(
+            f"An unexpected error occurred while processing roles: {cleaned_roles}"
+        )
+        logger.debug(f"Exception: {e}")
+    return None
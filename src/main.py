@@ -27,6 +27,7 @@ def main():
         print(
             "7. Suggest Character Roles Only (Panels in Folder)"
         )  # adjust number as needed
+        print("8. Enhance Named Section in Panel (AI, streamed)")
         print("0. Exit")
         choice = input("Enter your choice: ").strip()
 
@@ -89,6 +90,20 @@ def main():
             except Exception as e:
                 logger.error("Error: %s", e)
 
+        elif choice == "8":
+            if not document_loaded or controller.current_selected_panel_id is None:
+                print("Select a panel first.")
+                continue
+            title = input("Section H3 Title: ").strip()
+            enhancement = input("Enhancement type (optional): ").strip() or None
+            print()
+            improved = controller.enhance_section(
+                title,
+                enhancement,
+                on_delta=lambda delta: print(delta, end="", flush=True),
+            )
+            print(f"\n\nEnhancement applied: {improved is not None}")
+
         elif choice == "0":
             print("Exiting.")
             break
@@ -1,21 +1,29 @@
 # markdown_document.py
 
+import io
 import logging
-from typing import Optional
+from typing import Optional, Union
 
 from mistletoe import Document
+from mistletoe.block_token import Heading
+from mistletoe.document import line_count
+from mistletoe.markdown_renderer import TrimmingWriter
 
 from document_model import (
     _MODULE_LEVEL_RENDERER_INSTANCE,
     ChapterPydantic,
+    H3Pydantic,
     PanelPydantic,
-    render_blocks_to_markdown,
+    get_heading_text,
 )
-from document_model_builder import DocumentModelBuilder
+from document_index import DocumentIndex
+from document_model_builder import PANEL_HEADING_PREFIX, DocumentModelBuilder
 from document_validator import DocumentValidator
 from markdown_file_manager import MarkdownFileManager
 from markdown_parser import MarkdownParser
+from metrics import METRICS
 from panel_section_manager import PanelSectionManager
+from parse_cache import ParseCache
 
 logger = logging.getLogger(__name__)
 
@@ -26,21 +34,65 @@ class MarkdownDocument:
     Keeps state: current filename, loaded text, parsed AST, and model tree.
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        filepath: Optional[str] = None,
+        parse_cache: Union[ParseCache, bool, None] = True,
+    ):
+        """
+        `parse_cache` is a ParseCache, True for the shared default cache from
+        config.py, or False/None to always parse. When `filepath` is given the
+        document is loaded immediately.
+        """
         self.filepath: Optional[str] = None
         self.raw_content: Optional[str] = None
+        # None when the model was served from the parse cache.
         self.mistletoe_doc: Optional[Document] = None
         self.chapter_model: Optional[ChapterPydantic] = None
+        if parse_cache is True:
+            parse_cache = ParseCache.default()
+        self.parse_cache: Optional[ParseCache] = parse_cache or None
+        if filepath:
+            self.load_and_process(filepath)
+
+    @property
+    def chapter_model(self) -> Optional[ChapterPydantic]:
+        return self._chapter_model
+
+    @chapter_model.setter
+    def chapter_model(self, chapter_model: Optional[ChapterPydantic]) -> None:
+        # Lookup indexes are rebuilt whenever the model is replaced.
+        self._chapter_model = chapter_model
+        self.index = DocumentIndex(chapter_model)
 
     def load_and_process(self, filepath: str) -> bool:
         self.filepath = filepath
         try:
-            self.raw_content = MarkdownFileManager.read_file(filepath)
-            self.mistletoe_doc = MarkdownParser.parse(self.raw_content)
-            self.chapter_model = DocumentModelBuilder().build(self.mistletoe_doc)
-            valid = DocumentValidator.validate(self.chapter_model)
-            if not valid:
-                logger.warning(f"Model validation failed for file {filepath}.")
+            with METRICS.timer("load.read"):
+                raw_content = MarkdownFileManager.read_file(filepath)
+            if METRICS.enabled:
+                METRICS.increment("load.files")
+                METRICS.increment("load.bytes", len(raw_content.encode("utf-8")))
+            with METRICS.timer("load.cache_lookup"):
+                cached_model = (
+                    self.parse_cache.get(raw_content) if self.parse_cache else None
+                )
+            if cached_model is not None:
+                logger.debug(f"Parse cache hit for '{filepath}'.")
+                METRICS.increment("load.cache_hits")
+                self.load_built(filepath, raw_content, cached_model)
+                with METRICS.timer("load.validate"):
+                    valid = DocumentValidator.validate(self.chapter_model)
+                if not valid:
+                    logger.warning(f"Model validation failed for file {filepath}.")
+                self._record_model_metrics()
+                return True
+            METRICS.increment("load.cache_misses")
+            self._process_content(raw_content)
+            if self.parse_cache:
+                with METRICS.timer("load.cache_store"):
+                    self.parse_cache.put(raw_content, self.chapter_model)
+            self._record_model_metrics()
             return True
         except Exception as e:
             logger.error(f"Failed to load/process '{filepath}': {e}")
@@ -49,41 +101,353 @@ class MarkdownDocument:
             self.chapter_model = None
             return False
 
-    def save_document(self, output_filepath: str) -> bool:
+    def load_built(
+        self, filepath: Optional[str], raw_content: str, chapter_model: ChapterPydantic
+    ) -> None:
+        """
+        Adopts a model built elsewhere (parse cache, CorpusLoader worker) for
+        `raw_content`. The mistletoe AST is not available afterwards.
+        """
+        self.filepath = filepath
+        self.raw_content = raw_content
+        self.mistletoe_doc = None
+        self.chapter_model = chapter_model
+
+    def _record_model_metrics(self) -> None:
+        if not METRICS.enabled or not self.chapter_model:
+            return
+        panels = self.index.panels
+        h3_sections = [h3 for panel in panels for h3 in panel.h3_sections]
+        METRICS.increment("load.panels", len(panels))
+        METRICS.increment("load.h3_sections", len(h3_sections))
+        METRICS.increment("load.h4_sections", sum(len(h3.h4_sections) for h3 in h3_sections))
+
+    def _process_content(self, raw_content: str) -> None:
+        self.raw_content = raw_content
+        with METRICS.timer("load.parse"):
+            self.mistletoe_doc = MarkdownParser.parse(self.raw_content)
+        METRICS.increment("load.blocks", len(self.mistletoe_doc.children))
+        with METRICS.timer("load.build"):
+            self.chapter_model = DocumentModelBuilder().build(
+                self.mistletoe_doc, source_text=self.raw_content
+            )
+        with METRICS.timer("load.validate"):
+            valid = DocumentValidator.validate(self.chapter_model)
+        if not valid:
+            logger.warning(f"Model validation failed for file {self.filepath}.")
+
+    # Incremental editing
+    def replace_panel_body(self, panel_id: int, new_body_markdown: str) -> bool:
+        """
+        Replaces everything below a panel's H2 heading with `new_body_markdown`
+        and rebuilds only that panel.
+        """
+        panel = self.get_panel_by_number(panel_id)
+        if not panel or panel.source_start is None or self.raw_content is None:
+            logger.error(f"Panel ID {panel_id} not found for replace_panel_body.")
+            return False
+        heading_end = self.raw_content.find("\n", panel.source_start)
+        heading_end = panel.source_end if heading_end == -1 else heading_end + 1
+        if heading_end == panel.source_end and not self.raw_content[
+            panel.source_start : heading_end
+        ].endswith("\n"):
+            new_body_markdown = "\n" + new_body_markdown
+        if panel.source_end < len(self.raw_content) and not new_body_markdown.endswith(
+            "\n"
+        ):
+            new_body_markdown += "\n"
+        return self.apply_edit(heading_end, panel.source_end, new_body_markdown)
+
+    def apply_edit(self, start: int, end: int, replacement: str) -> bool:
+        """
+        Replaces raw_content[start:end] with `replacement` and updates the model.
+        Edits confined to one panel re-tokenize and rebuild only that panel;
+        anything else (generic content, cross-panel or structural edits) falls
+        back to a full rebuild from the edited text.
+        """
+        if self.raw_content is None or not self.chapter_model:
+            logger.error("No document loaded for apply_edit.")
+            return False
+        if not 0 <= start <= end <= len(self.raw_content):
+            logger.error(f"Edit range {start}-{end} is outside the document.")
+            return False
+        try:
+            panel_index = self._find_panel_index_for_range(start, end)
+            if panel_index is not None and self._rebuild_panel(
+                panel_index, start, end, replacement
+            ):
+                return True
+            logger.info("Edit is not confined to one panel; rebuilding document.")
+            self._process_content(
+                self.raw_content[:start] + replacement + self.raw_content[end:]
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Failed to apply edit to '{self.filepath}': {e}")
+            return False
+
+    def _find_panel_index_for_range(self, start: int, end: int) -> Optional[int]:
+        for index, element in enumerate(self.chapter_model.document_elements):
+            if (
+                isinstance(element, PanelPydantic)
+                and element.source_start is not None
+                and element.source_start <= start
+                and end <= element.source_end
+            ):
+                return index
+        return None
+
+    def _rebuild_panel(
+        self, element_index: int, start: int, end: int, replacement: str
+    ) -> bool:
+        """
+        Re-tokenizes the edited panel region and splices the rebuilt panel in.
+        Returns False, leaving the document untouched, when the edited region
+        no longer parses as exactly one panel.
+        """
+        old_panel = self.chapter_model.document_elements[element_index]
+        panel_start, old_end = old_panel.source_start, old_panel.source_end
+        region = (
+            self.raw_content[panel_start:start]
+            + replacement
+            + self.raw_content[end:old_end]
+        )
+        if old_end < len(self.raw_content) and not region.endswith(("\n", "\r")):
+            return False
+        region_doc = MarkdownParser.parse(region)
+        blocks = region_doc.children
+        if region_doc.ends_in_code_block or not blocks:
+            return False
+        if not self._is_panel_heading(blocks[0]) or any(
+            self._is_panel_heading(b) for b in blocks[1:]
+        ):
+            return False
+
+        old_region = self.raw_content[panel_start:old_end]
+        delta = len(region) - len(old_region)
+        line_delta = line_count(region) - line_count(old_region)
+        if old_panel.mistletoe_h2_block is not None:
+            first_line = old_panel.mistletoe_h2_block.line_number
+        else:
+            first_line = line_count(self.raw_content[:panel_start]) + 1
+        for block in blocks:
+            block.start_offset += panel_start
+            block.end_offset += panel_start
+            block.line_number += first_line - 1
+            block.end_line_number += first_line - 1
+        self.raw_content = (
+            self.raw_content[:panel_start] + region + self.raw_content[old_end:]
+        )
+        new_panel = DocumentModelBuilder().build_panel(
+            blocks[0],
+            blocks[1:],
+            old_panel.panel_number_in_doc,
+            source_text=self.raw_content,
+            panel_end=panel_start + len(region),
+        )
+        self.chapter_model.document_elements[element_index] = new_panel
+        self.index.replace_panel(old_panel, new_panel)
+        if delta:
+            for element in self.chapter_model.document_elements[element_index + 1 :]:
+                self._shift_spans(element, delta)
+            self.chapter_model.source_end += delta
+        self._splice_mistletoe_blocks(old_panel, old_end, blocks, delta, line_delta)
+        if not DocumentValidator.validate_panel(new_panel):
+            logger.warning(
+                f"Validation failed for rebuilt Panel ID {new_panel.panel_number_in_doc}."
+            )
+        return True
+
+    @staticmethod
+    def _is_panel_heading(block) -> bool:
+        return (
+            isinstance(block, Heading)
+            and block.level == 2
+            and get_heading_text(block).startswith(PANEL_HEADING_PREFIX)
+        )
+
+    @staticmethod
+    def _shift_spans(element, delta: int) -> None:
+        models = [element]
+        for h3 in getattr(element, "h3_sections", []):
+            models.append(h3)
+            models.extend(h3.h4_sections)
+        for model in models:
+            if model.source_start is not None:
+                model.source_start += delta
+                model.source_end += delta
+
+    def _splice_mistletoe_blocks(
+        self, old_panel: PanelPydantic, old_end: int, new_blocks, delta, line_delta
+    ) -> None:
+        if not self.mistletoe_doc or old_panel.mistletoe_h2_block is None:
+            return
+        children = self.mistletoe_doc.children
+        first = children.index(old_panel.mistletoe_h2_block)
+        last = first + 1
+        while last < len(children) and children[last].start_offset < old_end:
+            last += 1
+        children[first:last] = new_blocks
+        if delta or line_delta:
+            for block in children[first + len(new_blocks) :]:
+                block.start_offset += delta
+                block.end_offset += delta
+                block.line_number += line_delta
+                block.end_line_number += line_delta
+
+    def save_document(self, output_filepath: str, skip_unchanged: bool = False) -> bool:
+        """
+        Streams the rendered document into a temp file and atomically renames
+        it over `output_filepath`. With `skip_unchanged`, an existing output
+        with identical content is not rewritten.
+        """
         try:
-            rendered_content = self.reconstruct_and_render_document()
-            MarkdownFileManager.write_file(output_filepath, rendered_content)
-            logger.info(f"Document successfully saved to '{output_filepath}'.")
+            with METRICS.timer("save.total"), MarkdownFileManager.atomic_writer(
+                output_filepath, skip_unchanged=skip_unchanged
+            ) as out:
+                self.write_rendered_document(out)
+                if METRICS.enabled:
+                    METRICS.increment("save.bytes", out.tell())
+            METRICS.increment("save.files" if out.replaced else "save.unchanged")
+            if out.replaced:
+                logger.info(f"Document successfully saved to '{output_filepath}'.")
+            else:
+                logger.info(f"Document '{output_filepath}' is unchanged; not rewritten.")
             return True
         except Exception as e:
             logger.error(f"Error saving document to '{output_filepath}': {e}")
             return False
 
     def reconstruct_and_render_document(self) -> str:
+        """
+        Renders the current document. When the model carries source spans, text
+        outside improved H3 sections is copied verbatim from raw_content and
+        only sections with api_improved_markdown are rendered. Rendered panels
+        and sections are cached until update_named_section marks them dirty.
+        """
         if not self.chapter_model:
             return self.raw_content or ""
-        all_blocks = []
+        with METRICS.timer("render.total"):
+            buffer = io.StringIO()
+            self.write_rendered_document(buffer)
+            rendered = buffer.getvalue()
+        METRICS.increment("render.chars", len(rendered))
+        return rendered
+
+    def write_rendered_document(self, out) -> None:
+        """
+        Streams the rendering of reconstruct_and_render_document into `out`
+        (any object with a write method), one panel at a time.
+        """
+        if not self.chapter_model:
+            out.write(self.raw_content or "")
+            return
+        if self._has_source_spans():
+            for segment in self._iter_source_segments():
+                out.write(segment)
+            return
+        out = TrimmingWriter(out)
+        separator = ""
+        for segment in self._iter_rendered_segments():
+            out.write(separator)
+            out.write(segment)
+            separator = _MODULE_LEVEL_RENDERER_INSTANCE.BLOCK_SEPARATOR
+
+    def _has_source_spans(self) -> bool:
+        return (
+            self.raw_content is not None
+            and self.chapter_model.source_end == len(self.raw_content)
+        )
+
+    def _iter_source_segments(self):
+        cursor = 0
+        for element in self.chapter_model.document_elements:
+            if isinstance(element, PanelPydantic):
+                yield self.raw_content[cursor : element.source_start]
+                yield self._render_panel_from_source(element)
+                cursor = element.source_end
+        yield self.raw_content[cursor:]
+
+    def _render_panel_from_source(self, panel: PanelPydantic) -> str:
+        if panel._rendered_markdown is not None:
+            return panel._rendered_markdown
+        pieces = []
+        cursor = panel.source_start
+        for h3_section in panel.h3_sections:
+            if h3_section.api_improved_markdown is None:
+                continue
+            original = self.raw_content[h3_section.source_start : h3_section.source_end]
+            pieces.append(self.raw_content[cursor : h3_section.source_start])
+            pieces.append((self._render_h3(h3_section) or "").strip())
+            pieces.append(original[len(original.rstrip()) :])
+            cursor = h3_section.source_end
+        if not pieces:
+            # Untouched panel: the source slice is already the rendering.
+            return self.raw_content[panel.source_start : panel.source_end]
+        pieces.append(self.raw_content[cursor : panel.source_end])
+        panel._rendered_markdown = "".join(pieces)
+        return panel._rendered_markdown
+
+    def _iter_rendered_segments(self):
         if self.chapter_model.mistletoe_h1_block:
-            all_blocks.append(self.chapter_model.mistletoe_h1_block)
+            yield _MODULE_LEVEL_RENDERER_INSTANCE.render_block(
+                self.chapter_model.mistletoe_h1_block
+            )
         for element in self.chapter_model.document_elements:
             if hasattr(element, "mistletoe_blocks") and element.mistletoe_blocks:
-                all_blocks.extend(element.mistletoe_blocks)
+                yield _MODULE_LEVEL_RENDERER_INSTANCE.render_blocks(
+                    element.mistletoe_blocks
+                )
             elif isinstance(element, PanelPydantic):
-                if element.mistletoe_h2_block:
-                    all_blocks.append(element.mistletoe_h2_block)
-                for h3_section in element.h3_sections:
-                    content_string_for_h3 = None
-                    if (
-                        hasattr(h3_section, "api_improved_markdown")
-                        and h3_section.api_improved_markdown is not None
-                    ):
-                        content_string_for_h3 = h3_section.api_improved_markdown
-                    elif h3_section.original_full_markdown:
-                        content_string_for_h3 = h3_section.original_full_markdown
-                    if content_string_for_h3:
-                        h3_doc = Document(content_string_for_h3)
-                        all_blocks.extend(b for b in h3_doc.children if b is not None)
-        return render_blocks_to_markdown(all_blocks, _MODULE_LEVEL_RENDERER_INSTANCE)
+                rendered_panel = self._render_panel_from_blocks(element)
+                if rendered_panel is not None:
+                    yield rendered_panel
+
+    def _render_panel_from_blocks(self, panel: PanelPydantic) -> Optional[str]:
+        if panel._rendered_markdown is not None:
+            return panel._rendered_markdown
+        parts = []
+        if panel.mistletoe_h2_block:
+            parts.append(
+                _MODULE_LEVEL_RENDERER_INSTANCE.render_block(panel.mistletoe_h2_block)
+            )
+        for h3_section in panel.h3_sections:
+            rendered_h3 = self._render_h3(h3_section)
+            if rendered_h3 is not None:
+                parts.append(rendered_h3)
+        if not parts:
+            return None
+        panel._rendered_markdown = _MODULE_LEVEL_RENDERER_INSTANCE.BLOCK_SEPARATOR.join(
+            parts
+        )
+        return panel._rendered_markdown
+
+    @staticmethod
+    def _render_h3(h3_section) -> Optional[str]:
+        """Returns the cached rendering of an H3, or None if it has no content."""
+        if h3_section._rendered_markdown is None:
+            content = h3_section.api_improved_markdown
+            if content is None:
+                content = h3_section.original_full_markdown
+            if not content:
+                return None
+            h3_section._rendered_markdown = _MODULE_LEVEL_RENDERER_INSTANCE.render(
+                Document(content)
+            )
+        return h3_section._rendered_markdown
+
+    def get_source_text(self, element) -> Optional[str]:
+        """
+        Returns the exact source text of a Chapter/Panel/H3/H4/generic model,
+        sliced from raw_content using its recorded span, or None if unknown.
+        """
+        if self.raw_content is None:
+            return None
+        start = getattr(element, "source_start", None)
+        end = getattr(element, "source_end", None)
+        if start is None or end is None:
+            return None
+        return self.raw_content[start:end]
 
     # Section-level helpers (delegating to PanelSectionManager)
     def extract_named_sections_from_panel(self, panel_id: int) -> dict:
@@ -91,7 +455,9 @@ class MarkdownDocument:
         if not panel:
             logger.error(f"Panel ID {panel_id} not found for extract_named_sections.")
             return {}
-        return PanelSectionManager.extract_named_sections(panel)
+        return PanelSectionManager.extract_named_sections(
+            panel, self.index.get_h3_sections(panel_id)
+        )
 
     def update_named_section_in_panel(
         self, panel_id: int, section_h3_title: str, new_markdown_content: str
@@ -100,27 +466,27 @@ class MarkdownDocument:
         if not panel:
             logger.error(f"Panel ID {panel_id} not found for update_named_section.")
             return False
+        h3_section = self.get_h3_section(panel_id, section_h3_title)
+        if not h3_section:
+            logger.error(
+                f"H3 section with title '{section_h3_title}' not found in Panel."
+            )
+            return False
         return PanelSectionManager.update_named_section(
-            panel, section_h3_title, new_markdown_content
+            panel, section_h3_title, new_markdown_content, h3_section
         )
 
     # Navigation helpers
     def list_panels(self):
-        if not self.chapter_model:
-            return []
-        return [
-            el
-            for el in self.chapter_model.document_elements
-            if isinstance(el, PanelPydantic)
-        ]
+        return list(self.index.panels)
 
     def get_panel_by_number(self, panel_doc_number: int) -> Optional[PanelPydantic]:
-        if not self.chapter_model:
-            return None
-        for element in self.chapter_model.document_elements:
-            if (
-                isinstance(element, PanelPydantic)
-                and element.panel_number_in_doc == panel_doc_number
-            ):
-                return element
-        return None
+        return self.index.get_panel(panel_doc_number)
+
+    def get_panel_by_title(self, panel_title: str) -> Optional[PanelPydantic]:
+        return self.index.get_panel_by_title(panel_title)
+
+    def get_h3_section(
+        self, panel_doc_number: int, section_h3_title: str
+    ) -> Optional[H3Pydantic]:
+        return self.index.get_h3(panel_doc_number, section_h3_title)
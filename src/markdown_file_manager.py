@@ -1,3 +1,17 @@
+import hashlib
+import os
+import stat
+import tempfile
+from contextlib import contextmanager
+
+_HASH_CHUNK_SIZE = 1 << 16
+
+# Read once: os.umask can only be queried by setting it, which is not
+# safe while other threads create files.
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+
+
 class MarkdownFileManager:
     @staticmethod
     def read_file(filepath: str) -> str:
@@ -8,3 +22,79 @@ class MarkdownFileManager:
     def write_file(filepath: str, content: str) -> None:
         with open(filepath, "w", encoding="utf-8") as f:
             f.write(content)
+
+    @staticmethod
+    @contextmanager
+    def atomic_writer(filepath: str, skip_unchanged: bool = False):
+        """
+        Yields a text stream backed by a temp file next to `filepath`. On a
+        clean exit the temp file is fsynced and renamed over `filepath`, so
+        readers see either the old or the new file, never a partial one.
+        With `skip_unchanged`, an existing file with the same content hash is
+        left untouched. The yielded stream's `replaced` attribute tells which
+        happened.
+        """
+        directory = os.path.dirname(os.path.abspath(filepath))
+        fd, tmp_path = tempfile.mkstemp(
+            dir=directory, prefix=f".{os.path.basename(filepath)}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.replaced = False
+                yield f
+                f.flush()
+                os.fsync(f.fileno())
+            if skip_unchanged and MarkdownFileManager._same_content(tmp_path, filepath):
+                os.remove(tmp_path)
+                return
+            MarkdownFileManager._copy_mode(filepath, tmp_path)
+            os.replace(tmp_path, filepath)
+            f.replaced = True
+            MarkdownFileManager._fsync_directory(directory)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def _copy_mode(filepath: str, tmp_path: str) -> None:
+        # mkstemp creates 0600 files; keep the target's mode, or give a new
+        # file the mode open() would have.
+        try:
+            mode = stat.S_IMODE(os.stat(filepath).st_mode)
+        except FileNotFoundError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(tmp_path, mode)
+
+    @staticmethod
+    def file_sha256(filepath: str) -> str:
+        digest = hashlib.sha256()
+        with open(filepath, "rb") as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _same_content(new_path: str, existing_path: str) -> bool:
+        try:
+            if os.path.getsize(new_path) != os.path.getsize(existing_path):
+                return False
+            return MarkdownFileManager.file_sha256(
+                new_path
+            ) == MarkdownFileManager.file_sha256(existing_path)
+        except OSError:
+            return False
+
+    @staticmethod
+    def _fsync_directory(directory: str) -> None:
+        # Persists the rename itself; not supported on every platform.
+        try:
+            dir_fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(dir_fd)
@@ -0,0 +1,158 @@
+# metrics.py
+
+import json
+import logging
+import re
+import threading
+import time
+from typing import Dict, Optional
+
+from config import METRICS_ENABLED, METRICS_JSON_PATH, METRICS_PROMETHEUS_PATH
+from markdown_file_manager import MarkdownFileManager
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_PREFIX = "markdown_editor"
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("registry", "name", "start")
+
+    def __init__(self, registry: "MetricsRegistry", name: str):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters and timings (count, total and max seconds per
+    name). Names are dotted stage paths such as "load.parse". While disabled,
+    timer() returns a shared no-op context manager and nothing is recorded.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.counters: Dict[str, float] = {}
+        self.timings: Dict[str, Dict[str, float]] = {}
+
+    def timer(self, name: str):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def observe(self, name: str, seconds: float) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                self.timings[name] = {"count": 1, "total_seconds": seconds, "max_seconds": seconds}
+                return
+            timing["count"] += 1
+            timing["total_seconds"] += seconds
+            timing["max_seconds"] = max(timing["max_seconds"], seconds)
+
+    def increment(self, name: str, value: float = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters = {}
+            self.timings = {}
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "timings": {name: dict(t) for name, t in self.timings.items()},
+            }
+
+    def merge(self, snapshot: Dict) -> None:
+        """Adds a snapshot taken elsewhere, e.g. in a worker process."""
+        if not self.enabled:
+            return
+        with self._lock:
+            for name, value in snapshot.get("counters", {}).items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, other in snapshot.get("timings", {}).items():
+                timing = self.timings.setdefault(
+                    name, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+                )
+                timing["count"] += other["count"]
+                timing["total_seconds"] += other["total_seconds"]
+                timing["max_seconds"] = max(timing["max_seconds"], other["max_seconds"])
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2, sort_keys=True)
+
+    def to_prometheus(self, prefix: str = PROMETHEUS_PREFIX) -> str:
+        """Renders the registry in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            metric = f"{prefix}_{_metric_name(name)}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        for name, timing in sorted(snapshot["timings"].items()):
+            metric = f"{prefix}_{_metric_name(name)}_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            lines.append(f"{metric}_sum {timing['total_seconds']}")
+            lines.append(f"{metric}_count {timing['count']}")
+            lines.append(f"# TYPE {metric}_max gauge")
+            lines.append(f"{metric}_max {timing['max_seconds']}")
+        return "\n".join(lines) + "\n"
+
+    def dump_json(self, filepath: str) -> None:
+        with MarkdownFileManager.atomic_writer(filepath) as out:
+            out.write(self.to_json())
+
+    def dump_prometheus(self, filepath: str) -> None:
+        # Written atomically so a textfile collector never reads a partial file.
+        with MarkdownFileManager.atomic_writer(filepath) as out:
+            out.write(self.to_prometheus())
+
+    def dump_configured(
+        self,
+        json_path: Optional[str] = METRICS_JSON_PATH,
+        prometheus_path: Optional[str] = METRICS_PROMETHEUS_PATH,
+    ) -> None:
+        """Writes the dumps configured in config.py; call at the end of a batch run."""
+        if not self.enabled:
+            return
+        try:
+            if json_path:
+                self.dump_json(json_path)
+            if prometheus_path:
+                self.dump_prometheus(prometheus_path)
+        except OSError as e:
+            logger.error("Could not write metrics: %s", e)
+
+
+def _metric_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+METRICS = MetricsRegistry(enabled=METRICS_ENABLED)
@@ -4,10 +4,14 @@ import logging
 import os
 import re
 import time
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from document_model import SceneAnalysisPydantic
 from logging_config import get_logger
+from metrics import METRICS
+from rate_limiter import RateLimiter
+from token_estimator import batch_budget_for, pack_by_token_budget
+from response_cache import OfflineCacheMiss, ResponseCache
 from utils import (
     clean_and_flatten_roles,
     clean_json_list_from_response,
@@ -38,7 +42,8 @@ else:
     try:
         from openai import OpenAI
 
-        client = OpenAI()
+        # Retries are left to the rate limiter, which shares backoff between callers.
+        client = OpenAI(max_retries=0)
     except ImportError:
         client = None
         logger.error("OpenAI library not installed.")
@@ -46,51 +51,244 @@ else:
         client = None
         logger.exception("Could not initialize OpenAI client: %s", e)
 
+# --- Response Cache ---
+# Bump a template's version when its prompt or response handling changes in a
+# way that makes previously cached responses unsuitable.
+PROMPT_TEMPLATE_VERSIONS = {
+    "character_roles_batch": 1,
+    "enhancement_suggestions": 1,
+    "enhancement_suggestions_batch": 1,
+    "improved_section": 1,
+    "improved_sections": 1,
+    "scene_summary": 1,
+    "narration_title": 1,
+    "speech_bubbles": 1,
+    "character_roles": 1,
+    "scene_analysis": 1,
+}
+
+# The shared response cache and rate limiter open their SQLite files on first
+# use, not on import. Assign either to override it (None disables the cache).
+_UNSET: Any = object()
+response_cache: Optional[ResponseCache] = _UNSET
+rate_limiter: RateLimiter = _UNSET
+
+
+def _response_cache() -> Optional[ResponseCache]:
+    global response_cache
+    if response_cache is _UNSET:
+        response_cache = ResponseCache.default()
+    return response_cache
+
+
+def _rate_limiter() -> RateLimiter:
+    global rate_limiter
+    if rate_limiter is _UNSET:
+        rate_limiter = RateLimiter.default()
+    return rate_limiter
+
+
+def _cache_key(prompt: str, template: str, model: str, temperature: float) -> str:
+    return ResponseCache.key_for(
+        model,
+        temperature,
+        template,
+        PROMPT_TEMPLATE_VERSIONS[template],
+        [{"role": "user", "content": prompt}],
+    )
 
-# --- BATCHED ROLE SUGGESTION FUNCTION ---
-def suggest_character_roles_for_panels(
-    panels: List[Dict],
-    model: str = OPENAI_MODEL_SUGGESTION,
-    temperature: float = OPENAI_TEMP_SUGGESTION,
-    max_attempts: int = 3,
-) -> Dict[str, List[str]]:
+
+def _lookup_completion(
+    prompt: str, template: str, model: str, temperature: float, refresh: bool
+) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Returns (cache key, cached content). In offline mode a cache miss raises
+    OfflineCacheMiss instead of letting the caller reach the API.
+    """
+    cache = _response_cache()
+    if cache is None:
+        return None, None
+    key = _cache_key(prompt, template, model, temperature)
+    if not refresh:
+        cached = cache.get(key)
+        if cached is not None:
+            METRICS.increment("openai.cache_hits")
+            return key, cached
+    if cache.offline:
+        raise OfflineCacheMiss(f"No cached response for a '{template}' prompt.")
+    METRICS.increment("openai.cache_misses")
+    return key, None
+
+
+def _store_completion(
+    key: Optional[str], model: str, template: str, content: Optional[str]
+) -> None:
+    cache = _response_cache()
+    if content and key is not None and cache is not None:
+        cache.put(key, model, template, content)
+
+
+def _chat_completion(
+    prompt: str,
+    template: str,
+    model: str,
+    temperature: float,
+    refresh: bool = False,
+) -> Optional[str]:
+    """
+    Returns the message content of a chat completion for a single user prompt.
+    Responses are served from and stored in the response cache; `refresh`
+    ignores the cached copy.
+    """
+    key, cached = _lookup_completion(prompt, template, model, temperature, refresh)
+    if cached is not None:
+        return cached
+    with METRICS.timer("openai.request"):
+        response = create_chat_completion(
+            model, [{"role": "user", "content": prompt}], temperature
+        )
+    content = response.choices[0].message.content
+    _store_completion(key, model, template, content)
+    return content
+
+
+def create_chat_completion(
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: float,
+    api_client=None,
+    stream: bool = False,
+):
     """
-    Sends one batch prompt for all panels, returns {panel_title: [role, ...], ...}
+    Sends a chat completion request through the shared rate limiter, which
+    waits for the model's request and token budgets and retries 429s and
+    transient errors. Every OpenAI call in the project should go through here.
+    With `stream`, returns the SDK's iterator of chunks.
     """
+    api_client = api_client or client
+    prompt = "".join(message["content"] for message in messages)
+    extra = {"stream": True} if stream else {}
+    return _rate_limiter().call(
+        model,
+        prompt,
+        lambda: api_client.chat.completions.create(
+            model=model, messages=messages, temperature=temperature, **extra
+        ),
+    )
+
+
+def _streamed_chat_completion(
+    prompt: str,
+    template: str,
+    model: str,
+    temperature: float,
+    on_delta: Callable[[str], None],
+) -> Optional[str]:
+    """
+    Like _chat_completion, but passes the text to `on_delta` piece by piece
+    as the API streams it. A cached response is passed on in one piece.
+    """
+    key, cached = _lookup_completion(prompt, template, model, temperature, False)
+    if cached is not None:
+        on_delta(cached)
+        return cached
+    parts = []
+    with METRICS.timer("openai.request"):
+        started = time.perf_counter()
+        stream = create_chat_completion(
+            model, [{"role": "user", "content": prompt}], temperature, stream=True
+        )
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if not parts:
+                    METRICS.observe("openai.first_token", time.perf_counter() - started)
+                parts.append(delta)
+                on_delta(delta)
+    content = "".join(parts)
+    _store_completion(key, model, template, content)
+    return content
+
+
+def _discard_chat_completion(
+    prompt: str, template: str, model: str, temperature: float
+) -> None:
+    """Drops a cached response that could not be used, so it is not replayed."""
+    cache = _response_cache()
+    if cache is not None:
+        cache.discard(_cache_key(prompt, template, model, temperature))
+
+
+# --- BATCHED ROLE SUGGESTION FUNCTION ---
+def _character_roles_batch_prompt(panels: List[Dict]) -> str:
     prompt_panels = []
     for p in panels:
         prompt_panels.append(
             f"---\nPanel Title: {p['title']}\nScene Description:\n{p['scene']}\nTeaching Narrative:\n{p['teaching']}\n"
         )
-    prompt = f"""
+    return f"""
 You are a technical storyboard designer for a graphic novel that teaches SRE.
 For each panel below, suggest up to 4 character roles that should be visually present.
 Return a JSON dictionary: {{ "Panel Title 1": [roles...], ... }}
 {''.join(prompt_panels)}
 Respond ONLY with the JSON object.
     """
+
+
+def _parse_character_roles_batch(raw: str) -> Dict[str, List[str]]:
+    result = json.loads(strip_markdown_fences(raw.strip()))
+    return {
+        k: [v2 for v2 in v if isinstance(v2, str)]
+        for k, v in result.items()
+        if isinstance(v, list)
+    }
+
+
+def suggest_character_roles_for_panels(
+    panels: List[Dict],
+    model: str = OPENAI_MODEL_SUGGESTION,
+    temperature: float = OPENAI_TEMP_SUGGESTION,
+    max_attempts: int = 3,
+    token_budget: Optional[int] = None,
+) -> Dict[str, List[str]]:
+    """
+    Sends the panels in as few batch prompts as fit the token budget (the
+    model's batch budget by default), returns {panel_title: [role, ...], ...}
+    """
+    roles: Dict[str, List[str]] = {}
+    for batch in pack_by_token_budget(
+        panels,
+        _character_roles_batch_prompt,
+        token_budget or batch_budget_for(model),
+        model,
+    ):
+        roles.update(_suggest_roles_for_batch(batch, model, temperature, max_attempts))
+    return roles
+
+
+def _suggest_roles_for_batch(
+    panels: List[Dict], model: str, temperature: float, max_attempts: int
+) -> Dict[str, List[str]]:
+    prompt = _character_roles_batch_prompt(panels)
+    raw = None
     for attempt in range(max_attempts):
         try:
-            response = client.chat.completions.create(
-                model=model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=temperature,
+            raw = _chat_completion(
+                prompt,
+                "character_roles_batch",
+                model,
+                temperature,
+                refresh=attempt > 0,
             )
-            raw = response.choices[0].message.content.strip()
-            raw = strip_markdown_fences(raw)
-
-            result = json.loads(raw)
-            return {
-                k: [v2 for v2 in v if isinstance(v2, str)]
-                for k, v in result.items()
-                if isinstance(v, list)
-            }
+            return _parse_character_roles_batch(raw)
         except Exception as e:
+            _discard_chat_completion(prompt, "character_roles_batch", model, temperature)
             if attempt == max_attempts - 1:
                 logger.error("Failed to parse batch character roles: %s", e)
                 logger.debug("Raw: %s", raw)
                 return {}
-            time.sleep(2**attempt)
 
 
 def handle_openai_response(response_content: str, section_title: str) -> str:
@@ -103,15 +301,7 @@ def handle_openai_response(response_content: str, section_title: str) -> str:
     return cleaned
 
 
-def get_enhancement_suggestions_for_panel_h3s(
-    panel_title: str,
-    panel_context_markdown: str,
-    h3_sections_content: Dict[str, str],
-    model: str = OPENAI_MODEL_SUGGESTION,
-    temperature: float = OPENAI_TEMP_SUGGESTION,
-) -> Dict[str, Dict[str, Any]]:
-    if not h3_sections_content:
-        return {}
+def _sections_for_prompt(h3_sections_content: Dict[str, str]) -> str:
     h3_sections_text_for_prompt = []
     for h3_title, h3_md in h3_sections_content.items():
         content_without_heading = h3_md
@@ -128,8 +318,16 @@ def get_enhancement_suggestions_for_panel_h3s(
             f"## {h3_title}\n{content_without_heading if content_without_heading.strip() else 'This section appears to have no primary content following its heading.'}"
         )
     separator = "\n\n---\n\n"
-    joined_sections = separator.join(h3_sections_text_for_prompt)
-    prompt = f"""You are a senior SRE and technical learning designer.
+    return separator.join(h3_sections_text_for_prompt)
+
+
+def _enhancement_suggestions_prompt(
+    panel_title: str,
+    panel_context_markdown: str,
+    h3_sections_content: Dict[str, str],
+) -> str:
+    joined_sections = _sections_for_prompt(h3_sections_content)
+    return f"""You are a senior SRE and technical learning designer.
 You are reviewing H3 sub-sections within a larger document panel titled: "{panel_title}"
 
 Here is some overall context for this panel (which may include its H2 title and potentially key introductory H3 sections like Scene Description or Teaching Narrative):
@@ -152,42 +350,62 @@ For each H3 sub-section evaluated (use its exact title as the key, e.g., "Scene
 
 Ensure your entire response is a single, valid JSON object. Do not add any explanatory text before or after the JSON.
 """
+
+
+def _parse_enhancement_suggestions(raw_response_content: str) -> Dict[str, Dict[str, Any]]:
+    cleaned_response = raw_response_content.strip()
+    if cleaned_response.startswith("```json"):
+        cleaned_response = cleaned_response[7:]
+        if cleaned_response.endswith("```"):
+            cleaned_response = cleaned_response[:-3]
+    elif cleaned_response.startswith("```"):
+        cleaned_response = cleaned_response[3:]
+        if cleaned_response.endswith("```"):
+            cleaned_response = cleaned_response[:-3]
+    return _suggestions_from_json(json.loads(cleaned_response.strip()))
+
+
+def _suggestions_from_json(suggestions: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    parsed_suggestions = {}
+    for title_key, details in suggestions.items():
+        if isinstance(details, dict):
+            parsed_suggestions[title_key] = {
+                "enhance": str(details.get("enhance", "No")).lower() == "yes",
+                "recommendation": details.get("recommendation"),
+                "reason": details.get("reason"),
+            }
+        else:
+            logger.warning(
+                "Unexpected format for suggestion details for '%s': %s",
+                title_key,
+                details,
+            )
+    return parsed_suggestions
+
+
+def get_enhancement_suggestions_for_panel_h3s(
+    panel_title: str,
+    panel_context_markdown: str,
+    h3_sections_content: Dict[str, str],
+    model: str = OPENAI_MODEL_SUGGESTION,
+    temperature: float = OPENAI_TEMP_SUGGESTION,
+) -> Dict[str, Dict[str, Any]]:
+    if not h3_sections_content:
+        return {}
+    prompt = _enhancement_suggestions_prompt(
+        panel_title, panel_context_markdown, h3_sections_content
+    )
+    raw_response_content = None
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=temperature,
+        raw_response_content = _chat_completion(
+            prompt, "enhancement_suggestions", model, temperature
         )
-        raw_response_content = response.choices[0].message.content
         if not raw_response_content:
             logger.error("Received empty response for suggestions.")
             return {}
-        cleaned_response = raw_response_content.strip()
-        if cleaned_response.startswith("```json"):
-            cleaned_response = cleaned_response[7:]
-            if cleaned_response.endswith("```"):
-                cleaned_response = cleaned_response[:-3]
-        elif cleaned_response.startswith("```"):
-            cleaned_response = cleaned_response[3:]
-            if cleaned_response.endswith("```"):
-                cleaned_response = cleaned_response[:-3]
-        suggestions = json.loads(cleaned_response.strip())
-        parsed_suggestions = {}
-        for title_key, details in suggestions.items():
-            if isinstance(details, dict):
-                parsed_suggestions[title_key] = {
-                    "enhance": str(details.get("enhance", "No")).lower() == "yes",
-                    "recommendation": details.get("recommendation"),
-                    "reason": details.get("reason"),
-                }
-            else:
-                logger.warning(
-                    "Unexpected format for suggestion details for '%s': %s",
-                    title_key,
-                    details,
-                )
-        return parsed_suggestions
+        return _parse_enhancement_suggestions(raw_response_content)
     except json.JSONDecodeError as e:
+        _discard_chat_completion(prompt, "enhancement_suggestions", model, temperature)
         logger.error("Error decoding JSON response for suggestions: %s", e)
         logger.debug("Raw response was:\n>>>\n%s\n<<<", raw_response_content)
         return {}
@@ -198,18 +416,99 @@ Ensure your entire response is a single, valid JSON object. Do not add any expla
         return {}
 
 
-def get_improved_markdown_for_section(
+# --- BATCHED ENHANCEMENT SUGGESTIONS ---
+def _enhancement_suggestions_batch_prompt(panels: List[Dict[str, Any]]) -> str:
+    prompt_panels = []
+    for p in panels:
+        prompt_panels.append(
+            f"=== Panel {p['panel_number']}: \"{p['title']}\" ===\n\n{_sections_for_prompt(p['sections'])}\n"
+        )
+    joined_panels = "\n".join(prompt_panels)
+    return f"""You are a senior SRE and technical learning designer.
+You are reviewing the H3 sub-sections of several panels from one chapter. Within each panel, the Scene Description and Teaching Narrative sub-sections give the context for the others.
+
+For every H3 sub-section of every panel, determine if it could be enhanced for clarity, engagement, or practical application.
+
+{joined_panels}
+Key your assessment by panel number, then by exact H3 title (e.g., "Scene Description", "Common Example of the Problem"), in the following JSON format:
+{{
+  "1": {{
+    "Exact H3 Title 1": {{ "enhance": "Yes/No", "recommendation": "Type of enhancement (e.g., Add Mermaid Diagram, Text Diagram, More Examples, Checklist, Code Snippet, Table, Analogy) or null if No", "reason": "Brief justification for your recommendation or why no enhancement is needed." }},
+    "Exact H3 Title 2": {{ "enhance": "Yes/No", "recommendation": "...", "reason": "..." }}
+  }},
+  "2": {{ ... }}
+}}
+
+Ensure your entire response is a single, valid JSON object. Do not add any explanatory text before or after the JSON.
+"""
+
+
+def _parse_enhancement_suggestions_batch(raw: str) -> Dict[int, Dict[str, Dict[str, Any]]]:
+    result = json.loads(strip_markdown_fences(raw.strip()))
+    parsed = {}
+    for panel_key, suggestions in result.items():
+        if isinstance(suggestions, dict) and str(panel_key).strip().isdigit():
+            parsed[int(panel_key)] = _suggestions_from_json(suggestions)
+    return parsed
+
+
+def get_enhancement_suggestions_for_panels(
+    panels: List[Dict[str, Any]],
+    model: str = OPENAI_MODEL_SUGGESTION,
+    temperature: float = OPENAI_TEMP_SUGGESTION,
+    token_budget: Optional[int] = None,
+) -> Dict[int, Dict[str, Dict[str, Any]]]:
+    """
+    Batched get_enhancement_suggestions_for_panel_h3s: evaluates the H3s of
+    many panels per request. Each panel is a dict with "panel_number",
+    "title", "context" and "sections" ({h3 title: markdown}); panels are
+    packed into requests of at most `token_budget` prompt tokens (the
+    model's batch budget by default). Returns {panel_number: {h3 title:
+    suggestion}}. Panels a batch fails to answer are asked for one by one.
+    """
+    panels = [p for p in panels if p["sections"]]
+    suggestions: Dict[int, Dict[str, Dict[str, Any]]] = {}
+    for batch in pack_by_token_budget(
+        panels,
+        _enhancement_suggestions_batch_prompt,
+        token_budget or batch_budget_for(model),
+        model,
+    ):
+        if len(batch) > 1:
+            suggestions.update(_suggest_for_panel_batch(batch, model, temperature))
+        for p in batch:
+            if p["panel_number"] not in suggestions:
+                suggestions[p["panel_number"]] = get_enhancement_suggestions_for_panel_h3s(
+                    p["title"], p["context"], p["sections"], model, temperature
+                )
+    return suggestions
+
+
+def _suggest_for_panel_batch(
+    batch: List[Dict[str, Any]], model: str, temperature: float
+) -> Dict[int, Dict[str, Dict[str, Any]]]:
+    prompt = _enhancement_suggestions_batch_prompt(batch)
+    raw = None
+    try:
+        raw = _chat_completion(prompt, "enhancement_suggestions_batch", model, temperature)
+        parsed = _parse_enhancement_suggestions_batch(raw)
+    except Exception as e:
+        _discard_chat_completion(prompt, "enhancement_suggestions_batch", model, temperature)
+        logger.error("Failed to get batched suggestions, falling back per panel: %s", e)
+        logger.debug("Raw: %s", raw)
+        return {}
+    expected = {p["panel_number"] for p in batch}
+    return {n: s for n, s in parsed.items() if n in expected}
+
+
+def _improved_section_prompt(
     original_h3_markdown_content: str,
     enhancement_type: Optional[str],
     enhancement_reason: Optional[str],
     panel_title_context: str,
     overall_panel_context_md: str,
-    model: str = OPENAI_MODEL_ENHANCEMENT,
-    temperature: float = OPENAI_TEMP_ENHANCEMENT,
-) -> Optional[str]:
-    if not original_h3_markdown_content or not original_h3_markdown_content.strip():
-        logger.info("[OpenAI Service] Skipping enhancement for empty content.")
-        return original_h3_markdown_content
+) -> Tuple[str, str]:
+    """Returns (prompt, H3 title used in the prompt)."""
     h3_title_in_md = "This Section"
     lines = original_h3_markdown_content.strip().splitlines()
     if lines and lines[0].strip().startswith("### "):
@@ -244,54 +543,257 @@ Please provide an improved version of this H3 sub-section.
 - If a visual aid is required, use **Mermaid diagrams**, **ASCII flowcharts**, or **text-based representations**.
 - Do not include explanations or any content outside of the Markdown.
 """
+    return prompt, h3_title_for_prompt
+
+
+def _finish_improved_markdown(
+    improved_markdown: Optional[str],
+    original_h3_markdown_content: str,
+    h3_title_for_prompt: str,
+) -> Optional[str]:
+    if not improved_markdown:
+        logger.error("Received empty response for content enhancement.")
+        return None
+    cleaned_improved_markdown = handle_openai_response(
+        strip_markdown_fences(improved_markdown), h3_title_for_prompt
+    )
+    if not cleaned_improved_markdown.startswith("### "):
+        if original_h3_markdown_content.strip().startswith("### "):
+            original_heading_line = original_h3_markdown_content.strip().splitlines()[0]
+            if not cleaned_improved_markdown.strip().startswith(
+                original_heading_line.strip()
+            ):
+                logger.info(
+                    "Prepending original H3 heading '%s' to API response.",
+                    original_heading_line.strip(),
+                )
+                cleaned_improved_markdown = (
+                    original_heading_line + "\n\n" + cleaned_improved_markdown
+                )
+    return cleaned_improved_markdown
+
+
+def get_improved_markdown_for_section(
+    original_h3_markdown_content: str,
+    enhancement_type: Optional[str],
+    enhancement_reason: Optional[str],
+    panel_title_context: str,
+    overall_panel_context_md: str,
+    model: str = OPENAI_MODEL_ENHANCEMENT,
+    temperature: float = OPENAI_TEMP_ENHANCEMENT,
+) -> Optional[str]:
+    if not original_h3_markdown_content or not original_h3_markdown_content.strip():
+        logger.info("[OpenAI Service] Skipping enhancement for empty content.")
+        return original_h3_markdown_content
+    prompt, h3_title_for_prompt = _improved_section_prompt(
+        original_h3_markdown_content,
+        enhancement_type,
+        enhancement_reason,
+        panel_title_context,
+        overall_panel_context_md,
+    )
     logger.info(
         "Requesting enhancement for H3 section: '%s' in panel '%s'",
         h3_title_for_prompt,
         panel_title_context,
     )
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=temperature,
+        improved_markdown = _chat_completion(
+            prompt, "improved_section", model, temperature
+        )
+        return _finish_improved_markdown(
+            improved_markdown, original_h3_markdown_content, h3_title_for_prompt
         )
-        improved_markdown = response.choices[0].message.content
-        if improved_markdown:
-            cleaned_improved_markdown = handle_openai_response(
-                strip_markdown_fences(improved_markdown), h3_title_for_prompt
-            )
-            expected_heading = f"### {h3_title_for_prompt}"
-            if not cleaned_improved_markdown.startswith("### "):
-                if original_h3_markdown_content.strip().startswith("### "):
-                    original_heading_line = (
-                        original_h3_markdown_content.strip().splitlines()[0]
-                    )
-                    if not cleaned_improved_markdown.strip().startswith(
-                        original_heading_line.strip()
-                    ):
-                        logger.info(
-                            "Prepending original H3 heading '%s' to API response.",
-                            original_heading_line.strip(),
-                        )
-                        cleaned_improved_markdown = (
-                            original_heading_line + "\n\n" + cleaned_improved_markdown
-                        )
-            return cleaned_improved_markdown
-        else:
-            logger.error("Received empty response for content enhancement.")
-            return None
     except Exception as e:
         logger.exception("Unexpected error during content enhancement: %s", str(e))
         return None
 
 
-def rewrite_scene_and_teaching_as_summary(
-    scene_markdown: str,
-    teaching_markdown: str,
-    model: str = OPENAI_MODEL_DEFAULT,
-    temperature: float = OPENAI_TEMP_DEFAULT,
+def stream_improved_markdown_for_section(
+    original_h3_markdown_content: str,
+    enhancement_type: Optional[str],
+    enhancement_reason: Optional[str],
+    panel_title_context: str,
+    overall_panel_context_md: str,
+    on_delta: Callable[[str], None],
+    model: str = OPENAI_MODEL_ENHANCEMENT,
+    temperature: float = OPENAI_TEMP_ENHANCEMENT,
+) -> Optional[str]:
+    """
+    Streaming get_improved_markdown_for_section: the raw markdown is passed
+    to `on_delta` as it arrives, and the finished text gets the same fence
+    stripping and heading repair before it is returned.
+    """
+    if not original_h3_markdown_content or not original_h3_markdown_content.strip():
+        logger.info("[OpenAI Service] Skipping enhancement for empty content.")
+        return original_h3_markdown_content
+    prompt, h3_title_for_prompt = _improved_section_prompt(
+        original_h3_markdown_content,
+        enhancement_type,
+        enhancement_reason,
+        panel_title_context,
+        overall_panel_context_md,
+    )
+    try:
+        improved_markdown = _streamed_chat_completion(
+            prompt, "improved_section", model, temperature, on_delta
+        )
+        return _finish_improved_markdown(
+            improved_markdown, original_h3_markdown_content, h3_title_for_prompt
+        )
+    except Exception as e:
+        logger.exception("Unexpected error during content enhancement: %s", str(e))
+        return None
+
+
+# --- MULTI-SECTION ENHANCEMENT ---
+def _improved_sections_prompt(
+    sections: Dict[str, Dict[str, Any]],
+    panel_title_context: str,
+    overall_panel_context_md: str,
 ) -> str:
-    prompt = f"""
+    prompt_sections = []
+    for h3_title, section in sections.items():
+        prompt_sections.append(
+            f"""=== {h3_title} ===
+Suggested Enhancement Type: {section.get("enhancement_type") or "General improvement"}
+Reason for Enhancement: {section.get("enhancement_reason") or "Make it more engaging and clear."}
+Original content (including its H3 heading):
+---
+{section["markdown"]}
+---
+"""
+        )
+    joined_sections = "\n".join(prompt_sections)
+    return f"""You are a senior SRE and technical learning designer.
+You are tasked with improving several H3 sub-sections from a larger document panel titled \"{panel_title_context}\".
+The overall context for the panel is:
+---
+{overall_panel_context_md}
+---
+
+It was previously identified that each of the following sections should be enhanced:
+
+{joined_sections}
+Please provide an improved version of each H3 sub-section.
+- Incorporate each section's suggested enhancement.
+- Preserve the original tone and technical accuracy.
+- Ensure each improved section is well-formatted Markdown, starting with its original H3 heading.
+- Do **not** include image references, links to diagrams, or Markdown image tags (e.g., `![label](url)`).
+- If a visual aid is required, use **Mermaid diagrams**, **ASCII flowcharts**, or **text-based representations**.
+
+Return a single JSON object mapping each exact section title above to its improved Markdown:
+{{ "Exact H3 Title 1": "### Exact H3 Title 1\\n...", "Exact H3 Title 2": "..." }}
+Do not add any explanatory text before or after the JSON.
+"""
+
+
+def _parse_improved_sections(raw: str) -> Dict[str, str]:
+    result = json.loads(strip_markdown_fences(raw.strip()))
+    return {k: v for k, v in result.items() if isinstance(v, str) and v.strip()}
+
+
+def get_improved_markdown_for_sections(
+    sections: Dict[str, Dict[str, Any]],
+    panel_title_context: str,
+    overall_panel_context_md: str,
+    model: str = OPENAI_MODEL_ENHANCEMENT,
+    temperature: float = OPENAI_TEMP_ENHANCEMENT,
+) -> Dict[str, Optional[str]]:
+    """
+    Improves all flagged sections of one panel in a single request (more if
+    they exceed the model's batch budget), sending the panel context and
+    instructions once. `sections` maps each H3 title
+    to {"markdown", "enhancement_type", "enhancement_reason"}. Returns
+    {h3 title: improved markdown or None}. Sections the combined answer
+    does not cover, or all of them if it cannot be parsed, are improved one
+    by one with get_improved_markdown_for_section.
+    """
+    sections = {t: s for t, s in sections.items() if s["markdown"] and s["markdown"].strip()}
+    improved: Dict[str, Optional[str]] = {}
+    for group in _pack_sections(sections, panel_title_context, overall_panel_context_md, model):
+        if len(group) > 1:
+            improved.update(
+                _improve_section_batch(
+                    group, panel_title_context, overall_panel_context_md, model, temperature
+                )
+            )
+    for h3_title, section in sections.items():
+        if h3_title not in improved:
+            improved[h3_title] = get_improved_markdown_for_section(
+                section["markdown"],
+                section.get("enhancement_type"),
+                section.get("enhancement_reason"),
+                panel_title_context,
+                overall_panel_context_md,
+                model,
+                temperature,
+            )
+    return improved
+
+
+def _pack_sections(
+    sections: Dict[str, Dict[str, Any]],
+    panel_title_context: str,
+    overall_panel_context_md: str,
+    model: str,
+) -> List[Dict[str, Dict[str, Any]]]:
+    groups = pack_by_token_budget(
+        list(sections.items()),
+        lambda items: _improved_sections_prompt(
+            dict(items), panel_title_context, overall_panel_context_md
+        ),
+        batch_budget_for(model),
+        model,
+    )
+    return [dict(group) for group in groups]
+
+
+def _improve_section_batch(
+    sections: Dict[str, Dict[str, Any]],
+    panel_title_context: str,
+    overall_panel_context_md: str,
+    model: str,
+    temperature: float,
+) -> Dict[str, Optional[str]]:
+    prompt = _improved_sections_prompt(
+        sections, panel_title_context, overall_panel_context_md
+    )
+    logger.info(
+        "Requesting enhancement for %d H3 sections in panel '%s'",
+        len(sections),
+        panel_title_context,
+    )
+    raw = None
+    try:
+        raw = _chat_completion(prompt, "improved_sections", model, temperature)
+        parsed = _parse_improved_sections(raw)
+    except Exception as e:
+        _discard_chat_completion(prompt, "improved_sections", model, temperature)
+        logger.error("Failed to parse multi-section enhancement, falling back per section: %s", e)
+        logger.debug("Raw: %s", raw)
+        return {}
+    return _finish_improved_sections(parsed, sections)
+
+
+def _finish_improved_sections(
+    parsed: Dict[str, str], sections: Dict[str, Dict[str, Any]]
+) -> Dict[str, Optional[str]]:
+    improved = {}
+    for h3_title, markdown in parsed.items():
+        if h3_title in sections:
+            improved[h3_title] = _finish_improved_markdown(
+                markdown, sections[h3_title]["markdown"], h3_title
+            )
+    return improved
+
+
+SCENE_SUMMARY_FALLBACK = "A visual summary of this scene could not be generated."
+NARRATION_FALLBACK = "Narration missing"
+
+
+def _scene_summary_prompt(scene_markdown: str, teaching_markdown: str) -> str:
+    return f"""
 You are writing a short, vivid scene summary for a comic panel based on technical teaching material.
 
 Below is the raw material: a Scene Description and a Teaching Narrative.
@@ -316,26 +818,25 @@ Teaching Narrative:
 
 Write a single-paragraph summary suitable for visualizing in a comic panel. Do not include quotes or markdown.
     """
+
+
+def rewrite_scene_and_teaching_as_summary(
+    scene_markdown: str,
+    teaching_markdown: str,
+    model: str = OPENAI_MODEL_DEFAULT,
+    temperature: float = OPENAI_TEMP_DEFAULT,
+) -> str:
+    prompt = _scene_summary_prompt(scene_markdown, teaching_markdown)
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=temperature,
-        )
-        content = response.choices[0].message.content.strip()
+        content = _chat_completion(prompt, "scene_summary", model, temperature).strip()
         return content
     except Exception as e:
         logger.error("OpenAI error in scene summary generation: %s", str(e))
-        return "A visual summary of this scene could not be generated."
+        return SCENE_SUMMARY_FALLBACK
 
 
-def generate_narration_title_for_panel(
-    scene_md: str,
-    teaching_md: str,
-    model: str = OPENAI_MODEL_SPEECH,
-    temperature: float = OPENAI_TEMP_SPEECH,
-) -> str:
-    prompt = f"""
+def _narration_title_prompt(scene_md: str, teaching_md: str) -> str:
+    return f"""
 You are writing short narration tags for comic panels in a technical learning comic.
 
 Below is the scene and teaching content for one panel.
@@ -360,25 +861,25 @@ Example outputs:
 - "Green But Failing"
 - "Metrics Mislead Everyone"
     """
+
+
+def generate_narration_title_for_panel(
+    scene_md: str,
+    teaching_md: str,
+    model: str = OPENAI_MODEL_SPEECH,
+    temperature: float = OPENAI_TEMP_SPEECH,
+) -> str:
+    prompt = _narration_title_prompt(scene_md, teaching_md)
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=temperature,
-        )
-        return response.choices[0].message.content.strip()
+        return _chat_completion(prompt, "narration_title", model, temperature).strip()
     except Exception as e:
         logger.error("OpenAI narration generation failed: %s", str(e))
-        return "Narration missing"
+        return NARRATION_FALLBACK
 
 
-def generate_speech_bubbles_for_panel(
-    scene_summary: str,
-    character_names: List[str],
-    character_data: Dict,
-    model: str = OPENAI_MODEL_SPEECH,
-    temperature: float = OPENAI_TEMP_SPEECH,
-) -> Dict[str, str]:
+def _speech_bubbles_prompt(
+    scene_summary: str, character_names: List[str], character_data: Dict
+) -> str:
     character_lines = []
     for name in character_names:
         profile = character_data.get("characters", {}).get(name, {})
@@ -389,7 +890,7 @@ def generate_speech_bubbles_for_panel(
         tags = ", ".join(profile.get("visual_tags", []))
         character_lines.append(f"- {name} ({role}): {tone}. Tags: {tags}")
     character_block = "\n".join(character_lines)
-    prompt = f"""
+    return f"""
 You are writing realistic speech bubble text for a comic panel.
 
 Scene:
@@ -410,37 +911,44 @@ Return only a JSON object like:
   "Wanjiru": "Metrics are green though!"
 }}
     """
+
+
+def _parse_speech_bubbles(content: str) -> Dict[str, str]:
+    content = content.strip()
+    if content.startswith("```json"):
+        content = content[7:].strip()
+    elif content.startswith("```"):
+        content = content[3:].strip()
+    if content.endswith("```"):
+        content = content[:-3].strip()
+    parsed = json.loads(content)
+    if isinstance(parsed, dict):
+        return {k: v for k, v in parsed.items() if isinstance(v, str)}
+    else:
+        return {}
+
+
+def generate_speech_bubbles_for_panel(
+    scene_summary: str,
+    character_names: List[str],
+    character_data: Dict,
+    model: str = OPENAI_MODEL_SPEECH,
+    temperature: float = OPENAI_TEMP_SPEECH,
+) -> Dict[str, str]:
+    prompt = _speech_bubbles_prompt(scene_summary, character_names, character_data)
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=temperature,
-        )
-        content = response.choices[0].message.content.strip()
-        if content.startswith("```json"):
-            content = content[7:].strip()
-        elif content.startswith("```"):
-            content = content[3:].strip()
-        if content.endswith("```"):
-            content = content[:-3].strip()
-        parsed = json.loads(content)
-        if isinstance(parsed, dict):
-            return {k: v for k, v in parsed.items() if isinstance(v, str)}
-        else:
-            return {}
+        content = _chat_completion(prompt, "speech_bubbles", model, temperature)
+        return _parse_speech_bubbles(content)
     except Exception as e:
+        _discard_chat_completion(prompt, "speech_bubbles", model, temperature)
         logger.error("Failed to generate speech bubbles: %s", str(e))
         return {}
 
 
-def suggest_character_roles_from_context(
-    panel_title: str,
-    scene_description_md: str,
-    teaching_narrative_md: str,
-    model: str = OPENAI_MODEL_SUGGESTION,
-    temperature: float = OPENAI_TEMP_SUGGESTION,
-) -> List[str]:
-    prompt = f"""
+def _character_roles_prompt(
+    panel_title: str, scene_description_md: str, teaching_narrative_md: str
+) -> str:
+    return f"""
 You are a technical storyboard designer for a graphic novel that teaches site reliability engineering (SRE).
 You must decide which character types should be visually present in the following scene.
 
@@ -464,35 +972,47 @@ Use roles like "SRE Engineer", "Junior Developer", "Developer", "Product Owner",
 Return only a JSON array like this:
 ["SRE Engineer", "Junior Developer"]
     """
-    response = client.chat.completions.create(
-        model=model,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=temperature,
+
+
+def _parse_character_roles(raw: str) -> List[str]:
+    raw = raw.strip()
+    if raw.startswith("```"):
+        raw = re.sub(r"^```(?:json)?\s*|\s*```$", "", raw.strip(), flags=re.IGNORECASE)
+    parsed = json.loads(raw)
+    flattened = []
+
+    def extract_strings(item: Any) -> None:
+        if isinstance(item, str):
+            flattened.append(item)
+        elif isinstance(item, list):
+            for subitem in item:
+                extract_strings(subitem)
+
+    if isinstance(parsed, list):
+        for item in parsed:
+            extract_strings(item)
+    else:
+        logger.warning("OpenAI response was not a list: %s", parsed)
+    return flattened
+
+
+def suggest_character_roles_from_context(
+    panel_title: str,
+    scene_description_md: str,
+    teaching_narrative_md: str,
+    model: str = OPENAI_MODEL_SUGGESTION,
+    temperature: float = OPENAI_TEMP_SUGGESTION,
+) -> List[str]:
+    prompt = _character_roles_prompt(
+        panel_title, scene_description_md, teaching_narrative_md
     )
-    raw = response.choices[0].message.content.strip()
+    raw = None
     try:
-        if raw.startswith("```"):
-            raw = re.sub(
-                r"^```(?:json)?\s*|\s*```$", "", raw.strip(), flags=re.IGNORECASE
-            )
-        parsed = json.loads(raw)
-        flattened = []
-
-        def extract_strings(item: Any) -> None:
-            if isinstance(item, str):
-                flattened.append(item)
-            elif isinstance(item, list):
-                for subitem in item:
-                    extract_strings(subitem)
-
-        if isinstance(parsed, list):
-            for item in parsed:
-                extract_strings(item)
-        else:
-            logger.warning("OpenAI response was not a list: %s", parsed)
-        return flattened
+        raw = _chat_completion(prompt, "character_roles", model, temperature).strip()
+        return _parse_character_roles(raw)
     except Exception as e:
-        logger.error("Failed to parse character role list from OpenAI: %s", e)
+        _discard_chat_completion(prompt, "character_roles", model, temperature)
+        logger.error("Failed to get character role list from OpenAI: %s", e)
         logger.debug("Raw response was: %s", raw)
         return []
 
@@ -513,25 +1033,8 @@ def infer_scene_tags_for_panel(scene_md: str, teaching_md: str) -> List[str]:
     return tags
 
 
-def generate_scene_analysis_from_ai(
-    scene_markdown: str,
-    teaching_markdown: str,
-    model: str = OPENAI_MODEL_DEFAULT,
-    temperature: float = OPENAI_TEMP_DEFAULT,
-) -> SceneAnalysisPydantic:
-    """
-    Uses OpenAI to analyze a panel and generate a structured SceneAnalysisPydantic object.
-
-    Args:
-        scene_markdown: The scene description from the markdown panel
-        teaching_markdown: The teaching narrative from the markdown panel
-        model: The OpenAI model to use
-
-    Returns:
-        SceneAnalysisPydantic instance with AI-inferred tags and metadata
-    """
-
-    prompt = f"""
+def _scene_analysis_prompt(scene_markdown: str, teaching_markdown: str) -> str:
+    return f"""
 You are analyzing a scene and its teaching narrative from a visual technical comic.
 
 Read the following and classify the scene based on tone, intent, and structure.
@@ -558,37 +1061,65 @@ Return your analysis as a JSON object with the following fields:
 
 Respond with ONLY a single valid JSON object. Do not wrap in markdown fences. No commentary.
     """
+
+
+def _parse_scene_analysis(
+    content: str, scene_markdown: str, teaching_markdown: str
+) -> SceneAnalysisPydantic:
+    content = content.strip()
+    if content.startswith("```json"):
+        content = content[7:]
+    elif content.startswith("```"):
+        content = content[3:]
+    if content.endswith("```"):
+        content = content[:-3]
+    data = json.loads(content)
+    return SceneAnalysisPydantic(
+        scene_types=data.get("scene_types", []),
+        tone=data.get("tone"),
+        location=data.get("location"),
+        time_of_day=data.get("time_of_day"),
+        teaching_level=data.get("teaching_level"),
+        notes=data.get("notes"),
+        raw_summary=f"{scene_markdown.strip()}\n\n{teaching_markdown.strip()}",
+        inferred_by_ai=True,
+    )
+
+
+def _fallback_scene_analysis() -> SceneAnalysisPydantic:
+    return SceneAnalysisPydantic(
+        scene_types=["Teaching Scene"],
+        inferred_by_ai=True,
+        notes="Fallback to default scene type due to AI error.",
+    )
+
+
+def generate_scene_analysis_from_ai(
+    scene_markdown: str,
+    teaching_markdown: str,
+    model: str = OPENAI_MODEL_DEFAULT,
+    temperature: float = OPENAI_TEMP_DEFAULT,
+) -> SceneAnalysisPydantic:
+    """
+    Uses OpenAI to analyze a panel and generate a structured SceneAnalysisPydantic object.
+
+    Args:
+        scene_markdown: The scene description from the markdown panel
+        teaching_markdown: The teaching narrative from the markdown panel
+        model: The OpenAI model to use
+
+    Returns:
+        SceneAnalysisPydantic instance with AI-inferred tags and metadata
+    """
+    prompt = _scene_analysis_prompt(scene_markdown, teaching_markdown)
+    content = None
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=temperature,
-        )
-        content = response.choices[0].message.content.strip()
-        if content.startswith("```json"):
-            content = content[7:]
-        elif content.startswith("```"):
-            content = content[3:]
-        if content.endswith("```"):
-            content = content[:-3]
-        data = json.loads(content)
-        return SceneAnalysisPydantic(
-            scene_types=data.get("scene_types", []),
-            tone=data.get("tone"),
-            location=data.get("location"),
-            time_of_day=data.get("time_of_day"),
-            teaching_level=data.get("teaching_level"),
-            notes=data.get("notes"),
-            raw_summary=f"{scene_markdown.strip()}\n\n{teaching_markdown.strip()}",
-            inferred_by_ai=True,
-        )
+        content = _chat_completion(prompt, "scene_analysis", model, temperature)
+        return _parse_scene_analysis(content, scene_markdown, teaching_markdown)
     except Exception as e:
+        _discard_chat_completion(prompt, "scene_analysis", model, temperature)
         logger.error("Error during scene analysis generation: %s", e)
-        logger.debug(
-            "Raw response: %s", content if "content" in locals() else "None"
-        )
-        return SceneAnalysisPydantic(
-            scene_types=["Teaching Scene"],
-            inferred_by_ai=True,
-            notes="Fallback to default scene type due to AI error.",
-        )
+        logger.debug("Raw response: %s", content)
+        return _fallback_scene_analysis()
+
+
@@ -20,9 +20,13 @@ class PanelSectionManager:
     KNOWN_SECTION_TITLES = [s.value for s in SECTION_TITLES]
 
     @staticmethod
-    def extract_named_sections(panel: PanelPydantic) -> Dict[str, str]:
+    def extract_named_sections(
+        panel: PanelPydantic,
+        sections_by_title: Optional[Dict[str, H3Pydantic]] = None,
+    ) -> Dict[str, str]:
         """
         Returns a dict mapping known H3 section names to their markdown content (original).
+        `sections_by_title` is an optional prebuilt title -> H3 index for the panel.
         """
         if not panel:
             logger.error("Panel is None for extract_named_sections.")
@@ -30,6 +34,12 @@ class PanelSectionManager:
         extracted_sections = {
             title: "" for title in PanelSectionManager.KNOWN_SECTION_TITLES
         }
+        if sections_by_title is not None:
+            for title in extracted_sections:
+                h3_section = sections_by_title.get(title)
+                if h3_section:
+                    extracted_sections[title] = h3_section.original_full_markdown
+            return extracted_sections
         for h3_section in panel.h3_sections:
             h3_title = h3_section.heading_text.strip()
             if h3_title in extracted_sections:
@@ -38,21 +48,25 @@ class PanelSectionManager:
 
     @staticmethod
     def update_named_section(
-        panel: PanelPydantic, section_h3_title: str, new_markdown_content: str
+        panel: PanelPydantic,
+        section_h3_title: str,
+        new_markdown_content: str,
+        target_h3_section: Optional[H3Pydantic] = None,
     ) -> bool:
         """
         Update the content of a named H3 section in the panel. Returns True if successful.
+        Pass `target_h3_section` when the H3 was already looked up (e.g. from an index).
         """
         if not panel:
             logger.error(
                 f"Panel is None for update_named_section '{section_h3_title}'."
             )
             return False
-        target_h3_section: Optional[H3Pydantic] = None
-        for h3 in panel.h3_sections:
-            if h3.heading_text.strip() == section_h3_title.strip():
-                target_h3_section = h3
-                break
+        if target_h3_section is None:
+            for h3 in panel.h3_sections:
+                if h3.heading_text.strip() == section_h3_title.strip():
+                    target_h3_section = h3
+                    break
         if not target_h3_section:
             logger.error(
                 f"H3 section with title '{section_h3_title}' not found in Panel."
@@ -66,6 +80,8 @@ class PanelSectionManager:
             cleaned = f"### {section_h3_title}\n\n{cleaned}"
         target_h3_section.api_improved_markdown = cleaned
         target_h3_section.api_suggested_enhancement_needed = True
+        target_h3_section.mark_render_dirty()
+        panel.mark_render_dirty()
         logger.info(f"API improved markdown set for H3 '{section_h3_title}'.")
         return True
 
@@ -93,7 +109,4 @@ class PanelSectionManager:
             if isinstance(block, BlockCode):
                 continue
             filtered_blocks.append(block)
-        new_doc = Document("")
-        new_doc.children = filtered_blocks
-        rendered = render_blocks_to_markdown(filtered_blocks, new_doc.renderer)
-        return rendered.strip()
+        return render_blocks_to_markdown(filtered_blocks, original_doc.renderer)
@@ -0,0 +1,115 @@
+# parse_cache.py
+
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import Optional, Union
+
+from config import PARSE_CACHE_DIR, PARSE_CACHE_ENABLED, PARSE_CACHE_MAX_ENTRIES
+from document_model import ChapterPydantic
+from document_model_builder import BUILDER_VERSION
+
+logger = logging.getLogger(__name__)
+
+
+class ParseCache:
+    """
+    On-disk cache of built ChapterPydantic models (without mistletoe blocks),
+    keyed by a hash of the file content and the builder version.
+    One JSON file per entry; the least recently used entries are evicted
+    once the cache holds more than `max_entries` files.
+    """
+
+    _default: Optional["ParseCache"] = None
+
+    def __init__(
+        self,
+        cache_dir: Union[str, Path] = PARSE_CACHE_DIR,
+        max_entries: int = PARSE_CACHE_MAX_ENTRIES,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.max_entries = max_entries
+
+    @classmethod
+    def default(cls) -> Optional["ParseCache"]:
+        """Returns the shared cache configured in config.py, or None if disabled."""
+        if not PARSE_CACHE_ENABLED:
+            return None
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    @staticmethod
+    def key_for(raw_content: str) -> str:
+        digest = hashlib.sha256(f"{BUILDER_VERSION}\0".encode("utf-8"))
+        digest.update(raw_content.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, raw_content: str) -> Optional[ChapterPydantic]:
+        path = self._path_for(raw_content)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning("Could not read parse cache entry %s: %s", path.name, e)
+            return None
+        try:
+            chapter_model = ChapterPydantic.model_validate_json(data)
+        except ValueError as e:
+            logger.warning("Discarding corrupt parse cache entry %s: %s", path.name, e)
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        return chapter_model
+
+    def put(self, raw_content: str, chapter_model: ChapterPydantic) -> None:
+        path = self._path_for(raw_content)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_text(chapter_model.model_dump_json(), encoding="utf-8")
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not write parse cache entry %s: %s", path.name, e)
+            self._remove(tmp_path)
+            return
+        self._evict()
+
+    def clear(self) -> None:
+        for path in self._entries():
+            self._remove(path)
+
+    def _path_for(self, raw_content: str) -> Path:
+        return self.cache_dir / f"{self.key_for(raw_content)}.json"
+
+    def _entries(self):
+        try:
+            return list(self.cache_dir.glob("*.json"))
+        except OSError:
+            return []
+
+    def _evict(self) -> None:
+        entries = self._entries()
+        if len(entries) <= self.max_entries:
+            return
+        by_age = []
+        for path in entries:
+            try:
+                by_age.append((path.stat().st_mtime, path))
+            except OSError:
+                continue  # removed by another process
+        by_age.sort()
+        for _, path in by_age[: len(by_age) - self.max_entries]:
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path: Path) -> None:
+        try:
+            path.unlink()
+        except OSError:
+            pass
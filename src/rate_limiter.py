@@ -0,0 +1,341 @@
+# rate_limiter.py
+
+import asyncio
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from config import (
+    OPENAI_EXPECTED_COMPLETION_TOKENS,
+    OPENAI_MAX_RETRIES,
+    OPENAI_RATE_LIMIT_BACKEND,
+    OPENAI_RATE_LIMIT_PATH,
+    OPENAI_RATE_LIMITS,
+)
+from metrics import METRICS
+from token_estimator import TokenEstimator
+
+logger = logging.getLogger(__name__)
+
+# What the OpenAI SDK retries itself: these status codes, plus dropped
+# connections and timeouts (APITimeoutError is an APIConnectionError).
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+try:
+    from openai import APIConnectionError
+
+    RETRYABLE_ERRORS = (ConnectionError, TimeoutError, APIConnectionError)
+except ImportError:
+    RETRYABLE_ERRORS = (ConnectionError, TimeoutError)
+_MAX_BACKOFF_SECONDS = 60.0
+
+# (request level, token level, updated_at, blocked_until)
+BucketState = Tuple[float, float, float, float]
+
+
+def _reserve(
+    state: Optional[BucketState],
+    rpm: float,
+    tpm: float,
+    tokens: float,
+    now: float,
+) -> Tuple[BucketState, float]:
+    """
+    Refills both buckets for the time elapsed, takes one request and `tokens`
+    from them and returns (new state, seconds to wait before sending). Levels
+    may go negative: the debt is the capacity reserved ahead of time by
+    callers already waiting, so waiters are served in arrival order.
+    """
+    if state is None:
+        requests, budget, updated_at, blocked_until = rpm, tpm, now, 0.0
+    else:
+        requests, budget, updated_at, blocked_until = state
+    elapsed = max(0.0, now - updated_at)
+    requests = min(rpm, requests + elapsed * rpm / 60.0) - 1
+    budget = min(tpm, budget + elapsed * tpm / 60.0) - tokens
+    wait = max(
+        0.0,
+        blocked_until - now,
+        -requests * 60.0 / rpm,
+        -budget * 60.0 / tpm,
+    )
+    return (requests, budget, now, blocked_until), wait
+
+
+class _MemoryBuckets:
+    """Bucket states shared by the threads of one process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._states: Dict[str, BucketState] = {}
+
+    def reserve(self, model: str, rpm: float, tpm: float, tokens: float) -> float:
+        with self._lock:
+            self._states[model], wait = _reserve(
+                self._states.get(model), rpm, tpm, tokens, time.time()
+            )
+        return wait
+
+    def adjust_tokens(self, model: str, tokens: float) -> None:
+        with self._lock:
+            state = self._states.get(model)
+            if state is not None:
+                requests, budget, updated_at, blocked_until = state
+                self._states[model] = (requests, budget + tokens, updated_at, blocked_until)
+
+    def block_until(self, model: str, until: float) -> None:
+        with self._lock:
+            state = self._states.get(model)
+            if state is not None:
+                requests, budget, updated_at, blocked_until = state
+                self._states[model] = (
+                    requests,
+                    budget,
+                    updated_at,
+                    max(blocked_until, until),
+                )
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    model TEXT PRIMARY KEY,
+    requests REAL NOT NULL,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    blocked_until REAL NOT NULL
+);
+"""
+
+
+class _SQLiteBuckets:
+    """
+    Bucket states kept in a SQLite file, so every process using the same
+    path draws from one budget. Each reservation is a single IMMEDIATE
+    transaction.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+
+    def reserve(self, model: str, rpm: float, tpm: float, tokens: float) -> float:
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT requests, tokens, updated_at, blocked_until FROM buckets "
+                "WHERE model = ?",
+                (model,),
+            ).fetchone()
+            state, wait = _reserve(row, rpm, tpm, tokens, time.time())
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?, ?)", (model, *state)
+            )
+        return wait
+
+    def adjust_tokens(self, model: str, tokens: float) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE buckets SET tokens = tokens + ? WHERE model = ?", (tokens, model)
+            )
+
+    def block_until(self, model: str, until: float) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE buckets SET blocked_until = MAX(blocked_until, ?) WHERE model = ?",
+                (until, model),
+            )
+
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        return _Commit(conn)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+
+class _Commit:
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        return self.conn
+
+    def __exit__(self, exc_type, *exc_info):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter for the OpenAI API: one bucket of requests per minute
+    and one of estimated tokens per minute for each model. `call` waits for
+    both budgets, sends the request, retries 429s and transient errors
+    (honouring Retry-After, otherwise exponential backoff with jitter, and
+    pausing every caller of that model meanwhile), and corrects the token
+    estimate with the usage the response reports.
+    """
+
+    _default: Optional["RateLimiter"] = None
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, Dict[str, float]]] = None,
+        path: Optional[str] = None,
+        max_retries: int = OPENAI_MAX_RETRIES,
+        expected_completion_tokens: int = OPENAI_EXPECTED_COMPLETION_TOKENS,
+        estimator: Optional[TokenEstimator] = None,
+    ):
+        self.limits = limits or OPENAI_RATE_LIMITS
+        self.max_retries = max_retries
+        self.expected_completion_tokens = expected_completion_tokens
+        self.estimator = estimator or TokenEstimator.default()
+        self._buckets = _SQLiteBuckets(path) if path else _MemoryBuckets()
+
+    @classmethod
+    def default(cls) -> "RateLimiter":
+        """Returns the process-wide limiter configured in config.py."""
+        if cls._default is None:
+            path = OPENAI_RATE_LIMIT_PATH if OPENAI_RATE_LIMIT_BACKEND == "sqlite" else None
+            try:
+                cls._default = cls(path=path)
+            except (OSError, sqlite3.Error) as e:
+                logger.warning("Shared rate limit store unavailable, using memory: %s", e)
+                cls._default = cls()
+        return cls._default
+
+    def limits_for(self, model: str) -> Dict[str, float]:
+        return self.limits.get(model) or self.limits["default"]
+
+    def estimate(self, model: str, prompt: str) -> int:
+        return self.estimator.count(prompt, model) + self.expected_completion_tokens
+
+    def reserve(self, model: str, tokens: int) -> float:
+        """Takes one request and `tokens` from the model's budget; returns the wait."""
+        limits = self.limits_for(model)
+        try:
+            return self._buckets.reserve(model, limits["rpm"], limits["tpm"], tokens)
+        except sqlite3.Error as e:
+            logger.warning("Rate limit store failed, not waiting: %s", e)
+            return 0.0
+
+    def acquire(self, model: str, tokens: int) -> None:
+        wait = self.reserve(model, tokens)
+        if wait > 0:
+            METRICS.observe("openai.rate_limit_wait", wait)
+            time.sleep(wait)
+
+    async def acquire_async(self, model: str, tokens: int) -> None:
+        # The SQLite reservation can block on other processes' locks, so it
+        # runs off the event loop.
+        wait = await asyncio.to_thread(self.reserve, model, tokens)
+        if wait > 0:
+            METRICS.observe("openai.rate_limit_wait", wait)
+            await asyncio.sleep(wait)
+
+    def settle(self, model: str, prompt: str, estimated: int, response: Any) -> None:
+        """
+        Returns the unused part of a token estimate (or charges the overrun)
+        and lets the estimator learn from the reported usage.
+        """
+        used = getattr(getattr(response, "usage", None), "total_tokens", None)
+        if isinstance(used, (int, float)) and used != estimated:
+            self._safely(self._buckets.adjust_tokens, model, estimated - used)
+        self.estimator.record_usage(model, prompt, response)
+
+    def pause(self, model: str, seconds: float) -> None:
+        """Holds back every caller of `model` (in all sharing processes) for `seconds`."""
+        self._safely(self._buckets.block_until, model, time.time() + seconds)
+
+    def retry_delay(self, error: BaseException, attempt: int) -> Optional[float]:
+        """Seconds to back off before retrying `error`, or None if it is not retryable."""
+        status = getattr(error, "status_code", None)
+        if status not in RETRYABLE_STATUS_CODES and not isinstance(error, RETRYABLE_ERRORS):
+            return None
+        if attempt >= self.max_retries:
+            return None
+        retry_after = _retry_after_seconds(error)
+        if retry_after is not None:
+            return retry_after
+        return min(_MAX_BACKOFF_SECONDS, 2**attempt) * (0.5 + random.random() / 2)
+
+    def call(self, model: str, prompt: str, send: Callable[[], Any]) -> Any:
+        estimated = self.estimate(model, prompt)
+        attempt = 0
+        while True:
+            self.acquire(model, estimated)
+            try:
+                response = send()
+            except Exception as e:
+                delay = self._backoff(model, e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                continue
+            self.settle(model, prompt, estimated, response)
+            return response
+
+    async def call_async(
+        self, model: str, prompt: str, send: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Like `call`, with every rate limit store access run in a worker thread."""
+        estimated = self.estimate(model, prompt)
+        attempt = 0
+        while True:
+            await self.acquire_async(model, estimated)
+            try:
+                response = await send()
+            except Exception as e:
+                delay = await asyncio.to_thread(self._backoff, model, e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                continue
+            await asyncio.to_thread(self.settle, model, prompt, estimated, response)
+            return response
+
+    def _backoff(self, model: str, error: BaseException, attempt: int) -> Optional[float]:
+        delay = self.retry_delay(error, attempt)
+        if delay is not None:
+            logger.warning(
+                "OpenAI request for %s failed (%s); retrying in %.1fs",
+                model,
+                getattr(error, "status_code", error),
+                delay,
+            )
+            METRICS.increment("openai.retries")
+            self.pause(model, delay)
+        return delay
+
+    def _safely(self, method: Callable, *args) -> None:
+        try:
+            method(*args)
+        except sqlite3.Error as e:
+            logger.warning("Rate limit store update failed: %s", e)
+
+
+def _retry_after_seconds(error: BaseException) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms is not None:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if retry_after is not None:
+        try:
+            return float(retry_after)
+        except ValueError:
+            return None
+    return None
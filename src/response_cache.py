@@ -0,0 +1,195 @@
+# response_cache.py
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from config import (
+    OPENAI_CACHE_ENABLED,
+    OPENAI_CACHE_MAX_AGE_DAYS,
+    OPENAI_CACHE_MAX_ENTRIES,
+    OPENAI_CACHE_OFFLINE,
+    OPENAI_CACHE_PATH,
+)
+
+logger = logging.getLogger(__name__)
+
+# Eviction runs once per this many writes.
+_EVICT_EVERY_PUTS = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    template TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used_at);
+"""
+
+
+class OfflineCacheMiss(RuntimeError):
+    """Raised in offline mode when a prompt has no cached response."""
+
+
+class ResponseCache:
+    """
+    SQLite-backed cache of chat completion texts. Safe to share between
+    threads and processes (WAL journal, one connection per thread). Entries
+    older than `max_age_days` or beyond the `max_entries` most recently used
+    are evicted. An `offline` cache opens the database read-only and never
+    records anything.
+    """
+
+    _default: Optional["ResponseCache"] = None
+
+    def __init__(
+        self,
+        path: str = OPENAI_CACHE_PATH,
+        max_entries: int = OPENAI_CACHE_MAX_ENTRIES,
+        max_age_days: float = OPENAI_CACHE_MAX_AGE_DAYS,
+        offline: bool = OPENAI_CACHE_OFFLINE,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 86400
+        self.offline = offline
+        self._local = threading.local()
+        self._puts = 0
+        if not offline:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with self._connection() as conn:
+                conn.executescript(_SCHEMA)
+
+    @classmethod
+    def default(cls) -> Optional["ResponseCache"]:
+        """Returns the shared cache configured in config.py, or None if disabled."""
+        if not OPENAI_CACHE_ENABLED:
+            return None
+        if cls._default is None:
+            try:
+                cls._default = cls()
+            except (OSError, sqlite3.Error) as e:
+                logger.warning("OpenAI response cache unavailable: %s", e)
+                return None
+        return cls._default
+
+    @staticmethod
+    def key_for(
+        model: str,
+        temperature: float,
+        template: str,
+        template_version: int,
+        messages: List[Dict[str, str]],
+    ) -> str:
+        prompt_hash = hashlib.sha256(
+            json.dumps(messages, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        return hashlib.sha256(
+            f"{model}\0{temperature!r}\0{template}\0{template_version}\0{prompt_hash}".encode(
+                "utf-8"
+            )
+        ).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            conn = self._connection()
+            if conn is None:
+                return None
+            row = conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            response, created_at = row
+            now = time.time()
+            if now - created_at > self.max_age_seconds:
+                return None
+            if not self.offline:
+                with conn:
+                    conn.execute(
+                        "UPDATE responses SET last_used_at = ? WHERE key = ?", (now, key)
+                    )
+            return response
+        except sqlite3.Error as e:
+            logger.warning("OpenAI response cache read failed: %s", e)
+            return None
+
+    def put(self, key: str, model: str, template: str, response: str) -> None:
+        if self.offline:
+            return
+        now = time.time()
+        try:
+            with self._connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, model, template, response, now, now),
+                )
+        except sqlite3.Error as e:
+            logger.warning("OpenAI response cache write failed: %s", e)
+            return
+        self._puts += 1
+        if self._puts % _EVICT_EVERY_PUTS == 0:
+            self.evict()
+
+    def discard(self, key: str) -> None:
+        """Drops one entry, e.g. a response that turned out to be unusable."""
+        if self.offline:
+            return
+        try:
+            with self._connection() as conn:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            logger.warning("OpenAI response cache delete failed: %s", e)
+
+    def evict(self) -> None:
+        if self.offline:
+            return
+        try:
+            with self._connection() as conn:
+                conn.execute(
+                    "DELETE FROM responses WHERE created_at < ?",
+                    (time.time() - self.max_age_seconds,),
+                )
+                conn.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+                    "ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+        except sqlite3.Error as e:
+            logger.warning("OpenAI response cache eviction failed: %s", e)
+
+    def clear(self) -> None:
+        if self.offline:
+            return
+        with self._connection() as conn:
+            conn.execute("DELETE FROM responses")
+
+    def __len__(self) -> int:
+        conn = self._connection()
+        if conn is None:
+            return 0
+        return conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        conn = getattr(self._local, "conn", None)
+        # Connections must not cross a fork (e.g. into CorpusLoader workers).
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        if self.offline:
+            if not os.path.exists(self.path):
+                return None
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=30)
+        else:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
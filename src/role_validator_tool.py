@@ -6,8 +6,9 @@ import json
 import re
 import sys
 from pathlib import Path
-from typing import Any, Dict, List, Set, Union
+from typing import Any, Dict, List, Optional, Set, Union
 
+from corpus_loader import CorpusLoader
 from document_model import PanelPydantic
 from logging_config import get_logger
 from markdown_document import MarkdownDocument
@@ -138,7 +139,9 @@ def get_valid_roles_from_character_json(json_path: Path) -> List[str]:
 
 
 def validate_roles(
-    character_json: Path, markdown_dir: Path
+    character_json: Path,
+    markdown_dir: Path,
+    corpus_loader: Optional[CorpusLoader] = None,
 ) -> List[Dict[str, Union[str, List[str]]]]:
     """
     Validates that all character roles found in markdown files exist in the character JSON.
@@ -146,6 +149,7 @@ def validate_roles(
     Args:
         character_json: Path to the character JSON file
         markdown_dir: Path to the directory containing markdown files
+        corpus_loader: Loader used to parse the directory (defaults to CorpusLoader())
 
     Returns:
         List of dictionaries with information about missing roles
@@ -155,9 +159,12 @@ def validate_roles(
     logger.info("Loaded %d defined roles from character config.", len(valid_roles))
 
     validation_report = []
-    for md_file in markdown_dir.glob("*.md"):
-        doc = MarkdownDocument(filepath=str(md_file))
+    corpus_loader = corpus_loader or CorpusLoader()
+    for md_file, doc in corpus_loader.iter_documents(markdown_dir):
         logger.info("Checking file: %s", md_file.name)
+        if doc is None:
+            logger.warning("Skipping unreadable file: %s", md_file.name)
+            continue
 
         # Get roles for each panel
         panel_roles = extract_roles_per_panel(doc)
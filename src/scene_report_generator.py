@@ -1,16 +1,22 @@
 import json
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 from logging_config import get_logger
 
+from corpus_loader import CorpusLoader
 from document_model import PanelPydantic
 from markdown_document import MarkdownDocument
 from openai_service import generate_scene_analysis_from_ai
 
 logger = get_logger(__name__)
 
-def analyze_markdown_file(md_path: Path, character_json_path: Path) -> dict:
-    doc = MarkdownDocument(filepath=str(md_path))
+def analyze_markdown_file(
+    md_path: Path,
+    character_json_path: Path,
+    doc: Optional[MarkdownDocument] = None,
+) -> dict:
+    if doc is None:
+        doc = MarkdownDocument(filepath=str(md_path))
     if not doc.chapter_model:
         logger.warning("Failed to parse: %s", md_path.name)
         return {}
@@ -115,14 +121,18 @@ def main():
         logger.error("Character JSON file not found.")
         return
 
-    md_files = [md_path] if md_path.is_file() else list(md_path.glob("*.md"))
+    corpus_loader = CorpusLoader()
+    md_files = corpus_loader.discover(md_path)
     if not md_files:
         logger.error("No markdown files found.")
         return
 
-    for file in md_files:
+    for file, doc in corpus_loader.iter_documents(md_files):
         logger.info("\n🔍 Analyzing %s...", file.name)
-        report_data = analyze_markdown_file(file, char_path)
+        if doc is None:
+            logger.warning("Failed to parse: %s", file.name)
+            continue
+        report_data = analyze_markdown_file(file, char_path, doc)
         if report_data:
             if len(md_files) > 1:
                 file_output_path = out_path.with_name(f"{file.stem}_scene_report.md")
@@ -0,0 +1,127 @@
+# token_estimator.py
+
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, TypeVar
+
+from config import OPENAI_BATCH_PROMPT_TOKEN_BUDGETS, OPENAI_CHARS_PER_TOKEN
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+T = TypeVar("T")
+
+# Weight of each new usage sample in the calibrated chars-per-token ratio.
+_CALIBRATION_WEIGHT = 0.2
+
+
+class TokenEstimator:
+    """
+    Counts prompt tokens with the model's tiktoken encoding when tiktoken is
+    installed, otherwise from a chars-per-token ratio. The ratio starts at
+    OPENAI_CHARS_PER_TOKEN and is calibrated per model from the prompt
+    token usage that responses report.
+    """
+
+    _default: Optional["TokenEstimator"] = None
+
+    def __init__(self, chars_per_token: float = OPENAI_CHARS_PER_TOKEN):
+        self.default_chars_per_token = chars_per_token
+        self._chars_per_token: Dict[str, float] = {}
+        self._encodings: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def default(cls) -> "TokenEstimator":
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def count(self, text: str, model: str = "default") -> int:
+        encoding = self._encoding(model)
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+        return int(len(text) / self.chars_per_token(model)) + 1
+
+    def chars_per_token(self, model: str) -> float:
+        return self._chars_per_token.get(model, self.default_chars_per_token)
+
+    def record_usage(self, model: str, prompt: str, response: Any) -> None:
+        """
+        Compares the estimate for `prompt` with the prompt tokens `response`
+        reports, records both as metrics and calibrates the model's ratio.
+        """
+        actual = getattr(getattr(response, "usage", None), "prompt_tokens", None)
+        if not isinstance(actual, int) or actual <= 0:
+            return
+        estimated = self.count(prompt, model)
+        METRICS.increment("openai.prompt_tokens_estimated", estimated)
+        METRICS.increment("openai.prompt_tokens_actual", actual)
+        if self._encoding(model) is None and prompt:
+            with self._lock:
+                ratio = self.chars_per_token(model)
+                self._chars_per_token[model] = (
+                    1 - _CALIBRATION_WEIGHT
+                ) * ratio + _CALIBRATION_WEIGHT * (len(prompt) / actual)
+        logger.debug("Prompt tokens for %s: estimated %d, actual %d", model, estimated, actual)
+
+    def _encoding(self, model: str):
+        if tiktoken is None:
+            return None
+        if model not in self._encodings:
+            self._encodings[model] = self._load_encoding(model)
+        return self._encodings[model]
+
+    @staticmethod
+    def _load_encoding(model: str):
+        # tiktoken downloads BPE files on first use; offline, that fails and
+        # the model is counted by the chars-per-token ratio instead.
+        try:
+            try:
+                return tiktoken.encoding_for_model(model)
+            except KeyError:
+                return tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            logger.warning("No tiktoken encoding for %s, estimating tokens: %s", model, e)
+            return None
+
+
+def batch_budget_for(model: str) -> int:
+    """Estimated prompt tokens allowed in one batched request to `model`."""
+    return OPENAI_BATCH_PROMPT_TOKEN_BUDGETS.get(
+        model, OPENAI_BATCH_PROMPT_TOKEN_BUDGETS["default"]
+    )
+
+
+def pack_by_token_budget(
+    items: Sequence[T],
+    prompt_for: Callable[[List[T]], str],
+    token_budget: int,
+    model: str = "default",
+    estimator: Optional[TokenEstimator] = None,
+) -> List[List[T]]:
+    """
+    Splits `items` into consecutive groups whose prompt, built by
+    `prompt_for(group)`, stays within `token_budget` estimated tokens. An
+    item too large on its own still gets a group of its own.
+    """
+    estimator = estimator or TokenEstimator.default()
+    overhead = estimator.count(prompt_for([]), model)
+    groups: List[List[T]] = []
+    group: List[T] = []
+    used = overhead
+    for item in items:
+        cost = estimator.count(prompt_for([item]), model) - overhead
+        if group and used + cost > token_budget:
+            groups.append(group)
+            group, used = [], overhead
+        group.append(item)
+        used += cost
+    if group:
+        groups.append(group)
+    return groups
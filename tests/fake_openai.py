@@ -0,0 +1,56 @@
+import os
+import sys
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.abspath("src"))
+
+import async_openai_service
+import generate_character_profiles
+import openai_service
+from rate_limiter import RateLimiter
+
+
+def chat_response(content):
+    """A chat completion response holding one message with `content`."""
+    message = type("Message", (), {"content": content})
+    choice = type("Choice", (), {"message": message})
+    return type("Response", (), {"choices": [choice]})
+
+
+def fake_client(completions):
+    """A client whose `chat.completions` is `completions`."""
+    return type("Client", (), {"chat": type("Chat", (), {"completions": completions})})
+
+
+@contextmanager
+def fake_openai(completions, asynchronous=False, response_cache=None):
+    """
+    Routes every OpenAI call to `completions` (the async client's when
+    `asynchronous`), with an unlimited in-memory rate limiter and
+    `response_cache` (none by default); restores the real ones on exit.
+    """
+    saved = (
+        openai_service.client,
+        async_openai_service.async_client,
+        generate_character_profiles.client,
+        openai_service.response_cache,
+        openai_service.rate_limiter,
+    )
+    try:
+        if asynchronous:
+            async_openai_service.async_client = fake_client(completions)
+        else:
+            openai_service.client = fake_client(completions)
+            # Falls back to openai_service.client.
+            generate_character_profiles.client = None
+        openai_service.response_cache = response_cache
+        openai_service.rate_limiter = RateLimiter({"default": {"rpm": 10**6, "tpm": 10**9}})
+        yield
+    finally:
+        (
+            openai_service.client,
+            async_openai_service.async_client,
+            generate_character_profiles.client,
+            openai_service.response_cache,
+            openai_service.rate_limiter,
+        ) = saved
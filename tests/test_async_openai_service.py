@@ -0,0 +1,90 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath("src"))
+sys.path.insert(0, os.path.abspath("."))
+
+import async_openai_service
+from response_cache import ResponseCache
+from tests.fake_openai import chat_response, fake_openai
+
+
+class _FakeAsyncCompletions:
+    def __init__(self):
+        self.calls = 0
+        self.in_flight = 0
+        self.peak = 0
+
+    async def create(self, model, messages, temperature):
+        self.calls += 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return chat_response("IMPROVED " + messages[0]["content"].rsplit("Panel: ", 1)[-1][:8])
+
+
+def test_batch_driver_bounds_in_flight_requests_and_shares_cache():
+    completions = _FakeAsyncCompletions()
+    saved_limit = async_openai_service.max_concurrent_requests
+    requests = [
+        {
+            "original_h3_markdown_content": f"### Scene Description\nText {i}",
+            "enhancement_type": "clarity",
+            "enhancement_reason": "reason",
+            "panel_title_context": f"Panel {i:03d}",
+            "overall_panel_context_md": "## Panel",
+        }
+        for i in range(40)
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ResponseCache(os.path.join(tmp, "r.sqlite3"))
+        try:
+            with fake_openai(completions, asynchronous=True, response_cache=cache):
+                async_openai_service.set_max_concurrent_requests(5)
+                results = asyncio.run(async_openai_service.improve_sections(requests))
+                assert completions.calls == 40
+                assert completions.peak == 5
+                assert all(r.startswith("### Scene Description") for r in results)
+
+                asyncio.run(async_openai_service.improve_sections(requests))
+                assert completions.calls == 40
+        finally:
+            async_openai_service.set_max_concurrent_requests(saved_limit)
+
+class _RateLimitedOnce(Exception):
+    status_code = 429
+    response = type("Response", (), {"headers": {"retry-after-ms": "300"}})
+
+
+def test_backing_off_requests_do_not_hold_a_slot():
+    finished = {}
+
+    class _Completions:
+        async def create(self, model, messages, temperature):
+            prompt = messages[0]["content"]
+            if prompt == "first" and "first" not in finished:
+                finished["first"] = None
+                raise _RateLimitedOnce()
+            finished[prompt] = asyncio.get_running_loop().time()
+            return chat_response(prompt)
+
+    async def run():
+        first = asyncio.create_task(
+            async_openai_service._chat_completion("first", "scene_summary", "m1", 0.1)
+        )
+        await asyncio.sleep(0.05)
+        second = await async_openai_service._chat_completion("second", "scene_summary", "m2", 0.1)
+        return second, await first
+
+    saved_limit = async_openai_service.max_concurrent_requests
+    try:
+        with fake_openai(_Completions(), asynchronous=True):
+            async_openai_service.set_max_concurrent_requests(1)
+            assert asyncio.run(run()) == ("second", "first")
+        # "first" backs off for 0.3s; with one slot, "second" still goes ahead.
+        assert finished["second"] < finished["first"]
+    finally:
+        async_openai_service.set_max_concurrent_requests(saved_limit)
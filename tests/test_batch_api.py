@@ -0,0 +1,52 @@
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath("src"))
+sys.path.insert(0, os.path.abspath("."))
+
+from batch_api import make_custom_id, parse_custom_id, run_batch_locally
+from benchmarks.synthetic import synthetic_chapter
+from corpus_loader import CorpusLoader
+from enhanced_batch_processor import EnhancedBatchProcessor
+
+
+def _answer(body):
+    prompt = body["messages"][0]["content"]
+    if "Evaluate the following H3 sub-sections" in prompt:
+        return json.dumps({"Banking Impact": {"enhance": "Yes", "recommendation": "Table"}})
+    return "### Banking Impact\n\nRewritten in batch."
+
+
+def test_custom_ids_round_trip():
+    custom_id = make_custom_id("part 1/ch:01.md", 3, "SRE Best Practice: Logs", "improved_section")
+    assert parse_custom_id(custom_id) == (
+        "part 1/ch:01.md",
+        3,
+        "SRE Best Practice: Logs",
+        "improved_section",
+    )
+
+
+def test_two_batch_rounds_then_ingest():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        source = tmp / "chapters"
+        source.mkdir()
+        for i in range(2):
+            (source / f"chapter_{i}.md").write_text(synthetic_chapter(3, seed=i), encoding="utf-8")
+        processor = EnhancedBatchProcessor(corpus_loader=CorpusLoader(max_workers=1, parse_cache=False))
+
+        assert processor.write_batch_requests(source, tmp / "round1.jsonl") == 6
+        run_batch_locally(tmp / "round1.jsonl", tmp / "results1.jsonl", _answer)
+        results = [tmp / "results1.jsonl"]
+        assert processor.write_batch_requests(source, tmp / "round2.jsonl", results) == 6
+        run_batch_locally(tmp / "round2.jsonl", tmp / "results2.jsonl", _answer)
+        results.append(tmp / "results2.jsonl")
+        assert processor.write_batch_requests(source, tmp / "round3.jsonl", results) == 0
+
+        processor.ingest_batch_results(source, tmp / "out", results)
+        enhanced = (tmp / "out" / "chapter_0_enhanced.md").read_text(encoding="utf-8")
+        assert enhanced.count("Rewritten in batch.") == 3
@@ -0,0 +1,30 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath("."))
+
+from benchmarks.suite import compare
+from benchmarks.synthetic import synthetic_chapter
+from markdown_document import MarkdownDocument
+from section_titles import SECTION_TITLES
+
+
+def test_synthetic_chapter_has_project_shape():
+    text = synthetic_chapter(30, h4_per_section=2)
+    assert text == synthetic_chapter(30, h4_per_section=2)
+    doc = MarkdownDocument(parse_cache=False)
+    doc._process_content(text)
+    assert doc.chapter_model.chapter_title_text == "Chapter 1: Synthetic Benchmark"
+    panels = doc.list_panels()
+    assert len(panels) == 30
+    assert [h3.heading_text for h3 in panels[0].h3_sections] == [
+        s.value for s in SECTION_TITLES
+    ]
+    assert len(panels[0].h3_sections[0].h4_sections) == 2
+
+
+def test_compare_flags_only_regressions_beyond_threshold():
+    baseline = {"results": {"10": {"parse": 1.0, "build": 1.0}}}
+    current = {"results": {"10": {"parse": 1.1, "build": 1.5}, "20": {"parse": 9.0}}}
+    regressions = compare(current, baseline, threshold=0.2)
+    assert len(regressions) == 1 and regressions[0].startswith("build @ 10")
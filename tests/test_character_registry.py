@@ -0,0 +1,105 @@
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath("src"))
+
+from character_registry import CharacterRegistry, name_key
+
+
+def _write_characters(path, characters):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"version": 2, "characters": characters}, f)
+
+
+def test_role_index_and_write_behind():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "characters.json")
+        _write_characters(
+            path,
+            {
+                "Hector": {"role": "Senior SRE"},
+                "Juana": {"role": "Senior SRE"},
+                "Pat": {"role": "Product Owner"},
+            },
+        )
+        registry = CharacterRegistry(path, flush_every=0)
+        assert registry.names_for_role("Senior SRE") == ["Hector", "Juana"]
+        assert registry.missing_roles(["Senior SRE", "Angry Customer"]) == ["Angry Customer"]
+
+        assert registry.add_many(
+            {"Hector": {"role": "Angry Customer"}, "Ada": {"role": "Angry Customer"}}
+        ) == 1
+        assert registry.names_for_role("Angry Customer") == ["Ada"]
+        assert registry.character_data(["Ada"]) == {
+            "characters": {"Ada": {"role": "Angry Customer"}}
+        }
+        with open(path, encoding="utf-8") as f:
+            assert "Ada" not in json.load(f)["characters"]
+
+        assert registry.flush() == 1
+        assert registry.pending == 0
+        with open(path, encoding="utf-8") as f:
+            saved = json.load(f)
+        assert saved["version"] == 2
+        assert list(saved["characters"]) == ["Hector", "Juana", "Pat", "Ada"]
+
+
+def test_flush_merges_characters_saved_by_another_writer():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "characters.json")
+        _write_characters(path, {"Hector": {"role": "Senior SRE"}})
+        first = CharacterRegistry(path, flush_every=0)
+        second = CharacterRegistry(path, flush_every=0)
+
+        first.add("Ada", {"role": "Angry Customer"})
+        second.add("Sam", {"role": "Support Engineer"})
+        second.add("Ada", {"role": "Junior Developer"})
+        second.flush()
+        first.flush()
+
+        with open(path, encoding="utf-8") as f:
+            saved = json.load(f)["characters"]
+        assert saved["Ada"] == {"role": "Junior Developer"}
+        assert set(saved) == {"Hector", "Ada", "Sam"}
+        assert first.names_for_role("Support Engineer") == ["Sam"]
+        assert first.missing_roles(["Angry Customer"]) == ["Angry Customer"]
+
+
+def test_pending_profiles_flush_in_batches():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "characters.json")
+        registry = CharacterRegistry(path, flush_every=2)
+        registry.add("Ada", {"role": "Angry Customer"})
+        assert not os.path.exists(path)
+        registry.add("Sam", {"role": "Support Engineer"})
+        assert registry.pending == 0
+        with open(path, encoding="utf-8") as f:
+            assert set(json.load(f)["characters"]) == {"Ada", "Sam"}
+
+
+def test_names_that_sound_alike_conflict():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "characters.json")
+        _write_characters(path, {"John Smith": {"role": "Senior SRE"}})
+        registry = CharacterRegistry(path, flush_every=0)
+        assert name_key("Jon Smyth") == name_key("John Smith") == "J500 S530"
+        assert registry.name_conflicts("Jon Smyth") == ["John Smith"]
+        assert registry.name_conflicts("Priya Nair") == []
+        registry.add("Priya Nair", {"role": "Product Owner"})
+        assert registry.name_conflicts("Pria Nayr") == ["Priya Nair"]
+
+
+def test_names_without_latin_letters_only_conflict_with_themselves():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "characters.json")
+        _write_characters(path, {"李明": {"role": "Senior SRE"}})
+        registry = CharacterRegistry(path, flush_every=0)
+        assert name_key("李明") != name_key("王芳")
+        assert registry.name_conflicts("王芳") == []
+        assert registry.name_conflicts("李明") == ["李明"]
+        assert registry.add("王芳", {"role": "Senior SRE"})
+        assert registry.add("Иван Петров", {"role": "Product Owner"})
+        assert registry.name_conflicts("Мария Иванова") == []
+        assert registry.names_for_role("Senior SRE") == ["李明", "王芳"]
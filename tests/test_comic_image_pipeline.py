@@ -0,0 +1,203 @@
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath("src"))
+sys.path.insert(0, os.path.abspath("."))
+
+import comic_image_pipeline
+import generate_character_profiles
+from benchmarks.synthetic import synthetic_chapter
+from parse_cache import ParseCache
+from tests.fake_openai import chat_response, fake_openai
+from token_estimator import TokenEstimator
+
+_NAMES = {
+    "Senior SRE": ["Hector Alvarez", "Juana Okafor"],
+    "Junior Developer": ["Mina Patel", "Tobias Wren"],
+    "Product Owner": ["Greta Lindqvist", "Omar Haddad"],
+    "Support Engineer": ["Priya Nair", "Dmitri Volkov"],
+    "Angry Customer": ["Beatrix Quinn", "Carlos Mendez"],
+    "SRE Engineer": ["Yuki Tanaka", "Felix Brandt"],
+}
+_SCENE_TYPES = [["Teaching Scene"], ["Chaos Scene"], ["Reflection Scene", "Meta Scene"]]
+
+
+class _ScriptedCompletions:
+    """Answers every pipeline prompt deterministically from its text."""
+
+    def __init__(self):
+        self.prompts = []
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def create(self, model, messages, temperature, **kwargs):
+        prompt = messages[0]["content"]
+        with self._lock:
+            self.prompts.append(prompt)
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(0.005)
+        with self._lock:
+            self.in_flight -= 1
+        return chat_response(_answer(prompt))
+
+    def count(self, kind):
+        return sum(_kind(prompt) == kind for prompt in self.prompts)
+
+
+def _kind(prompt):
+    if "unique characters for each of the following roles" in prompt:
+        return "profiles"
+    if "analyzing a scene" in prompt:
+        return "scene_analysis"
+    if "speech bubble" in prompt:
+        return "speech_bubbles"
+    if "narration tags" in prompt:
+        return "narration"
+    return "summary"
+
+
+def _answer(prompt):
+    kind = _kind(prompt)
+    digest = zlib.crc32(prompt.encode("utf-8"))
+    if kind == "profiles":
+        roles = prompt.split("following roles:\n", 1)[1].splitlines()[0].split(", ")
+        per_role = int(re.search(r"Generate (\d+) unique", prompt).group(1))
+        return json.dumps(
+            {name: {"role": role} for role in roles for name in _NAMES[role][:per_role]}
+        )
+    if kind == "scene_analysis":
+        return json.dumps({"scene_types": _SCENE_TYPES[digest % len(_SCENE_TYPES)]})
+    if kind == "speech_bubbles":
+        names = re.findall(r"^- (.+?) \(", prompt, flags=re.MULTILINE)
+        return json.dumps({name: f"Line {digest % 97}" for name in names})
+    if kind == "narration":
+        return f"Narration {digest % 1000}"
+    return f"Summary {digest % 1000}. " + "Dashboards glow as the team reacts. " * 12
+
+
+@contextmanager
+def _scripted_pipeline():
+    """Routes every API call to a scripted client; nothing touches ~/.cache."""
+    completions = _ScriptedCompletions()
+    saved_parse_cache = ParseCache._default
+    with tempfile.TemporaryDirectory() as tmp, fake_openai(completions):
+        try:
+            ParseCache._default = ParseCache(os.path.join(tmp, "parse"))
+            yield completions, Path(tmp)
+        finally:
+            ParseCache._default = saved_parse_cache
+
+
+def _write_inputs(root, chapters=1, panels=8):
+    paths = []
+    for n in range(chapters):
+        path = root / f"chapter_0{n + 1}.md"
+        path.write_text(synthetic_chapter(panels, seed=n), encoding="utf-8")
+        paths.append(path)
+    characters = root / "characters.json"
+    characters.write_text(
+        json.dumps({"characters": {"Hector Alvarez": {"role": "Senior SRE"}}}),
+        encoding="utf-8",
+    )
+    return paths, characters
+
+
+def test_worker_count_bounds_api_calls_and_does_not_change_outputs():
+    outputs = {}
+    for workers in (1, 4):
+        with _scripted_pipeline() as (completions, root):
+            (chapter,), characters = _write_inputs(root)
+            comic_image_pipeline.process_chapter_for_visual_panels(
+                chapter,
+                characters,
+                root / "out.md",
+                root / "out.json",
+                max_workers=workers,
+            )
+            assert completions.peak <= workers
+            outputs[workers] = (
+                (root / "out.json").read_text(encoding="utf-8"),
+                (root / "out.md").read_text(encoding="utf-8"),
+            )
+    assert outputs[1] == outputs[4]
+    panels = json.loads(outputs[4][0])["panels"]
+    assert [panel["panel"] for panel in panels] == list(range(1, 9))
+    assert all(panel["speech_bubbles"] for panel in panels)
+    for panel in panels:
+        assert f"_p{panel['panel']}_" in panel["filename"]
+        assert panel["filename"] in outputs[4][1]
+
+
+def test_corpus_plan_generates_every_missing_role_before_panels_run():
+    saved_per_request = generate_character_profiles.CHARACTER_GENERATION_MAX_PROFILES_PER_REQUEST
+    with _scripted_pipeline() as (completions, root):
+        chapters, characters = _write_inputs(root, chapters=3, panels=6)
+        try:
+            # Two profiles per role: at most two roles per request.
+            generate_character_profiles.CHARACTER_GENERATION_MAX_PROFILES_PER_REQUEST = 4
+            plan = comic_image_pipeline.plan_characters_for_chapters(chapters, characters)
+        finally:
+            generate_character_profiles.CHARACTER_GENERATION_MAX_PROFILES_PER_REQUEST = (
+                saved_per_request
+            )
+
+        assert [len(plan[str(path)]) for path in chapters] == [6, 6, 6]
+        required = {
+            role
+            for analyses in plan.values()
+            for analysis in analyses.values()
+            for tag in analysis.scene_types
+            for role in comic_image_pipeline.TAG_TO_ROLES[tag]
+        }
+        assert len(required) > 3  # panels across all chapters contributed roles
+        missing = sorted(required - {"Senior SRE"})
+        saved = json.loads(characters.read_text(encoding="utf-8"))["characters"]
+        assert {profile["role"] for profile in saved.values()} == required
+        assert completions.count("scene_analysis") == 18
+        assert completions.count("profiles") == (len(missing) + 1) // 2
+
+        completions.prompts.clear()
+        for path in chapters:
+            comic_image_pipeline.process_chapter_for_visual_panels(
+                path,
+                characters,
+                root / f"{path.stem}_out.md",
+                root / f"{path.stem}_out.json",
+                scene_analyses=plan[str(path)],
+            )
+        assert completions.count("profiles") == 0
+        assert completions.count("scene_analysis") == 0
+        assert completions.count("speech_bubbles") == 18
+
+
+def test_missing_roles_are_packed_under_the_token_budget():
+    with _scripted_pipeline() as (completions, root):
+        _, characters = _write_inputs(root)
+        registry = generate_character_profiles.CharacterRegistry(characters)
+        roles = sorted(set(_NAMES) - {"Senior SRE"})
+        excluded = registry.names()
+        overhead = TokenEstimator.default().count(
+            generate_character_profiles.generate_prompt([], excluded)
+        )
+        added = generate_character_profiles.generate_profiles_for_missing_roles(
+            roles + ["Senior SRE"], registry, token_budget=overhead + 8
+        )
+        assert added == 2 * len(roles)
+        prompts = [p for p in completions.prompts if _kind(p) == "profiles"]
+        assert 1 < len(prompts) <= len(roles)
+        for prompt in prompts:
+            requested = prompt.split("following roles:\n", 1)[1].splitlines()[0].split(", ")
+            # Only a role too large for the budget on its own may exceed it.
+            if len(requested) > 1:
+                assert TokenEstimator.default().count(prompt) <= overhead + 8
+        assert registry.missing_roles(roles) == []
@@ -0,0 +1,39 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath("src"))
+
+from corpus_loader import CorpusLoader
+
+
+def _chapter(i):
+    return f"# Chapter {i}\n\n## Panel 1\n### Scene Description\nscene {i}\n"
+
+
+def test_loads_corpus_in_order_across_processes():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        (root / "nested").mkdir()
+        for i in range(4):
+            (root / f"ch{i}.md").write_text(_chapter(i), encoding="utf-8")
+        (root / "nested" / "ch9.md").write_text(_chapter(9), encoding="utf-8")
+        (root / "broken.md").mkdir()  # matches the pattern but is not a file
+
+        loader = CorpusLoader(max_workers=2, parse_cache=False)
+        loaded = loader.load(root)
+        assert [p.name for p, _ in loaded] == [f"ch{i}.md" for i in range(4)]
+        for path, doc in loaded:
+            assert doc.filepath == str(path)
+            assert doc.reconstruct_and_render_document() == path.read_text()
+            assert doc.get_panel_by_number(1).h3_sections[0].heading_text == (
+                "Scene Description"
+            )
+
+        recursive = CorpusLoader(max_workers=2, recursive=True, max_files=5, parse_cache=False)
+        unordered = list(recursive.iter_documents(root, ordered=False))
+        assert sorted(p.name for p, _ in unordered) == [
+            "ch0.md", "ch1.md", "ch2.md", "ch3.md", "ch9.md"
+        ]
+        assert len(CorpusLoader(max_files=2).discover(root)) == 2
@@ -0,0 +1,114 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.abspath("src"))
+
+from document_model_builder import DocumentModelBuilder
+from markdown_parser import MarkdownParser
+
+SAMPLE_LINES = [
+    "# Chapter 1",
+    "## Panel 1",
+    "## Panel 2: Alerts",
+    "## Notes",
+    "### Scene Description",
+    "### Teaching Narrative",
+    "#### Checklist",
+    "Some text",
+    "  indented text  ",
+    "",
+    "",
+    "```",
+    "```python",
+    "kubectl get pods",
+    "- item",
+    "~~~",
+    "##### Deep heading ##",
+    "#hashtag",
+    "````",
+]
+
+
+def _without_blocks(value):
+    if isinstance(value, dict):
+        return {
+            k: _without_blocks(v)
+            for k, v in value.items()
+            if not k.startswith("mistletoe")
+        }
+    if isinstance(value, list):
+        return [_without_blocks(v) for v in value]
+    return value
+
+
+def _build(text, single_pass):
+    doc = MarkdownParser.parse(text)
+    model = DocumentModelBuilder(single_pass=single_pass).build(doc)
+    return _without_blocks(model.model_dump())
+
+
+def test_single_pass_matches_legacy_on_random_documents():
+    rng = random.Random(1234)
+    for _ in range(500):
+        text = "\n".join(
+            rng.choice(SAMPLE_LINES) for _ in range(rng.randint(0, 40))
+        )
+        assert _build(text, True) == _build(text, False), repr(text)
+
+
+def test_rendering_survives_a_parse_round_trip():
+    rng = random.Random(99)
+    for _ in range(300):
+        text = "\n".join(
+            rng.choice(SAMPLE_LINES) for _ in range(rng.randint(0, 30))
+        )
+        doc = MarkdownParser.parse(text)
+        rendered = doc.renderer.render(doc)
+        reparsed = MarkdownParser.parse(rendered)
+        assert reparsed.renderer.render(reparsed) == rendered, repr(text)
+
+
+def test_tokenizer_merges_paragraphs_and_reads_fences():
+    text = "# Title\nline one\nline two\n\n~~~yaml\n```\n~~~\n###### Six ##\n"
+    blocks = MarkdownParser.parse(text).children
+    assert [type(b).__name__ for b in blocks] == [
+        "Heading", "Paragraph", "BlockCode", "Heading"
+    ]
+    assert blocks[1].children[0].content == "line one\nline two"
+    assert (blocks[2].language, blocks[2].children[0].content) == ("yaml", "```")
+    assert (blocks[3].level, blocks[3].children[0].content) == (6, "Six")
+
+
+SPAN_SOURCE = (
+    "# Chapter 1\n\nIntro text\n\n"
+    "## Panel 1: Start\n### Scene Description\n\nA  dark   room.\n\n"
+    "```python\nprint(1)\n```\n\n### Teaching Narrative\nTeach.\n\n"
+    "## Panel 2\n### Scene Description\nx\n"
+)
+
+
+def test_sections_are_sliced_from_source():
+    doc = MarkdownParser.parse(SPAN_SOURCE)
+    model = DocumentModelBuilder().build(doc, source_text=SPAN_SOURCE)
+    assert (model.source_start, model.source_end) == (0, len(SPAN_SOURCE))
+    generic, panel1, panel2 = model.document_elements
+    assert generic.source_end == panel1.source_start
+    assert panel1.source_end == panel2.source_start
+    assert panel2.source_end == len(SPAN_SOURCE)
+    scene = panel1.h3_sections[0]
+    assert scene.original_full_markdown == (
+        "### Scene Description\n\nA  dark   room.\n\n```python\nprint(1)\n```"
+    )
+    assert SPAN_SOURCE[scene.source_start : scene.source_end].strip() == (
+        scene.original_full_markdown
+    )
+    assert panel1.h3_sections[1].initial_content_markdown == "Teach."
+
+
+def test_blocks_record_line_and_offset_spans():
+    doc = MarkdownParser.parse(SPAN_SOURCE)
+    for block in doc.children:
+        assert block.start_offset < block.end_offset
+        lines = SPAN_SOURCE[block.start_offset : block.end_offset].splitlines()
+        assert len(lines) == block.end_line_number - block.line_number + 1
@@ -0,0 +1,135 @@
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.abspath("src"))
+sys.path.insert(0, os.path.abspath("."))
+
+import generate_character_profiles
+from character_registry import CharacterRegistry
+from tests.fake_openai import chat_response, fake_openai
+
+
+class _ScriptedProfiles:
+    """Returns, per request, the next names scripted for each requested role."""
+
+    def __init__(self, names_by_role, concurrent=1):
+        self.names_by_role = {role: list(names) for role, names in names_by_role.items()}
+        self.prompts = []
+        self._lock = threading.Lock()
+        # The first `concurrent` requests wait until all of them are in flight.
+        self._barrier = threading.Barrier(concurrent)
+        self._waiting = concurrent
+
+    def create(self, model, messages, temperature, **kwargs):
+        prompt = messages[0]["content"]
+        roles = prompt.split("following roles:\n", 1)[1].splitlines()[0].split(", ")
+        per_role = int(re.search(r"Generate (\d+) unique", prompt).group(1))
+        with self._lock:
+            wait, self._waiting = self._waiting > 0, self._waiting - 1
+        if wait:
+            self._barrier.wait(timeout=5)
+        with self._lock:
+            self.prompts.append(prompt)
+            answer = {}
+            for role in roles:
+                for _ in range(per_role):
+                    answer[self.names_by_role[role].pop(0)] = {"role": role}
+        return chat_response(json.dumps(answer))
+
+
+def _run(names_by_role, existing, func, concurrent=1):
+    completions = _ScriptedProfiles(names_by_role, concurrent)
+    with tempfile.TemporaryDirectory() as tmp, fake_openai(completions):
+        path = os.path.join(tmp, "characters.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"characters": existing}, f)
+        registry = CharacterRegistry(path, flush_every=0)
+        result = func(registry)
+        with open(path, encoding="utf-8") as f:
+            saved_characters = json.load(f)["characters"]
+        return result, registry, saved_characters, completions.prompts
+
+
+def test_colliding_names_are_requested_again_with_a_bounded_exclusion_list():
+    existing = {f"Existing Person{n}": {"role": "Senior SRE"} for n in range(200)}
+    existing["John Smith"] = {"role": "Senior SRE"}
+    names = {
+        "Angry Customer": ["Jon Smyth", "Beatrix Quinn", "Carlos Mendez"],
+        "Product Owner": ["Greta Lindqvist", "Omar Haddad"],
+    }
+    accepted, _, _, prompts = _run(
+        names,
+        existing,
+        lambda registry: generate_character_profiles.request_character_profiles(
+            ["Angry Customer", "Product Owner"], registry, 2
+        ),
+    )
+    assert sorted(accepted) == ["Beatrix Quinn", "Carlos Mendez", "Greta Lindqvist", "Omar Haddad"]
+    assert len(prompts) == 2
+    limit = generate_character_profiles.CHARACTER_PROMPT_MAX_EXCLUDED_NAMES
+    first_avoid = prompts[0].split("sound like them:\n", 1)[1].splitlines()[0].split(", ")
+    assert len(first_avoid) == limit and "John Smith" in first_avoid
+    # The second round asks only for the one slot that collided...
+    assert "following roles:\nAngry Customer\n" in prompts[1]
+    assert "Generate 1 unique" in prompts[1]
+    # ...and avoids the collision, within the bounded exclusion list.
+    avoid = prompts[1].split("sound like them:\n", 1)[1].splitlines()[0].split(", ")
+    assert "Jon Smyth" in avoid and "John Smith" in avoid
+    assert len(avoid) <= limit
+
+
+def test_concurrent_requests_do_not_save_sound_alike_names():
+    names = {
+        "Angry Customer": ["John Smith", "Beatrix Quinn"],
+        "Product Owner": ["Jon Smyth", "Greta Lindqvist", "Omar Haddad"],
+    }
+    saved_per_request = generate_character_profiles.CHARACTER_GENERATION_MAX_PROFILES_PER_REQUEST
+    try:
+        # One role per request, so both requests run concurrently.
+        generate_character_profiles.CHARACTER_GENERATION_MAX_PROFILES_PER_REQUEST = 2
+        added, registry, saved_characters, prompts = _run(
+            names,
+            {"Hector Alvarez": {"role": "Senior SRE"}},
+            lambda registry: generate_character_profiles.generate_profiles_for_missing_roles(
+                ["Angry Customer", "Product Owner"], registry, 2, max_workers=2
+            ),
+            concurrent=2,
+        )
+    finally:
+        generate_character_profiles.CHARACTER_GENERATION_MAX_PROFILES_PER_REQUEST = (
+            saved_per_request
+        )
+    assert added == 4
+    assert registry.names_for_role("Angry Customer") == ["John Smith", "Beatrix Quinn"]
+    assert registry.names_for_role("Product Owner") == ["Greta Lindqvist", "Omar Haddad"]
+    assert "Jon Smyth" not in registry
+    # The slot "Jon Smyth" lost is the only one requested again.
+    assert len(prompts) == 3
+    assert "following roles:\nProduct Owner\n" in prompts[2]
+    assert "Generate 1 unique" in prompts[2]
+    assert sorted(saved_characters) == sorted(registry.names())
+
+
+def test_failed_profile_request_is_sent_once():
+    class _BadRequest(Exception):
+        status_code = 400
+
+    class _Failing:
+        calls = 0
+
+        def create(self, model, messages, temperature, **kwargs):
+            self.calls += 1
+            raise _BadRequest("invalid prompt")
+
+    completions = _Failing()
+    with fake_openai(completions):
+        result = generate_character_profiles._complete_character_profiles(
+            "prompt", ["Angry Customer"]
+        )
+    assert result is None
+    # The rate limiter does not retry a 400, and nothing retries around it.
+    assert completions.calls == 1
@@ -0,0 +1,173 @@
+import io
+import os
+import random
+import stat
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath("src"))
+
+from markdown_document import MarkdownDocument
+from mistletoe.markdown_renderer import TrimmingWriter
+from parse_cache import ParseCache
+
+CHAPTER = "# Chapter 1\n\nIntro\n\n" + "".join(
+    f"## Panel {i}\n### Scene Description\n\ntext {i}\n\n```\ncode\n```\n"
+    f"### Teaching Narrative\nT{i}\n\n"
+    for i in range(1, 6)
+)
+
+
+def _doc(text=CHAPTER):
+    doc = MarkdownDocument()
+    doc._process_content(text)
+    return doc
+
+
+def _model_without_blocks(doc):
+    def strip(value):
+        if isinstance(value, dict):
+            return {
+                k: strip(v) for k, v in value.items() if not k.startswith("mistletoe")
+            }
+        if isinstance(value, list):
+            return [strip(v) for v in value]
+        return value
+
+    return strip(doc.chapter_model.model_dump())
+
+
+def test_replace_panel_body_rebuilds_only_that_panel():
+    doc = _doc()
+    untouched = doc.get_panel_by_number(4)
+    assert doc.replace_panel_body(2, "### Scene Description\nnew body")
+    assert doc.get_panel_by_number(4) is untouched
+    panel = doc.get_panel_by_number(2)
+    assert panel.panel_number_in_doc == 2
+    assert panel.h3_sections[0].original_full_markdown == (
+        "### Scene Description\nnew body"
+    )
+    assert _model_without_blocks(doc) == _model_without_blocks(_doc(doc.raw_content))
+
+
+def test_random_edits_match_full_rebuild():
+    rng = random.Random(7)
+    pieces = ["", "x", "\n", "### New\n", "```\n", "## Panel 9\n", "more\n\n"]
+    for _ in range(200):
+        doc = _doc()
+        for _ in range(3):
+            start = rng.randint(0, len(doc.raw_content))
+            end = min(len(doc.raw_content), start + rng.randint(0, 30))
+            assert doc.apply_edit(start, end, rng.choice(pieces))
+        assert _model_without_blocks(doc) == _model_without_blocks(
+            _doc(doc.raw_content)
+        )
+
+
+def test_unchanged_document_renders_verbatim():
+    doc = _doc()
+    assert doc.reconstruct_and_render_document() == CHAPTER
+
+
+def test_streamed_render_matches_joined_segments():
+    doc = _doc()
+    doc.update_named_section_in_panel(3, "Scene Description", "Changed\n\n")
+    doc.raw_content = None  # force the block-based rendering
+    expected = "\n\n".join(doc._iter_rendered_segments()).strip()
+    assert doc.reconstruct_and_render_document() == expected
+
+    rng = random.Random(3)
+    for _ in range(200):
+        chunks = [rng.choice(["", " ", "\n", "a", " b ", "\n\nc\n"]) for _ in range(8)]
+        buffer = io.StringIO()
+        writer = TrimmingWriter(buffer)
+        for chunk in chunks:
+            writer.write(chunk)
+        assert buffer.getvalue() == "".join(chunks).strip()
+
+
+def test_render_reuses_cache_until_section_is_updated():
+    doc = _doc()
+    assert doc.update_named_section_in_panel(2, "Teaching Narrative", "Better")
+    rendered = doc.reconstruct_and_render_document()
+    assert rendered == CHAPTER.replace(
+        "### Teaching Narrative\nT2\n", "### Teaching Narrative\n\nBetter\n"
+    )
+    panel = doc.get_panel_by_number(2)
+    cached = panel._rendered_markdown
+    assert cached is not None
+    doc.reconstruct_and_render_document()
+    assert panel._rendered_markdown is cached
+
+    assert doc.update_named_section_in_panel(2, "Teaching Narrative", "Best")
+    assert panel._rendered_markdown is None
+    assert "\nBest\n" in doc.reconstruct_and_render_document()
+
+
+def test_lookup_indexes_follow_incremental_rebuilds():
+    doc = _doc()
+    assert doc.get_panel_by_title("Panel 3") is doc.get_panel_by_number(3)
+    h3 = doc.get_h3_section(3, " Teaching Narrative ")
+    assert h3 is doc.get_panel_by_number(3).h3_sections[1]
+    assert doc.replace_panel_body(3, "### Teaching Narrative\nrewritten\n")
+    new_panel = doc.get_panel_by_number(3)
+    assert doc.get_panel_by_title("Panel 3") is new_panel
+    assert doc.list_panels()[2] is new_panel
+    assert doc.get_h3_section(3, "Scene Description") is None
+    assert doc.extract_named_sections_from_panel(3)["Teaching Narrative"] == (
+        "### Teaching Narrative\nrewritten"
+    )
+
+
+def test_parse_cache_serves_repeat_loads_and_evicts_oldest():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ParseCache(os.path.join(tmp, "cache"), max_entries=2)
+        paths = []
+        for i in range(3):
+            path = os.path.join(tmp, f"chapter_{i}.md")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(CHAPTER + f"Footer {i}\n")
+            paths.append(path)
+
+        first = MarkdownDocument(paths[0], parse_cache=cache)
+        assert first.mistletoe_doc is not None
+        second = MarkdownDocument(paths[0], parse_cache=cache)
+        assert second.mistletoe_doc is None
+        assert _model_without_blocks(second) == _model_without_blocks(first)
+        assert second.reconstruct_and_render_document() == first.raw_content
+
+        os.utime(cache._path_for(first.raw_content), (0, 0))
+        MarkdownDocument(paths[1], parse_cache=cache)
+        MarkdownDocument(paths[2], parse_cache=cache)
+        assert len(cache._entries()) == 2
+        assert cache.get(first.raw_content) is None
+
+
+def test_save_document_is_atomic_and_skips_unchanged_output():
+    doc = _doc()
+    with tempfile.TemporaryDirectory() as tmp:
+        out_path = os.path.join(tmp, "out.md")
+        assert doc.save_document(out_path)
+        with open(out_path, encoding="utf-8") as f:
+            assert f.read() == CHAPTER
+        os.utime(out_path, (0, 0))
+        assert doc.save_document(out_path, skip_unchanged=True)
+        assert os.stat(out_path).st_mtime == 0
+        doc.update_named_section_in_panel(1, "Teaching Narrative", "New")
+        assert doc.save_document(out_path, skip_unchanged=True)
+        assert os.stat(out_path).st_mtime != 0
+        assert os.listdir(tmp) == ["out.md"]
+
+
+def test_save_document_keeps_file_permissions():
+    doc = _doc()
+    with tempfile.TemporaryDirectory() as tmp:
+        out_path = os.path.join(tmp, "out.md")
+        assert doc.save_document(out_path)
+        umask = os.umask(0)
+        os.umask(umask)
+        assert stat.S_IMODE(os.stat(out_path).st_mode) == 0o666 & ~umask
+        os.chmod(out_path, 0o640)
+        doc.update_named_section_in_panel(1, "Teaching Narrative", "New")
+        assert doc.save_document(out_path)
+        assert stat.S_IMODE(os.stat(out_path).st_mode) == 0o640
@@ -0,0 +1,52 @@
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath("src"))
+
+from markdown_document import MarkdownDocument
+from metrics import METRICS, MetricsRegistry
+
+CHAPTER = "# Chapter 1\n\n## Panel 1\n### Scene Description\nx\n#### Detail\ny\n"
+
+
+def test_disabled_registry_records_nothing():
+    registry = MetricsRegistry(enabled=False)
+    with registry.timer("load.parse"):
+        registry.increment("load.files")
+    assert registry.snapshot() == {"counters": {}, "timings": {}}
+    assert registry.timer("a") is registry.timer("b")
+
+
+def test_load_save_and_render_are_instrumented():
+    METRICS.reset()
+    METRICS.enabled = True
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "chapter.md")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(CHAPTER)
+            doc = MarkdownDocument(filepath=path, parse_cache=False)
+            doc.reconstruct_and_render_document()
+            doc.save_document(os.path.join(tmp, "out.md"))
+            prom_path = os.path.join(tmp, "metrics.prom")
+            json_path = os.path.join(tmp, "metrics.json")
+            METRICS.dump_configured(json_path=json_path, prometheus_path=prom_path)
+            with open(json_path, encoding="utf-8") as f:
+                dumped = json.load(f)
+            with open(prom_path, encoding="utf-8") as f:
+                prom = f.read()
+    finally:
+        METRICS.enabled = False
+        METRICS.reset()
+    counters = dumped["counters"]
+    assert counters["load.files"] == 1
+    assert counters["load.bytes"] == len(CHAPTER)
+    assert (counters["load.panels"], counters["load.h3_sections"]) == (1, 1)
+    assert counters["load.h4_sections"] == 1
+    assert counters["save.bytes"] == len(CHAPTER)
+    for stage in ("load.read", "load.parse", "load.build", "load.validate", "save.total"):
+        assert dumped["timings"][stage]["count"] == 1
+    assert "markdown_editor_load_parse_seconds_count 1" in prom
+    assert "markdown_editor_load_files_total 1" in prom
@@ -0,0 +1,124 @@
+import json
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.abspath("src"))
+sys.path.insert(0, os.path.abspath("."))
+
+import openai_service
+from tests.fake_openai import chat_response, fake_openai
+
+
+class _ScriptedCompletions:
+    def __init__(self, answer):
+        self.answer = answer
+        self.prompts = []
+
+    def create(self, model, messages, temperature):
+        prompt = messages[0]["content"]
+        self.prompts.append(prompt)
+        return chat_response(self.answer(prompt))
+
+
+def _with_client(answer, func):
+    completions = _ScriptedCompletions(answer)
+    with fake_openai(completions):
+        return func(), completions.prompts
+
+
+def _panels(count):
+    return [
+        {
+            "panel_number": n,
+            "title": f"Panel {n}",
+            "context": f"## Panel {n}",
+            "sections": {"Scene Description": f"### Scene Description\nScene {n} " + "words " * 40},
+        }
+        for n in range(1, count + 1)
+    ]
+
+
+def _batch_answer(prompt):
+    numbers = re.findall(r"^=== Panel (\d+):", prompt, flags=re.MULTILINE)
+    return json.dumps({n: {"Scene Description": {"enhance": "Yes"}} for n in numbers})
+
+
+def test_chapter_suggestions_are_packed_into_few_requests():
+    result, prompts = _with_client(
+        _batch_answer,
+        lambda: openai_service.get_enhancement_suggestions_for_panels(_panels(30), token_budget=1000),
+    )
+    assert sorted(result) == list(range(1, 31))
+    assert all(result[n]["Scene Description"]["enhance"] for n in result)
+    assert 1 < len(prompts) <= 6
+
+
+def test_unparseable_batch_falls_back_to_one_request_per_panel():
+    def answer(prompt):
+        if "=== Panel" in prompt:
+            return "not json"
+        return json.dumps({"Scene Description": {"enhance": "No"}})
+
+    result, prompts = _with_client(
+        answer, lambda: openai_service.get_enhancement_suggestions_for_panels(_panels(3))
+    )
+    assert len(prompts) == 4
+    assert result[2] == {"Scene Description": {"enhance": False, "recommendation": None, "reason": None}}
+
+
+def test_flagged_sections_are_improved_in_one_request_with_per_section_fallback():
+    sections = {
+        title: {"markdown": f"### {title}\nOld text.", "enhancement_type": "Table"}
+        for title in ("Banking Impact", "Implementation Guidance", "Scene Description")
+    }
+
+    def answer(prompt):
+        if "several H3 sub-sections" in prompt:
+            # Leaves one section out and returns another without its heading.
+            return json.dumps(
+                {"Banking Impact": "### Banking Impact\nNew.", "Implementation Guidance": "New guidance."}
+            )
+        return "### Scene Description\nNew scene."
+
+    result, prompts = _with_client(
+        answer,
+        lambda: openai_service.get_improved_markdown_for_sections(sections, "Panel", "## Panel"),
+    )
+    assert len(prompts) == 2
+    assert result == {
+        "Banking Impact": "### Banking Impact\nNew.",
+        "Implementation Guidance": "### Implementation Guidance\n\nNew guidance.",
+        "Scene Description": "### Scene Description\nNew scene.",
+    }
+
+
+class _StreamingCompletions:
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.calls = 0
+
+    def create(self, model, messages, temperature, stream=False):
+        self.calls += 1
+        assert stream
+        for piece in self.pieces:
+            delta = type("Delta", (), {"content": piece})
+            choice = type("Choice", (), {"delta": delta})
+            yield type("Chunk", (), {"choices": [choice]})
+
+
+def test_streamed_enhancement_reports_deltas_then_repairs_the_heading():
+    import tempfile
+    from response_cache import ResponseCache
+
+    completions = _StreamingCompletions(["```markdown\n", "Better ", "text.", "\n```"])
+    with tempfile.TemporaryDirectory() as tmp:
+        with fake_openai(completions, response_cache=ResponseCache(os.path.join(tmp, "r.sqlite3"))):
+            for expected_deltas in (4, 1):
+                deltas = []
+                improved = openai_service.stream_improved_markdown_for_section(
+                    "### Banking Impact\nOld.", "Table", None, "Panel", "## Panel", deltas.append
+                )
+                assert len(deltas) == expected_deltas
+                assert improved == "### Banking Impact\n\nBetter text."
+            assert completions.calls == 1
@@ -0,0 +1,72 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath("src"))
+
+from rate_limiter import RateLimiter
+
+
+class _StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": headers or {}})
+
+
+def test_budgets_are_shared_through_the_sqlite_store():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "limits.sqlite3")
+        limits = {"default": {"rpm": 1, "tpm": 10**6}, "small": {"rpm": 100, "tpm": 1000}}
+        first = RateLimiter(limits, path=path)
+        second = RateLimiter(limits, path=path)
+        assert first.reserve("m", 10) == 0
+        # The second limiter (e.g. another process) sees the first one's request.
+        assert 59 < second.reserve("m", 10) <= 60
+        assert first.reserve("other-model", 10) == 0
+
+        assert first.reserve("small", 900) == 0
+        assert 29 < second.reserve("small", 600) <= 30
+
+
+def test_call_honours_retry_after_and_only_retries_transient_errors():
+    limiter = RateLimiter({"default": {"rpm": 6000, "tpm": 10**6}}, max_retries=2)
+    attempts = []
+
+    def send():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise _StatusError(429, {"retry-after-ms": "20"})
+        return "ok"
+
+    assert limiter.call("m", "prompt", send) == "ok"
+    assert len(attempts) == 2
+    assert limiter.retry_delay(_StatusError(429, {"retry-after": "3"}), 0) == 3.0
+
+    def bad_request():
+        attempts.append(1)
+        raise _StatusError(400)
+
+    try:
+        limiter.call("m", "prompt", bad_request)
+        assert False, "expected the 400 to propagate"
+    except _StatusError:
+        pass
+    assert len(attempts) == 3
+
+
+def test_dropped_connections_and_timeouts_are_retried():
+    limiter = RateLimiter({"default": {"rpm": 6000, "tpm": 10**6}}, max_retries=2)
+    attempts = []
+
+    def send():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionResetError("connection reset by peer")
+        return "ok"
+
+    assert limiter.call("m", "prompt", send) == "ok"
+    assert len(attempts) == 2
+    assert limiter.retry_delay(TimeoutError("timed out"), 1) is not None
+    assert limiter.retry_delay(TimeoutError("timed out"), 2) is None
+    assert limiter.retry_delay(ValueError("bad json"), 0) is None
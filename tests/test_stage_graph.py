@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath("src"))
+
+from stage_graph import StageGraph
+
+
+def _slow(result, seconds=0.1, spans=None):
+    def stage(*args):
+        started = time.perf_counter()
+        time.sleep(seconds)
+        if spans is not None:
+            spans[result] = (started, time.perf_counter())
+        return (result, args)
+
+    return stage
+
+
+def test_independent_stages_run_concurrently_and_dependencies_wait():
+    spans = {}
+    graph = (
+        StageGraph("test")
+        .add("analysis", _slow("analysis", spans=spans), ["md"])
+        .add("summary", _slow("summary", spans=spans), ["md"])
+        .add("narration", _slow("narration", spans=spans), ["md"])
+        .add("cast", _slow("cast", spans=spans), ["analysis"])
+        .add("bubbles", _slow("bubbles", spans=spans), ["summary", "cast"])
+    )
+    values = graph.run({"md": "text"})
+    # Stages without dependencies between them overlap...
+    latest_start = max(spans[n][0] for n in ("analysis", "summary", "narration"))
+    earliest_end = min(spans[n][1] for n in ("analysis", "summary", "narration"))
+    assert latest_start < earliest_end
+    # ...and dependent stages start only after their inputs finished.
+    assert spans["cast"][0] >= spans["analysis"][1]
+    assert spans["bubbles"][0] >= max(spans["cast"][1], spans["summary"][1])
+    assert values["bubbles"] == ("bubbles", (values["summary"], values["cast"]))
+    assert values["cast"] == ("cast", (values["analysis"],))
+
+
+def test_errors_propagate_and_bad_graphs_are_rejected():
+    def fail(md):
+        raise RuntimeError("boom")
+
+    graph = StageGraph("test").add("a", fail, ["md"]).add("b", _slow("b"), ["a"])
+    try:
+        graph.run({"md": "x"})
+        assert False, "expected the stage error"
+    except RuntimeError as e:
+        assert str(e) == "boom"
+
+    cyclic = StageGraph("test").add("a", _slow("a"), ["b"]).add("b", _slow("b"), ["a"])
+    for bad, initial in ((cyclic, {}), (StageGraph("t").add("a", _slow("a"), ["nope"]), {})):
+        try:
+            bad.run(initial)
+            assert False, "expected a ValueError"
+        except ValueError:
+            pass
+
+
+def test_stages_given_in_the_initial_values_are_not_run():
+    def fail(md):
+        raise RuntimeError("should not run")
+
+    graph = StageGraph("test").add("analysis", fail, ["md"]).add("cast", _slow("cast", 0), ["analysis"])
+    values = graph.run({"md": "text", "analysis": "planned"})
+    assert values["cast"] == ("cast", ("planned",))
@@ -0,0 +1,70 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath("src"))
+sys.path.insert(0, os.path.abspath("tests"))
+
+import openai_service
+import token_estimator
+from test_openai_service import _with_client
+from token_estimator import TokenEstimator, pack_by_token_budget
+
+
+def test_packer_keeps_every_group_under_budget():
+    estimator = TokenEstimator(chars_per_token=4.0)
+    items = ["x" * (40 * (i % 7 + 1)) for i in range(50)]
+    prompt_for = lambda group: "instructions " * 10 + "".join(group)
+    groups = pack_by_token_budget(items, prompt_for, 300, estimator=estimator)
+    assert [item for group in groups for item in group] == items
+    assert all(estimator.count(prompt_for(group)) <= 300 for group in groups)
+    assert pack_by_token_budget(["y" * 4000], prompt_for, 300, estimator=estimator) == [["y" * 4000]]
+
+
+def test_large_role_batches_are_split_and_usage_calibrates_the_estimate():
+    panels = [
+        {"title": f"Panel {n}", "scene": "scene " * 200, "teaching": "teaching " * 200}
+        for n in range(12)
+    ]
+
+    def answer(prompt):
+        titles = [line[len("Panel Title: "):] for line in prompt.splitlines() if line.startswith("Panel Title: ")]
+        return json.dumps({title: ["Senior SRE"] for title in titles})
+
+    roles, prompts = _with_client(
+        answer,
+        lambda: openai_service.suggest_character_roles_for_panels(panels, token_budget=2000),
+    )
+    assert len(roles) == 12 and len(prompts) > 1
+
+    estimator = TokenEstimator(chars_per_token=4.0)
+    usage = type("Usage", (), {"prompt_tokens": 100})
+    response = type("Response", (), {"usage": usage})
+    for _ in range(20):
+        estimator.record_usage("m", "z" * 300, response)
+    if estimator._encoding("m") is None:
+        assert abs(estimator.chars_per_token("m") - 3.0) < 0.1
+
+
+def test_unloadable_tiktoken_encoding_falls_back_to_the_ratio():
+    calls = []
+
+    class _OfflineTiktoken:
+        @staticmethod
+        def encoding_for_model(model):
+            raise KeyError(model)
+
+        @staticmethod
+        def get_encoding(name):
+            calls.append(name)
+            raise ConnectionError("no network to download the BPE file")
+
+    saved = token_estimator.tiktoken
+    token_estimator.tiktoken = _OfflineTiktoken
+    try:
+        estimator = TokenEstimator(chars_per_token=4.0)
+        assert estimator.count("x" * 400, "some-model") == 101
+        assert estimator.count("x" * 40, "some-model") == 11
+        assert calls == ["o200k_base"]
+    finally:
+        token_estimator.tiktoken = saved